@@ -0,0 +1,272 @@
+import os
+import random
+from datetime import timedelta
+from classes.activity_log import activity_logger
+from classes.async_database import AsyncDatabase
+from classes.database import Database
+from classes.migrations import Migrator
+from classes.times import utc_now
+
+RACES = ["Barbarian", "Dark Elf", "Dwarf", "Erudite", "Gnome", "Half Elf", "Halfling",
+         "High Elf", "Human", "Iksar", "Ogre", "Troll", "Wood Elf"]
+CLASSES = ["Bard", "Cleric", "Druid", "Enchanter", "Magician", "Monk", "Necromancer",
+           "Paladin", "Ranger", "Rogue", "Shadow Knight", "Shaman", "Warrior", "Wizard"]
+TYPES = [("Main", 1), ("Alt", 2), ("Mule", 3)]
+SYLLABLES = ["ar", "bel", "cor", "dra", "el", "fen", "gor", "hal", "ith", "jor", "kal",
+             "lor", "mir", "nor", "ob", "pel", "quin", "ra", "sil", "tor", "ul", "vor", "wyn", "zel"]
+# a zone too big for one message, as the real one is
+BIG_ZONE = "Temple of Veeshan"
+
+
+class FakeRole:
+    def __init__(self, name):
+        self.name = name
+
+
+class FakeMember:
+    def __init__(self, member_id, name, display_name, roles, guild):
+        self.id = member_id
+        self.name = name
+        self.display_name = display_name
+        self.roles = roles
+        self.guild = guild
+
+    def __str__(self):
+        return self.name
+
+
+class FakeGuild:
+    def __init__(self, name):
+        self.name = name
+        self.id = 1
+        self.roles = [FakeRole("Seeker"), FakeRole("Officer")]
+        self.members = []
+        self._by_id = {}
+
+    def add_member(self, member):
+        self.members.append(member)
+        self._by_id[member.id] = member
+
+    def get_member(self, member_id):
+        return self._by_id.get(member_id)
+
+
+class FakeBot:
+    def __init__(self, guild):
+        self.guilds = [guild]
+
+
+class FakeContext:
+    """
+    Stands in for discord.ApplicationContext; responses are kept
+    instead of sent
+    """
+    def __init__(self, guild, author, command, options=None):
+        self.guild = guild
+        self.author = author
+        self.command = command
+        self.selected_options = options
+        self.responses = []
+
+    async def respond(self, content=None, **kwargs):
+        self.responses.append(content)
+
+    async def defer(self, **kwargs):
+        pass
+
+
+class FakeAutocompleteContext:
+    def __init__(self, value):
+        self.value = value
+
+
+class SyntheticGuild:
+    """
+    A generated guild, roster and respawn table, written to a
+    fresh database file through the bot's SQLite backend
+    """
+    def __init__(self, directory, members=1000, zones=40, mobs_per_zone=20, seed=1):
+        self.directory = directory
+        self.random = random.Random(seed)
+        self.guild = FakeGuild("Seekers of Souls")
+        self.bot = FakeBot(self.guild)
+        self.characters = []
+        self.respawns = []
+        self.zones = []
+
+        self.make_members(members)
+        self.make_respawns(zones, mobs_per_zone)
+
+    def make_name(self, used):
+        """
+        A unique, EQ looking name
+        :param used: set of names already taken
+        :return: string
+        """
+        while True:
+            name = "".join(self.random.choice(SYLLABLES) for _ in range(self.random.randint(2, 4)))
+            name = name.capitalize()
+
+            if name not in used:
+                used.add(name)
+                return name
+
+    def make_members(self, count):
+        """
+        Guild members, each with one to five characters
+        :param count: int
+        :return: none
+        """
+        used = set()
+        roles = self.guild.roles
+
+        for number in range(count):
+            member_id = 100000000000000000 + number
+            name = self.make_name(used).lower()
+            member = FakeMember(member_id, name, name.capitalize(), roles, self.guild)
+            self.guild.add_member(member)
+
+            for position in range(self.random.randint(1, 5)):
+                char_type, priority = TYPES[min(position, 2)]
+                self.characters.append({
+                    'discord_id': str(member_id),
+                    'char_name': self.make_name(used),
+                    'char_race': self.random.choice(RACES),
+                    'char_class': self.random.choice(CLASSES),
+                    'char_type': char_type,
+                    'char_priority': priority
+                })
+
+    def make_respawns(self, zones, mobs_per_zone):
+        """
+        Mobs spread over zones, plus one oversized zone; about
+        half have a recent kill
+        :param zones: int
+        :param mobs_per_zone: int
+        :return: none
+        """
+        used = set()
+        now = utc_now().replace(tzinfo=None, microsecond=0)
+        self.zones = [BIG_ZONE] + [f"Zone {number}" for number in range(zones)]
+
+        for zone in self.zones:
+            size = mobs_per_zone * 3 if zone == BIG_ZONE else mobs_per_zone
+
+            for _ in range(size):
+                lockout = {
+                    'lockout_weeks': 0,
+                    'lockout_days': self.random.randint(0, 6),
+                    'lockout_hours': self.random.randint(0, 23),
+                    'lockout_minutes': self.random.choice([0, 15, 30, 45])
+                }
+                kill_time = None
+                respawn_time = None
+
+                if self.random.random() < 0.5:
+                    kill_time = now - timedelta(hours=self.random.randint(1, 200))
+                    respawn_time = kill_time + timedelta(
+                        days=lockout['lockout_days'],
+                        hours=lockout['lockout_hours'],
+                        minutes=lockout['lockout_minutes']
+                    )
+
+                self.respawns.append({
+                    'mob_name': f"{self.make_name(used)} the {self.random.choice(CLASSES)}",
+                    'mob_zone': zone,
+                    'kill_time': kill_time,
+                    'respawn_time': respawn_time,
+                    'time_zone': 'UTC',
+                    **lockout
+                })
+
+    def respawn_page(self, changed=0.1):
+        """
+        A pqdi instances page listing every mob, with a share
+        of the lockouts changed
+        :param changed: float, fraction of mobs given a new lockout
+        :return: string of html
+        """
+        parts = ["<html><body><table>"]
+
+        for row in self.respawns:
+            hours = row['lockout_hours']
+
+            if self.random.random() < changed:
+                hours = (hours + 1) % 24
+
+            parts.append(
+                f"<tr><td>{row['mob_name']}</td><td>{row['mob_zone']}</td>"
+                f"<td>Respawn Time: {row['lockout_days']} days {hours} hours "
+                f"{row['lockout_minutes']} minutes</td></tr>"
+            )
+
+        parts.append("</table></body></html>")
+
+        return "".join(parts)
+
+    def combined_name(self, character):
+        """
+        The combined autocomplete entry for a character
+        :param character: character dict
+        :return: string
+        """
+        member = self.guild.get_member(int(character['discord_id']))
+
+        return f"[ {character['char_name']} ]" + " " * 4 + f"[ {member.display_name} ]"
+
+    def install(self):
+        """
+        Switch Database and AsyncDatabase to a new SQLite file in
+        the directory, create the schema and seed it
+        :return: none
+        """
+        schema_path = os.path.join(self.directory, "sos_bot.db")
+
+        if os.path.exists(schema_path):
+            os.remove(schema_path)
+
+        os.environ['DATABASE_BACKEND'] = "sqlite"
+        os.environ['SQLITE_PATH'] = schema_path
+        os.environ['SCHEMA_BOOTSTRAP'] = "true"
+        Database._engine = None
+        AsyncDatabase._async_engine = None
+
+        database = Database()
+        Migrator(database).upgrade()
+
+        with database.create_engine().begin() as conn:
+            conn.exec_driver_sql(
+                "INSERT INTO sos_bot.characters (discord_id, char_name, char_race, char_class, "
+                "char_type, is_officer, char_priority) VALUES (?, ?, ?, ?, ?, 0, ?)",
+                [
+                    (row['discord_id'], row['char_name'], row['char_race'], row['char_class'],
+                     row['char_type'], row['char_priority'])
+                    for row in self.characters
+                ]
+            )
+            conn.exec_driver_sql(
+                "INSERT INTO sos_bot.members (discord_id) VALUES (?)",
+                [(str(member.id),) for member in self.guild.members]
+            )
+            conn.exec_driver_sql(
+                "INSERT INTO sos_bot.respawns VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (row['mob_name'], row['mob_zone'], fmt(row['kill_time']),
+                     fmt(row['respawn_time']), row['time_zone'], row['lockout_weeks'],
+                     row['lockout_days'], row['lockout_hours'], row['lockout_minutes'])
+                    for row in self.respawns
+                ]
+            )
+
+        # keep command logging off the console and out of logs/
+        activity_logger._path = os.path.join(self.directory, "bot-log.txt")
+        activity_logger._echo = False
+
+
+def fmt(value):
+    """
+    A datetime as the text SQLite stores
+    :param value: datetime or None
+    :return: string or None
+    """
+    return None if value is None else value.strftime("%Y-%m-%d %H:%M:%S")
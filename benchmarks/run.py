@@ -0,0 +1,234 @@
+"""
+Benchmarks for the bot's hot paths, run offline on the SQLite
+backend seeded with a synthetic guild:
+
+    python -m benchmarks.run --members 10000
+
+needs aiosqlite as well as the bot's own packages; reports latency
+percentiles and peak allocation per call for each case
+"""
+import argparse
+import asyncio
+import inspect
+import statistics
+import tempfile
+import time
+import tracemalloc
+from benchmarks.fixtures import BIG_ZONE, FakeAutocompleteContext, FakeContext, SyntheticGuild
+from classes.async_database import AsyncDatabase
+from classes.database import Database
+from classes.helpers import Helpers
+from classes.tracker import Tracker
+from cogs.lookups import Lookups
+from cogs.updates import Updates
+
+# calls measured for allocations; tracemalloc is too slow for every call
+ALLOCATION_CALLS = 50
+
+
+class Case:
+    """
+    One benchmark: a name and a callable, sync or async,
+    that performs a single operation
+    """
+    def __init__(self, name, func):
+        self.name = name
+        self.func = func
+
+
+async def call(func):
+    """
+    Run a case once, awaiting it if it is async
+    :param func: callable
+    :return: none
+    """
+    result = func()
+
+    if inspect.isawaitable(result):
+        await result
+
+
+async def measure(case, iterations, warmup):
+    """
+    Time a case, then measure its allocations
+    :param case: Case
+    :param iterations: int, timed calls
+    :param warmup: int, untimed calls first
+    :return: dictionary of results
+    """
+    for _ in range(warmup):
+        await call(case.func)
+
+    timings = []
+
+    for _ in range(iterations):
+        start = time.perf_counter_ns()
+        await call(case.func)
+        timings.append(time.perf_counter_ns() - start)
+
+    peaks = []
+    tracemalloc.start()
+
+    for _ in range(min(iterations, ALLOCATION_CALLS)):
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        await call(case.func)
+        peaks.append(tracemalloc.get_traced_memory()[1] - before)
+
+    tracemalloc.stop()
+    timings.sort()
+
+    return {
+        'name': case.name,
+        'calls': iterations,
+        'p50': percentile(timings, 50),
+        'p95': percentile(timings, 95),
+        'p99': percentile(timings, 99),
+        'max': timings[-1],
+        'peak': statistics.mean(peaks) if len(peaks) > 0 else 0
+    }
+
+
+def percentile(values, pct):
+    """
+    Nearest-rank percentile of sorted values
+    :param values: sorted list of numbers
+    :param pct: int, 0-100
+    :return: number
+    """
+    rank = max(0, min(len(values) - 1, round(pct / 100 * len(values)) - 1))
+
+    return values[rank]
+
+
+def build_cases(synthetic):
+    """
+    Every benchmark case, wired to the synthetic guild
+    :param synthetic: SyntheticGuild, already installed
+    :return: list of Case
+    """
+    bot = synthetic.bot
+    guild = synthetic.guild
+    author = guild.members[0]
+    helper = Helpers(bot, guild.name)
+    database = Database()
+    async_database = AsyncDatabase()
+    lookups = Lookups(bot, async_database, helper, Tracker())
+    updates = Updates(bot, async_database, helper, Tracker())
+
+    helper.load_members()
+
+    rng = synthetic.random
+    characters = synthetic.characters
+    char_names = [row['char_name'] for row in characters]
+    prefixes = [name[:rng.randint(1, 4)].lower() for name in rng.sample(char_names, 200)]
+    display_prefixes = [member.display_name[:2] for member in rng.sample(guild.members, 200)]
+    samples = {'prefix': 0, 'display': 0, 'char': 0}
+
+    def next_sample(kind, values):
+        samples[kind] = (samples[kind] + 1) % len(values)
+        return values[samples[kind]]
+
+    zone_rows = [row for row in synthetic.respawns if row['mob_zone'] == BIG_ZONE]
+    char_rows = characters[:5]
+    pages = [synthetic.respawn_page(), synthetic.respawn_page()]
+    mob_names = [row['mob_name'] for row in synthetic.respawns]
+    tracker = Tracker()
+    sync_round = [0]
+
+    def respawn_sync():
+        # scrape parsing and the lockout write, without the download;
+        # alternate pages so every round has changes to write
+        sync_round[0] += 1
+        respawn_map = tracker.build_respawn_index(pages[sync_round[0] % 2], mob_names)
+        database.sync_mob_respawns(respawn_map)
+
+    async def lookup_command():
+        character = next_sample('char', characters)
+        ctx = FakeContext(guild, author, "lookup_characters")
+        await lookups.lookup_characters.callback(lookups, ctx, synthetic.combined_name(character))
+
+    async def zone_command():
+        ctx = FakeContext(guild, author, "get_zone_respawns")
+        await lookups.get_zone_respawns.callback(lookups, ctx, BIG_ZONE)
+
+    return [
+        Case("autocomplete: char names (updates cog)", lambda: updates.char_name_autocompletion(
+            FakeAutocompleteContext(next_sample('prefix', prefixes)))),
+        Case("autocomplete: combined names (lookups cog)", lambda: lookups.combined_name_autocompletion(
+            FakeAutocompleteContext(next_sample('prefix', prefixes)))),
+        Case("autocomplete: discord names (lookups cog)", lambda: lookups.discord_name_autocompletion(
+            FakeAutocompleteContext(next_sample('display', display_prefixes)))),
+        Case("autocomplete: zones (lookups cog)", lambda: lookups.zone_list_autocompletion(
+            FakeAutocompleteContext("te"))),
+        Case("Database.lookup_characters", lambda: database.lookup_characters(
+            next_sample('char', characters)['char_name'])),
+        Case("AsyncDatabase.lookup_profile", lambda: async_database.lookup_profile(
+            next_sample('char', characters)['char_name'])),
+        Case("/lookup_characters", lookup_command),
+        Case("Database.get_zone_respawns", lambda: database.get_zone_respawns(BIG_ZONE)),
+        Case("/get_zone_respawns", zone_command),
+        Case("format_mob_message (zone)", lambda: helper.format_mob_message(
+            zone_rows, "zone", BIG_ZONE, database.cache_version('respawns'))),
+        Case("format_char_message", lambda: helper.format_char_message(
+            char_rows, char_rows[0]['char_name'], database.cache_version('roster'))),
+        Case("respawn sync (parse + diff + write)", respawn_sync),
+        Case("Database.get_mobs_up", database.get_mobs_up),
+    ]
+
+
+def report(results):
+    """
+    Print the results table
+    :param results: list of result dictionaries
+    :return: none
+    """
+    row = "{:<44} {:>7} {:>10} {:>10} {:>10} {:>10} {:>10}"
+    print(row.format("case", "calls", "p50 us", "p95 us", "p99 us", "max us", "peak KiB"))
+    print("-" * 107)
+
+    for result in results:
+        print(row.format(
+            result['name'],
+            result['calls'],
+            f"{result['p50'] / 1000:.1f}",
+            f"{result['p95'] / 1000:.1f}",
+            f"{result['p99'] / 1000:.1f}",
+            f"{result['max'] / 1000:.1f}",
+            f"{result['peak'] / 1024:.1f}"
+        ))
+
+
+async def main(arguments):
+    with tempfile.TemporaryDirectory() as directory:
+        synthetic = SyntheticGuild(
+            directory, members=arguments.members, zones=arguments.zones, seed=arguments.seed
+        )
+        synthetic.install()
+
+        print(
+            f"{len(synthetic.guild.members)} members, {len(synthetic.characters)} characters, "
+            f"{len(synthetic.respawns)} mobs in {len(synthetic.zones)} zones\n"
+        )
+
+        results = []
+
+        for case in build_cases(synthetic):
+            if arguments.filter is None or arguments.filter.lower() in case.name.lower():
+                results.append(await measure(case, arguments.iterations, arguments.warmup))
+
+        report(results)
+        await AsyncDatabase.dispose_engine()
+        Database.dispose_engine()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the bot's hot paths offline")
+    parser.add_argument('--members', type=int, default=1000, help="guild members to generate")
+    parser.add_argument('--zones', type=int, default=40, help="zones of 20 mobs to generate")
+    parser.add_argument('--iterations', type=int, default=500, help="timed calls per case")
+    parser.add_argument('--warmup', type=int, default=20, help="untimed calls per case")
+    parser.add_argument('--seed', type=int, default=1, help="random seed for the data")
+    parser.add_argument('--filter', help="only run cases whose name contains this")
+
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,172 @@
+import atexit
+import gzip
+import os
+import queue
+import shutil
+import threading
+from datetime import datetime
+
+LOG_PATH = os.path.join("logs", "bot-log.txt")
+# rotate once the live file passes this size, or the day changes
+MAX_LOG_BYTES = 5 * 1024 * 1024
+# seconds the writer waits to gather a batch before flushing
+FLUSH_INTERVAL = 1.0
+# flush early once this many lines are waiting
+MAX_BATCH = 200
+
+
+class ActivityLogger:
+    """
+    This class writes the command activity log from a background
+    thread; callers only format a line and put it on a queue, and
+    the writer appends batches, rotating and gzipping old files
+    """
+    def __init__(self, path=LOG_PATH, max_bytes=MAX_LOG_BYTES,
+                 flush_interval=FLUSH_INTERVAL, echo=True):
+        self._path = path
+        self._max_bytes = max_bytes
+        self._flush_interval = flush_interval
+        self._echo = echo               # also print each line to console
+        self._queue = queue.SimpleQueue()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def log(self, line):
+        """
+        Queue one log line; never touches the disk
+        :param line: string, without trailing newline
+        :return: none
+        """
+        if self._thread is None:
+            self._start()
+
+        self._queue.put(line)
+
+    def close(self):
+        """
+        Flush everything queued and stop the writer
+        :return: none
+        """
+        if self._thread is None:
+            return
+
+        self._stopped.set()
+        self._queue.put(None)           # wake the writer
+        self._thread.join()
+        self._thread = None
+
+    def _start(self):
+        """
+        Start the writer thread on first use
+        :return: none
+        """
+        with self._lock:
+            if self._thread is not None:
+                return
+
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._run, name="activity-log", daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+
+    def _run(self):
+        """
+        Writer loop: block for a line, gather whatever else arrives
+        within the flush interval, then write the batch at once
+        :return: none
+        """
+        while True:
+            batch = []
+            line = self._queue.get()
+
+            if line is not None:
+                batch.append(line)
+
+            # collect a batch, but cut it short on shutdown
+            while len(batch) < MAX_BATCH and not self._stopped.is_set():
+                try:
+                    line = self._queue.get(timeout=self._flush_interval)
+                except queue.Empty:
+                    break
+
+                if line is not None:
+                    batch.append(line)
+
+            # drain anything left once we have been asked to stop
+            if self._stopped.is_set():
+                while True:
+                    try:
+                        line = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+
+                    if line is not None:
+                        batch.append(line)
+
+            if len(batch) > 0:
+                self._write(batch)
+
+            if self._stopped.is_set():
+                return
+
+    def _write(self, batch):
+        """
+        Append a batch of lines, rotating first if needed; a
+        failed write is reported but never stops the writer
+        :param batch: list of strings
+        :return: none
+        """
+        text = "\n".join(batch) + "\n"
+
+        if self._echo:
+            print(text, end="")
+
+        try:
+            self._rotate_if_needed(len(text))
+
+            with open(self._path, 'a', encoding='utf-8') as file:
+                file.write(text)
+        except OSError as err:
+            print(f"activity log write failed: {err}")
+
+    def _rotate_if_needed(self, incoming):
+        """
+        Move the live file aside and gzip it when it would grow
+        past the size limit or was last written on another day
+        :param incoming: int, bytes about to be appended
+        :return: none
+        """
+        directory = os.path.dirname(self._path)
+
+        if directory != "":
+            os.makedirs(directory, exist_ok=True)
+
+        if not os.path.exists(self._path):
+            return
+
+        stat = os.stat(self._path)
+        modified = datetime.fromtimestamp(stat.st_mtime)
+
+        if stat.st_size + incoming <= self._max_bytes and modified.date() == datetime.now().date():
+            return
+
+        base, extension = os.path.splitext(self._path)
+        rotated = f"{base}-{modified:%Y%m%d-%H%M%S}{extension}"
+        suffix = 1
+
+        # never overwrite an archive from an earlier rotation
+        while os.path.exists(rotated + ".gz"):
+            rotated = f"{base}-{modified:%Y%m%d-%H%M%S}-{suffix}{extension}"
+            suffix += 1
+
+        os.replace(self._path, rotated)
+
+        with open(rotated, 'rb') as source, gzip.open(rotated + ".gz", 'wb') as target:
+            shutil.copyfileobj(source, target)
+
+        os.remove(rotated)
+
+
+# one logger for the whole process
+activity_logger = ActivityLogger()
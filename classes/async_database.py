@@ -0,0 +1,169 @@
+import inspect
+from sqlalchemy.ext.asyncio import create_async_engine
+from classes.database import Database
+from classes.metrics import timed
+from classes.single_flight import SingleFlight
+
+
+class AsyncDatabase(Database):
+    """
+    This class provides the same database interaction as
+    Database, but every query method is awaitable, so the
+    cogs never block the Discord event loop on MySQL; methods
+    built on other queries (query_flow) are shared with Database
+    and become coroutines here through run_flow
+    """
+    # one async engine (and pool) shared by every instance
+    _async_engine = None
+    # identical reads in flight at once share one query
+    _flights = SingleFlight()
+
+    def __init__(self):
+        super().__init__()
+
+        # same database as the synchronous class, async driver
+        self._async_params = self._backend.url(async_driver=True)
+
+    ################# READ METHODS #################
+    async def lookup_profile(self, char_name):
+        """
+        Get every character sharing an owner with char_name, with the
+        owner's discord id; concurrent lookups of one name share a query
+        :char_name: the name to look up
+        :return: results of the select query, in list form; shared
+        between callers, so it must not be modified
+        """
+        return await AsyncDatabase._flights.do(
+            ('lookup_profile', char_name.lower()),
+            lambda: super(AsyncDatabase, self).lookup_profile(char_name)
+        )
+
+    async def load_roster(self):
+        """
+        Fill the roster cache from the characters and members tables;
+        commands arriving while it loads wait for the same load
+        :return: none
+        """
+        await AsyncDatabase._flights.do('load_roster', lambda: super(AsyncDatabase, self).load_roster())
+
+    ################# UTILITY METHODS #################
+    def create_engine(self):
+        """
+        return the process-wide async engine, creating it on
+        first use; must be called from within the running loop
+        :return: SQL alchemy AsyncEngine object
+        """
+        if AsyncDatabase._async_engine is None:
+            engine = create_async_engine(
+                self._async_params,
+                pool_size=self._pool_size,
+                max_overflow=self._max_overflow,
+                pool_timeout=self._pool_timeout,
+                pool_recycle=self._pool_recycle,
+                pool_pre_ping=self._pool_pre_ping,
+                query_cache_size=self._query_cache_size,
+                **self._backend.engine_options(async_driver=True)
+            )
+            self._backend.prepare(engine.sync_engine)
+            AsyncDatabase._async_engine = engine
+
+        return AsyncDatabase._async_engine
+
+    @timed('database')
+    async def execute_read(self, query, params=None, field=None):
+        """
+        Send a read query to database engine
+        :query: the statement to send to database engine,
+        a module-level text() construct or a query string
+        :params: optional dict of bound parameter values
+        :field: optional column name; if given, return just
+        that column's values instead of whole rows
+        :return: results of the operation, in list form
+        """
+        records_list = []
+
+        async with self.create_engine().connect() as conn:
+            result = await conn.execute(self.as_statement(query), params)
+
+            for row in result.all():
+                records_list.append(row._asdict())
+
+        if field is not None:
+            return self.get_list(records_list, field)
+
+        return records_list
+
+    @timed('database')
+    async def execute_update(self, query, params=None, on_success=None):
+        """
+        Send an update query to database engine
+        :query: the statement to send to database engine,
+        a module-level text() construct or a query string
+        :params: optional dict of bound parameter values
+        :on_success: optional callable, run once the write has
+        committed and changed at least one row
+        :return: int, representing the results of the operation
+        """
+        async with self.create_engine().connect() as conn:
+            # get a count of rows affected, to act as
+            # indicator of success or failure
+            result = (await conn.execute(self.as_statement(query), params)).rowcount
+            await conn.commit()
+
+        # keep in-memory copies in step with what was written
+        if on_success is not None and result > 0:
+            on_success()
+
+        return result
+
+    @timed('database')
+    async def execute_transaction(self, steps):
+        """
+        Send several statements to database engine inside one
+        transaction, so they all apply or none do
+        :steps: list of (statement, params) tuples; params may be
+        a dict, a list of dicts (executemany) or None
+        :return: list of int rowcounts, one per step
+        """
+        results = []
+
+        async with self.create_engine().begin() as conn:
+            for query, params in steps:
+                results.append((await conn.execute(self.as_statement(query), params)).rowcount)
+
+        return results
+
+    async def run_flow(self, flow):
+        """
+        Run a query_flow method, awaiting each query it yields
+        and sending the result back; a failed query is raised
+        inside the method, as it would be in Database
+        :param flow: generator from a query_flow method
+        :return: the method's return value
+        """
+        result = None
+        error = None
+
+        try:
+            while True:
+                if error is not None:
+                    step, error = flow.throw(error), None
+                else:
+                    step = flow.send(result)
+
+                try:
+                    result = await step if inspect.isawaitable(step) else step
+                except Exception as exc:
+                    error = exc
+        except StopIteration as stop:
+            return stop.value
+
+    @classmethod
+    async def dispose_engine(cls):
+        """
+        close every pooled connection, e.g. on shutdown
+        :return: none
+        """
+        if cls._async_engine is not None:
+            await cls._async_engine.dispose()
+            cls._async_engine = None
@@ -0,0 +1,164 @@
+from bisect import bisect_left
+
+# Discord shows at most 25 autocomplete choices
+MAX_CHOICES = 25
+# substring queries of this length or more use the trigram index
+GRAM_SIZE = 3
+
+
+class AutocompleteIndex:
+    """
+    This class answers autocomplete queries over a list of
+    choices; keys are case folded once up front, prefix matches
+    come from a sorted key list and substring matches from a
+    trigram index, and results are ranked and capped
+    """
+    def __init__(self, values=()):
+        self._source = None
+        self._version = None
+        self._build(values)
+
+    def refresh(self, values, version=0):
+        """
+        Rebuild the index only if the choices have changed
+        :param values: list of choice strings
+        :param version: anything that changes when the list's
+        contents change (for lists that are updated in place)
+        :return: none
+        """
+        if values is self._source and version == self._version:
+            return
+
+        self._build(values)
+        self._source = values
+        self._version = version
+
+    def search(self, query, limit=MAX_CHOICES):
+        """
+        Find choices containing the query, case insensitively;
+        ranked prefix matches first, then matches at the start
+        of a word, then any other substring match
+        :param query: string typed so far
+        :param limit: maximum number of choices to return
+        :return: list of choice strings
+        """
+        needle = query.casefold()
+
+        # nothing typed yet, offer the list as is
+        if needle == "":
+            return self._values[:limit]
+
+        results = []
+        seen = set()
+
+        # tier one: prefix matches, straight from the sorted keys
+        start = bisect_left(self._sorted_keys, needle)
+
+        for position in range(start, len(self._sorted_keys)):
+            if not self._sorted_keys[position].startswith(needle):
+                break
+
+            index = self._sorted_order[position]
+            seen.add(index)
+            results.append(self._values[index])
+
+            if len(results) == limit:
+                return results
+
+        # tiers two and three: other substring matches, in list order
+        word_matches = []
+        other_matches = []
+
+        for index in self._candidates(needle):
+            if index in seen:
+                continue
+
+            key = self._keys[index]
+
+            if needle not in key:
+                continue
+
+            if self._at_word_start(key, needle):
+                word_matches.append(self._values[index])
+
+                # word starts outrank everything left, so stop once full
+                if len(results) + len(word_matches) == limit:
+                    break
+            else:
+                other_matches.append(self._values[index])
+
+        results.extend(word_matches)
+        results.extend(other_matches)
+
+        return results[:limit]
+
+    def __len__(self):
+        return len(self._values)
+
+    def _build(self, values):
+        """
+        Normalise the choices and build the prefix and trigram indexes
+        :param values: list of choice strings
+        :return: none
+        """
+        self._values = list(values)
+        self._keys = [value.casefold() for value in self._values]
+
+        self._sorted_order = sorted(range(len(self._keys)), key=self._keys.__getitem__)
+        self._sorted_keys = [self._keys[index] for index in self._sorted_order]
+
+        # trigram -> ascending list of choice positions
+        self._grams = {}
+
+        for index, key in enumerate(self._keys):
+            for gram in {key[i:i + GRAM_SIZE] for i in range(len(key) - GRAM_SIZE + 1)}:
+                self._grams.setdefault(gram, []).append(index)
+
+    def _candidates(self, needle):
+        """
+        Narrow the choices that could contain the query
+        :param needle: case folded query
+        :return: iterable of choice positions, ascending
+        """
+        # too short for trigrams, every choice is a candidate
+        if len(needle) < GRAM_SIZE:
+            return range(len(self._keys))
+
+        postings = []
+
+        for i in range(len(needle) - GRAM_SIZE + 1):
+            posting = self._grams.get(needle[i:i + GRAM_SIZE])
+
+            # a trigram no choice contains means no match at all
+            if posting is None:
+                return ()
+
+            postings.append(posting)
+
+        # intersect starting from the rarest trigram
+        postings.sort(key=len)
+        candidates = set(postings[0])
+
+        for posting in postings[1:]:
+            candidates.intersection_update(posting)
+
+            if len(candidates) == 0:
+                break
+
+        return sorted(candidates)
+
+    @staticmethod
+    def _at_word_start(key, needle):
+        """
+        Check whether any occurrence of the query begins a word
+        :return: boolean
+        """
+        position = key.find(needle)
+
+        while position != -1:
+            if position == 0 or not key[position - 1].isalnum():
+                return True
+
+            position = key.find(needle, position + 1)
+
+        return False
@@ -0,0 +1,393 @@
+import os
+from os import environ
+from sqlalchemy import event
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+# file used by the sqlite backend unless SQLITE_PATH is set
+SQLITE_PATH = os.path.join("data", "sos_bot.db")
+# every statement names its tables in this schema; SQLite
+# attaches its database file under the same name
+SCHEMA_NAME = "sos_bot"
+# tables whose changes are logged to row_changes, with the key
+# column written for each changed row
+CHANGE_LOG_KEYS = {'characters': 'char_name', 'members': 'discord_id', 'respawns': 'mob_name'}
+
+
+class MySQLBackend:
+    """
+    The bot's MySQL server, reached over the network with
+    pymysql (or aiomysql for the async engine)
+    """
+    name = "mysql"
+
+    # migration bookkeeping, created before anything else
+    version_statements = [
+        f"CREATE DATABASE IF NOT EXISTS {SCHEMA_NAME}",
+        f"CREATE TABLE IF NOT EXISTS {SCHEMA_NAME}.schema_version ("
+        "version INT NOT NULL, description VARCHAR(255) NOT NULL, "
+        "applied_at DATETIME NOT NULL, PRIMARY KEY (version))"
+    ]
+
+    # tables as the bot expects them, created only if missing;
+    # secondary indexes are added by their own migration
+    schema_statements = [
+        f"CREATE TABLE IF NOT EXISTS {SCHEMA_NAME}.characters ("
+        "discord_id VARCHAR(32) NOT NULL, char_name VARCHAR(64) NOT NULL COLLATE utf8mb4_unicode_ci, "
+        "char_race VARCHAR(32), char_class VARCHAR(32), char_type VARCHAR(16), "
+        "is_officer TINYINT NOT NULL DEFAULT 0, char_priority INT NOT NULL DEFAULT 3, "
+        "PRIMARY KEY (char_name))",
+        f"CREATE TABLE IF NOT EXISTS {SCHEMA_NAME}.members ("
+        "discord_id VARCHAR(32) NOT NULL, PRIMARY KEY (discord_id))",
+        f"CREATE TABLE IF NOT EXISTS {SCHEMA_NAME}.respawns ("
+        "mob_name VARCHAR(64) NOT NULL COLLATE utf8mb4_unicode_ci, "
+        "mob_zone VARCHAR(64) NOT NULL COLLATE utf8mb4_unicode_ci, kill_time DATETIME NULL, respawn_time DATETIME NULL, "
+        "time_zone VARCHAR(64) NOT NULL DEFAULT 'UTC', "
+        "lockout_weeks INT NOT NULL DEFAULT 0, lockout_days INT NOT NULL DEFAULT 0, "
+        "lockout_hours INT NOT NULL DEFAULT 0, lockout_minutes INT NOT NULL DEFAULT 0, "
+        "PRIMARY KEY (mob_name))"
+    ]
+
+    # kill times CONVERT_TZ cannot move to UTC, by zone: it gives NULL
+    # for a zone the server does not know, or for every named zone
+    # when its time zone tables are not loaded
+    unconverted_statement = (
+        f"SELECT DISTINCT time_zone FROM {SCHEMA_NAME}.respawns "
+        "WHERE kill_time IS NOT NULL AND time_zone <> 'UTC' "
+        "AND CONVERT_TZ(kill_time, time_zone, '+00:00') IS NULL"
+    )
+
+    # conversion of a respawns table from text to native columns;
+    # existing times are moved from their time_zone to UTC, and only
+    # rows that converted are relabelled
+    convert_statements = [
+        f"ALTER TABLE {SCHEMA_NAME}.respawns "
+        "MODIFY kill_time DATETIME NULL, MODIFY respawn_time DATETIME NULL, "
+        "MODIFY lockout_weeks INT NOT NULL DEFAULT 0, MODIFY lockout_days INT NOT NULL DEFAULT 0, "
+        "MODIFY lockout_hours INT NOT NULL DEFAULT 0, MODIFY lockout_minutes INT NOT NULL DEFAULT 0",
+        f"UPDATE {SCHEMA_NAME}.respawns "
+        "SET kill_time = CONVERT_TZ(kill_time, time_zone, '+00:00'), time_zone = 'UTC' "
+        "WHERE kill_time IS NOT NULL AND time_zone <> 'UTC' "
+        "AND CONVERT_TZ(kill_time, time_zone, '+00:00') IS NOT NULL"
+    ]
+
+    # names compare and sort ignoring case, as the roster cache and
+    # respawn index match them; unicode_ci also ignores accents, which
+    # in-game names do not use
+    collation_statements = [
+        f"ALTER TABLE {SCHEMA_NAME}.characters "
+        "MODIFY char_name VARCHAR(64) CHARACTER SET utf8mb4 NOT NULL COLLATE utf8mb4_unicode_ci",
+        f"ALTER TABLE {SCHEMA_NAME}.respawns "
+        "MODIFY mob_name VARCHAR(64) CHARACTER SET utf8mb4 NOT NULL COLLATE utf8mb4_unicode_ci, "
+        "MODIFY mob_zone VARCHAR(64) CHARACTER SET utf8mb4 NOT NULL COLLATE utf8mb4_unicode_ci"
+    ]
+
+    def __init__(self):
+        # obtain database parameters securely as environment variables
+        self._user = environ.get('MYSQL_USER')
+        self._password = environ.get('MYSQL_PASSWORD')
+        self._host = environ.get('MYSQL_HOST')
+        self._db = environ.get('MYSQL_DB')
+
+    def url(self, async_driver=False):
+        """
+        Connection string for the sync or async driver
+        :param async_driver: boolean
+        :return: string
+        """
+        driver = "aiomysql" if async_driver else "pymysql"
+
+        return f"mysql+{driver}://{self._user}:{self._password}@{self._host}/{self._db}?charset=utf8mb4"
+
+    def engine_options(self, async_driver=False):
+        """
+        Extra create_engine arguments for this backend
+        :param async_driver: boolean
+        :return: dictionary
+        """
+        return {}
+
+    def prepare(self, engine):
+        """
+        Set up a new engine; MySQL needs nothing
+        :param engine: SQLAlchemy Engine (the sync_engine of an async one)
+        :return: none
+        """
+        return None
+
+    def add_minutes(self, column, minutes):
+        """
+        SQL for a DATETIME column moved on by a number of minutes
+        :param column: string, column name
+        :param minutes: string, SQL expression for the minutes
+        :return: string
+        """
+        return f"{column} + INTERVAL {minutes} MINUTE"
+
+    def create_index(self, name, table_name, columns):
+        """
+        SQL creating an index in the sos_bot schema
+        :param name: string, index name
+        :param table_name: string
+        :param columns: tuple of column names
+        :return: string
+        """
+        return f"CREATE INDEX {name} ON {SCHEMA_NAME}.{table_name} ({', '.join(columns)})"
+
+    def change_log_statements(self):
+        """
+        SQL creating the row_changes table, and the triggers that
+        log the key of every row written to CHANGE_LOG_KEYS tables
+        (an update logs the old key and the new, once if unchanged)
+        :return: list of strings
+        """
+        statements = [
+            f"CREATE TABLE IF NOT EXISTS {SCHEMA_NAME}.row_changes ("
+            "seq BIGINT NOT NULL AUTO_INCREMENT, table_name VARCHAR(16) NOT NULL, "
+            "row_key VARCHAR(64) NOT NULL, PRIMARY KEY (seq))"
+        ]
+
+        for table_name, key in CHANGE_LOG_KEYS.items():
+            for action, values in (
+                ('INSERT', f"VALUES ('{table_name}', NEW.{key})"),
+                ('UPDATE', f"SELECT '{table_name}', OLD.{key} UNION SELECT '{table_name}', NEW.{key}"),
+                ('DELETE', f"VALUES ('{table_name}', OLD.{key})")
+            ):
+                statements.append(
+                    f"CREATE TRIGGER IF NOT EXISTS {SCHEMA_NAME}.{table_name}_{action.lower()}_log "
+                    f"AFTER {action} ON {SCHEMA_NAME}.{table_name} FOR EACH ROW "
+                    f"INSERT INTO {SCHEMA_NAME}.row_changes (table_name, row_key) {values}"
+                )
+
+        return statements
+
+    def get_indexes(self, database, table_name):
+        """
+        Every index on a table, with its columns in order
+        :param database: Database to read through
+        :param table_name: string
+        :return: dictionary of index name -> tuple of column names
+        """
+        rows = database.execute_read(
+            "SELECT index_name AS index_name, column_name AS column_name "
+            "FROM information_schema.statistics "
+            "WHERE table_schema = :schema AND table_name = :table_name "
+            "ORDER BY index_name, seq_in_index",
+            {'schema': SCHEMA_NAME, 'table_name': table_name}
+        )
+        indexes = {}
+
+        for row in rows:
+            indexes[row['index_name']] = indexes.get(row['index_name'], ()) + (row['column_name'],)
+
+        return indexes
+
+    def explain(self, sql):
+        """
+        SQL asking for a statement's query plan
+        :param sql: string, the statement
+        :return: string
+        """
+        return f"EXPLAIN {sql}"
+
+    def describe_plan(self, row):
+        """
+        One line of a query plan, and whether it reads a whole table
+        :param row: dict, one row of EXPLAIN output
+        :return: tuple of (string, boolean)
+        """
+        line = (
+            f"{row.get('table')}: type={row.get('type')} key={row.get('key')} "
+            f"rows={row.get('rows')} {row.get('Extra') or ''}"
+        )
+
+        return line.strip(), row.get('type') == 'ALL'
+
+
+class SQLiteBackend:
+    """
+    A local SQLite file, for small deployments and test hosts:
+    no server and no network hop; the file is attached as the
+    sos_bot schema, so every statement runs unchanged
+    """
+    name = "sqlite"
+
+    version_statements = [
+        f"CREATE TABLE IF NOT EXISTS {SCHEMA_NAME}.schema_version ("
+        "version INTEGER NOT NULL PRIMARY KEY, description TEXT NOT NULL, "
+        "applied_at DATETIME NOT NULL)"
+    ]
+
+    schema_statements = [
+        f"CREATE TABLE IF NOT EXISTS {SCHEMA_NAME}.characters ("
+        "discord_id TEXT NOT NULL, char_name TEXT NOT NULL COLLATE NOCASE PRIMARY KEY, "
+        "char_race TEXT, char_class TEXT, char_type TEXT, "
+        "is_officer INTEGER NOT NULL DEFAULT 0, char_priority INTEGER NOT NULL DEFAULT 3)",
+        f"CREATE TABLE IF NOT EXISTS {SCHEMA_NAME}.members ("
+        "discord_id TEXT NOT NULL PRIMARY KEY)",
+        f"CREATE TABLE IF NOT EXISTS {SCHEMA_NAME}.respawns ("
+        "mob_name TEXT NOT NULL COLLATE NOCASE PRIMARY KEY, mob_zone TEXT NOT NULL COLLATE NOCASE, "
+        "kill_time DATETIME, respawn_time DATETIME, time_zone TEXT NOT NULL DEFAULT 'UTC', "
+        "lockout_weeks INTEGER NOT NULL DEFAULT 0, lockout_days INTEGER NOT NULL DEFAULT 0, "
+        "lockout_hours INTEGER NOT NULL DEFAULT 0, lockout_minutes INTEGER NOT NULL DEFAULT 0)"
+    ]
+
+    # tables are always created with native columns
+    unconverted_statement = None
+    convert_statements = []
+
+    # SQLite cannot change a column's collation, so the tables with
+    # name columns are copied into new ones created as above; the
+    # copy drops their indexes and triggers, which the migration
+    # creates again
+    collation_statements = [
+        statement
+        for table_name, create in (('characters', schema_statements[0]), ('respawns', schema_statements[2]))
+        for statement in (
+            create.replace(f"{SCHEMA_NAME}.{table_name} (", f"{SCHEMA_NAME}.{table_name}_nocase ("),
+            f"INSERT INTO {SCHEMA_NAME}.{table_name}_nocase SELECT * FROM {SCHEMA_NAME}.{table_name}",
+            f"DROP TABLE {SCHEMA_NAME}.{table_name}",
+            f"ALTER TABLE {SCHEMA_NAME}.{table_name}_nocase RENAME TO {table_name}"
+        )
+    ]
+
+    def __init__(self):
+        self._path = environ.get('SQLITE_PATH', SQLITE_PATH)
+
+    def url(self, async_driver=False):
+        """
+        Connection string; the main database is a throwaway
+        in-memory one, the data lives in the attached file
+        :param async_driver: boolean
+        :return: string
+        """
+        return "sqlite+aiosqlite://" if async_driver else "sqlite://"
+
+    def engine_options(self, async_driver=False):
+        """
+        Extra create_engine arguments: a real pool, where SQLite
+        in memory would otherwise share one connection
+        :param async_driver: boolean
+        :return: dictionary
+        """
+        return {'poolclass': AsyncAdaptedQueuePool if async_driver else QueuePool}
+
+    def prepare(self, engine):
+        """
+        Attach the database file to every new connection
+        :param engine: SQLAlchemy Engine (the sync_engine of an async one)
+        :return: none
+        """
+        directory = os.path.dirname(self._path)
+
+        if directory != "":
+            os.makedirs(directory, exist_ok=True)
+
+        @event.listens_for(engine, "connect")
+        def attach(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            cursor.execute(f"ATTACH DATABASE ? AS {SCHEMA_NAME}", (self._path,))
+            # readers do not block the writer, and a busy writer is
+            # waited for instead of failing at once
+            cursor.execute(f"PRAGMA {SCHEMA_NAME}.journal_mode = WAL")
+            cursor.execute("PRAGMA busy_timeout = 5000")
+            cursor.close()
+
+    def add_minutes(self, column, minutes):
+        """
+        SQL for a DATETIME column moved on by a number of minutes
+        :param column: string, column name
+        :param minutes: string, SQL expression for the minutes
+        :return: string
+        """
+        return f"datetime({column}, '+' || {minutes} || ' minutes')"
+
+    def create_index(self, name, table_name, columns):
+        """
+        SQL creating an index in the sos_bot schema; SQLite names
+        the schema on the index, not the table
+        :param name: string, index name
+        :param table_name: string
+        :param columns: tuple of column names
+        :return: string
+        """
+        return f"CREATE INDEX {SCHEMA_NAME}.{name} ON {table_name} ({', '.join(columns)})"
+
+    def change_log_statements(self):
+        """
+        SQL creating the row_changes table, and the triggers that
+        log the key of every row written to CHANGE_LOG_KEYS tables,
+        as the MySQL backend does; a trigger body names its tables without the schema, so they
+        resolve to the attached file the trigger lives in
+        :return: list of strings
+        """
+        statements = [
+            f"CREATE TABLE IF NOT EXISTS {SCHEMA_NAME}.row_changes ("
+            "seq INTEGER PRIMARY KEY AUTOINCREMENT, table_name TEXT NOT NULL, "
+            "row_key TEXT NOT NULL)"
+        ]
+
+        for table_name, key in CHANGE_LOG_KEYS.items():
+            for action, values in (
+                ('INSERT', f"VALUES ('{table_name}', NEW.{key})"),
+                ('UPDATE', f"SELECT '{table_name}', OLD.{key} UNION SELECT '{table_name}', NEW.{key}"),
+                ('DELETE', f"VALUES ('{table_name}', OLD.{key})")
+            ):
+                statements.append(
+                    f"CREATE TRIGGER IF NOT EXISTS {SCHEMA_NAME}.{table_name}_{action.lower()}_log "
+                    f"AFTER {action} ON {table_name} FOR EACH ROW BEGIN "
+                    f"INSERT INTO row_changes (table_name, row_key) {values}; END"
+                )
+
+        return statements
+
+    def get_indexes(self, database, table_name):
+        """
+        Every index on a table, with its columns in order,
+        including those SQLite makes for primary keys
+        :param database: Database to read through
+        :param table_name: string
+        :return: dictionary of index name -> tuple of column names
+        """
+        indexes = {}
+
+        for index in database.execute_read(f"PRAGMA {SCHEMA_NAME}.index_list({table_name})"):
+            columns = database.execute_read(f"PRAGMA {SCHEMA_NAME}.index_info({index['name']})")
+            columns.sort(key=lambda row: row['seqno'])
+            indexes[index['name']] = tuple(row['name'] for row in columns)
+
+        return indexes
+
+    def explain(self, sql):
+        """
+        SQL asking for a statement's query plan
+        :param sql: string, the statement
+        :return: string
+        """
+        return f"EXPLAIN QUERY PLAN {sql}"
+
+    def describe_plan(self, row):
+        """
+        One line of a query plan, and whether it reads a whole table
+        :param row: dict, one row of EXPLAIN QUERY PLAN output
+        :return: tuple of (string, boolean)
+        """
+        detail = row.get('detail', '')
+
+        return detail, detail.startswith("SCAN") and "USING" not in detail
+
+
+def get_backend():
+    """
+    The backend selected by DATABASE_BACKEND: mysql (the
+    default), or sqlite for a single local database file
+    :return: backend instance
+    """
+    name = environ.get('DATABASE_BACKEND', 'mysql').lower()
+
+    if name == "sqlite":
+        return SQLiteBackend()
+
+    if name == "mysql":
+        return MySQLBackend()
+
+    raise ValueError(f"Unknown DATABASE_BACKEND: {name}")
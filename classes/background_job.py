@@ -0,0 +1,154 @@
+import asyncio
+import threading
+from datetime import datetime
+
+# seconds between progress checks while a job is running
+PROGRESS_INTERVAL = 2
+
+
+class BackgroundJob:
+    """
+    This class runs a blocking function in a worker thread
+    as an asyncio task, so slash commands can return at once;
+    it tracks status and progress and supports cancellation
+    """
+    def __init__(self, name, func, *args):
+        self.name = name
+        self._func = func
+        self._args = args
+        self._cancel_event = threading.Event()
+        self._task = None
+        self._on_progress = None
+
+        self.status = "pending"     # pending, running, done, failed, cancelled
+        self.progress = ""
+        self.result = None
+        self.error = None
+        self.started_at = None
+        self.finished_at = None
+
+    def start(self, on_progress=None):
+        """
+        Begin the job on the running event loop
+        :param on_progress: optional coroutine function, awaited with
+        this job whenever its progress or status changes
+        :return: the asyncio task running the job
+        """
+        self.status = "running"
+        self.started_at = datetime.now()
+        self._on_progress = on_progress
+        self._task = asyncio.create_task(self._run())
+
+        return self._task
+
+    async def watch(self, on_progress):
+        """
+        Attach a progress callback to a job that is already
+        running and report its current state straight away
+        :param on_progress: coroutine function, awaited with this job
+        :return: none
+        """
+        self._on_progress = on_progress
+        await self._notify()
+
+    def report(self, message):
+        """
+        Record a progress message; safe to call from the worker thread
+        :param message: string
+        :return: none
+        """
+        self.progress = message
+
+    def cancel(self):
+        """
+        Ask the job to stop; the worker checks this between stages
+        :return: boolean, True if the job was still running
+        """
+        if not self.is_running():
+            return False
+
+        self._cancel_event.set()
+        self.progress = "Cancelling..."
+
+        return True
+
+    def is_running(self):
+        """
+        Check whether the job has started and not yet finished
+        :return: boolean
+        """
+        return self.status == "running"
+
+    def describe(self):
+        """
+        Summarise the job for display to the user
+        :return: formatted string
+        """
+        message = f"{self.name}: {self.status.upper()}"
+
+        if self.started_at is not None:
+            message = message + f"\nStarted: {self.started_at:%Y-%m-%d %H:%M:%S}"
+
+        if self.finished_at is not None:
+            elapsed = (self.finished_at - self.started_at).total_seconds()
+            message = message + f"\nFinished: {self.finished_at:%Y-%m-%d %H:%M:%S} ({elapsed:.1f}s)"
+
+        if self.progress != "":
+            message = message + f"\n{self.progress}"
+
+        if self.error is not None:
+            message = message + f"\nError: {self.error}"
+
+        return message
+
+    async def _run(self):
+        """
+        Run the function in a thread, polling for progress
+        changes until it finishes
+        :return: none
+        """
+        worker = asyncio.ensure_future(asyncio.to_thread(
+            self._func, *self._args, progress=self.report, cancel=self._cancel_event
+        ))
+        shown = None
+
+        await self._notify()
+
+        # wake up periodically, but only notify when progress moved on,
+        # so Discord edits stay well under the rate limit
+        while not worker.done():
+            await asyncio.wait({worker}, timeout=PROGRESS_INTERVAL)
+
+            if self.progress != shown and not worker.done():
+                shown = self.progress
+                await self._notify()
+
+        try:
+            self.result = worker.result()
+
+            # a cancel that arrives after the last stage check is too
+            # late to stop anything, so only a None result counts
+            if self._cancel_event.is_set() and self.result is None:
+                self.status = "cancelled"
+            else:
+                self.status = "done"
+        except Exception as err:
+            self.status = "failed"
+            self.error = str(err)
+
+        self.finished_at = datetime.now()
+        await self._notify()
+
+    async def _notify(self):
+        """
+        Await the progress callback without letting its
+        errors (e.g. an expired interaction) kill the job
+        :return: none
+        """
+        if self._on_progress is None:
+            return
+
+        try:
+            await self._on_progress(self)
+        except Exception as err:
+            print(f"{self.name}: progress update failed: {err}")
@@ -0,0 +1,179 @@
+from bisect import bisect_left, insort
+
+
+class CombinedNames:
+    """
+    This class keeps the "[ char ] [ discord ]" list used by
+    character autocompletion; it is joined once on discord id
+    and then updated one character or member at a time
+    """
+    def __init__(self, member_index):
+        self._members = member_index
+        self._chars = {}        # lowercase char name -> (char name, discord id)
+        self._by_owner = {}     # discord id -> set of lowercase char names
+        self._entries = {}      # lowercase char name -> combined string
+        self._sorted = []       # combined strings, sorted
+
+        self.loaded = False
+        # bumped on every change, so dependent indexes know to rebuild
+        self.version = 0
+
+    def rebuild(self, characters):
+        """
+        Join every character to its guild member by discord id
+        :param characters: list of dict entries with discord_id and char_name
+        :return: none
+        """
+        self._chars = {}
+        self._by_owner = {}
+        self._entries = {}
+
+        for character in characters:
+            self._store(character['char_name'], character['discord_id'])
+
+        self._sorted = sorted(self._entries.values())
+        self.loaded = True
+        self.version += 1
+
+    def get_names(self):
+        """
+        Get the combined names, sorted; the list is shared,
+        so callers must not modify it
+        :return: list of strings
+        """
+        return self._sorted
+
+    def add_character(self, char_name, discord_id):
+        """
+        Add a newly inserted character
+        :param char_name: string
+        :param discord_id: Discord ID number
+        :return: none
+        """
+        if not self.loaded:
+            return
+
+        self.remove_character(char_name)
+        self._store(char_name, discord_id)
+        self._insert_entry(char_name.lower())
+        self.version += 1
+
+    def rename_character(self, char_name, new_name):
+        """
+        Follow a character's name change
+        :param char_name: string, the old name
+        :param new_name: string
+        :return: none
+        """
+        if not self.loaded:
+            return
+
+        entry = self._chars.get(char_name.lower())
+
+        if entry is None:
+            return
+
+        self.remove_character(char_name)
+        self.add_character(new_name, entry[1])
+
+    def remove_character(self, char_name):
+        """
+        Drop a deleted character
+        :param char_name: string
+        :return: none
+        """
+        if not self.loaded:
+            return
+
+        key = char_name.lower()
+        entry = self._chars.pop(key, None)
+
+        if entry is None:
+            return
+
+        owned = self._by_owner.get(entry[1])
+
+        if owned is not None:
+            owned.discard(key)
+
+            if len(owned) == 0:
+                del self._by_owner[entry[1]]
+
+        self._remove_entry(key)
+        self.version += 1
+
+    def refresh_member(self, discord_id):
+        """
+        Re-join one member's characters after the member
+        joined, left, or changed account name
+        :param discord_id: Discord ID number
+        :return: none
+        """
+        if not self.loaded:
+            return
+
+        for key in self._by_owner.get(self._normalize_id(discord_id), ()):
+            self._remove_entry(key)
+            self._insert_entry(key)
+
+        self.version += 1
+
+    def _store(self, char_name, discord_id):
+        """
+        Record a character and, if its owner is in the guild,
+        its combined string (not yet in the sorted list)
+        :return: none
+        """
+        key = char_name.lower()
+        owner = self._normalize_id(discord_id)
+
+        self._chars[key] = (char_name, owner)
+        self._by_owner.setdefault(owner, set()).add(key)
+
+        discord_name = self._members.get_name(owner)
+
+        if discord_name is not None:
+            self._entries[key] = f"[ {char_name} ]" + " " * 4 + f"[ {discord_name} ]"
+
+    def _insert_entry(self, key):
+        """
+        Build a character's combined string and place it in the sorted list
+        :return: none
+        """
+        char_name, owner = self._chars[key]
+        discord_name = self._members.get_name(owner)
+
+        # characters whose owner left the guild are not listed
+        if discord_name is None:
+            return
+
+        combined = f"[ {char_name} ]" + " " * 4 + f"[ {discord_name} ]"
+        self._entries[key] = combined
+        insort(self._sorted, combined)
+
+    def _remove_entry(self, key):
+        """
+        Take a character's combined string out of the sorted list
+        :return: none
+        """
+        combined = self._entries.pop(key, None)
+
+        if combined is None:
+            return
+
+        position = bisect_left(self._sorted, combined)
+
+        if position < len(self._sorted) and self._sorted[position] == combined:
+            del self._sorted[position]
+
+    @staticmethod
+    def _normalize_id(discord_id):
+        """
+        Discord ids come back from the database as strings or
+        ints; key everything by int where possible
+        :return: int, or the original value if not numeric
+        """
+        try:
+            return int(discord_id)
+        except (TypeError, ValueError):
+            return discord_id
@@ -1,24 +1,265 @@
+import functools
+import threading
 from dotenv import load_dotenv
-from sqlalchemy import create_engine, text
+from sqlalchemy import DateTime, bindparam, create_engine, text, table, column, update
 from os import environ
+from classes.backends import CHANGE_LOG_KEYS, get_backend
+from classes.metrics import timed
+from classes.roster_cache import RosterCache
+from classes.respawn_index import RespawnIndex
+from classes.times import to_database, utc_now
+
+# every statement is defined once, with bound parameters, so SQL
+# text never varies with user input; SQLAlchemy compiles each one
+# a single time and reuses it from the engine's compiled cache.
+# Statements are plain SQL that MySQL and SQLite both accept; the
+# few that are not are built per backend by backend_statements
+
+################# READ STATEMENTS #################
+GET_DISCORD_IDS_QUERY = text(
+    "SELECT discord_id, char_name FROM sos_bot.characters "
+    "WHERE char_type = 'Main' ORDER BY char_name"
+)
+LOOKUP_CHARACTERS_QUERY = text(
+    "SELECT b.char_name, b.char_race, b.char_class, b.char_type, b.char_priority "
+    "FROM sos_bot.characters a "
+    "JOIN sos_bot.characters b ON a.discord_id = b.discord_id "
+    "WHERE a.char_name = :char_name ORDER BY b.char_priority ASC"
+)
+LOOKUP_PROFILE_QUERY = text(
+    "SELECT b.discord_id, b.char_name, b.char_race, b.char_class, b.char_type, b.char_priority "
+    "FROM sos_bot.characters a "
+    "JOIN sos_bot.characters b ON a.discord_id = b.discord_id "
+    "WHERE a.char_name = :char_name ORDER BY b.char_priority ASC"
+)
+FIND_MAIN_FROM_DISCORD_QUERY = text(
+    "SELECT char_name FROM sos_bot.characters "
+    "WHERE discord_id = :discord_id AND char_type = 'Main'"
+)
+FIND_CHARACTERS_FROM_DISCORD_QUERY = text(
+    "SELECT char_name FROM sos_bot.characters WHERE discord_id = :discord_id"
+)
+LOOKUP_DISCORD_ID_QUERY = text(
+    "SELECT discord_id FROM sos_bot.characters WHERE char_name = :char_name"
+)
+COUNT_IDS_QUERY = text(
+    "SELECT discord_id FROM sos_bot.characters WHERE discord_id = :discord_id"
+)
+FIND_MEMBER_QUERY = text(
+    "SELECT discord_id FROM sos_bot.members WHERE discord_id = :discord_id"
+)
+FIND_ALL_MAINS_QUERY = text(
+    "SELECT char_name FROM sos_bot.characters WHERE char_type = 'Main' ORDER BY char_name"
+)
+GET_ALL_CHARACTERS_QUERY = text(
+    "SELECT discord_id, char_name FROM sos_bot.characters"
+)
+GET_ALL_CHAR_NAMES_QUERY = text(
+    "SELECT char_name FROM sos_bot.characters ORDER BY char_name"
+)
+GET_ALL_MOB_NAMES_QUERY = text(
+    "SELECT mob_name FROM sos_bot.respawns"
+)
+GET_ALL_ZONE_NAMES_QUERY = text(
+    "SELECT DISTINCT mob_zone FROM sos_bot.respawns"
+)
+# time columns are typed, so every backend returns datetimes
+GET_MOB_RESPAWN_QUERY = text(
+    "SELECT mob_name, kill_time, respawn_time, time_zone FROM sos_bot.respawns "
+    "WHERE mob_name = :mob_name"
+).columns(kill_time=DateTime, respawn_time=DateTime)
+GET_MOB_LOCKOUTS_QUERY = text(
+    "SELECT mob_name, lockout_weeks, lockout_days, lockout_hours, lockout_minutes "
+    "FROM sos_bot.respawns"
+)
+GET_ZONE_RESPAWNS_QUERY = text(
+    "SELECT mob_name, mob_zone, kill_time, respawn_time, time_zone FROM sos_bot.respawns "
+    "WHERE mob_zone = :zone_name"
+).columns(kill_time=DateTime, respawn_time=DateTime)
+GET_MOBS_UP_QUERY = text(
+    "SELECT mob_name, mob_zone, kill_time, respawn_time, time_zone FROM sos_bot.respawns "
+    "WHERE respawn_time <= :now ORDER BY respawn_time"
+).bindparams(bindparam('now', type_=DateTime)).columns(kill_time=DateTime, respawn_time=DateTime)
+GET_ALL_RESPAWNS_QUERY = text(
+    "SELECT mob_name, mob_zone, kill_time, respawn_time, time_zone, "
+    "lockout_weeks, lockout_days, lockout_hours, lockout_minutes FROM sos_bot.respawns"
+).columns(kill_time=DateTime, respawn_time=DateTime)
+ROSTER_CHARACTERS_QUERY = text(
+    "SELECT discord_id, char_name, char_race, char_class, char_type, char_priority "
+    "FROM sos_bot.characters"
+)
+ROSTER_MEMBERS_QUERY = text(
+    "SELECT discord_id FROM sos_bot.members"
+)
+# the mirror's delta reads: the change log, then just the changed rows
+LAST_CHANGE_QUERY = text(
+    "SELECT MAX(seq) AS seq FROM sos_bot.row_changes"
+)
+CHANGES_SINCE_QUERY = text(
+    "SELECT seq, table_name, row_key FROM sos_bot.row_changes WHERE seq > :since ORDER BY seq"
+)
+CHANGED_RESPAWNS_QUERY = text(
+    "SELECT mob_name, mob_zone, kill_time, respawn_time, time_zone, "
+    "lockout_weeks, lockout_days, lockout_hours, lockout_minutes FROM sos_bot.respawns "
+    "WHERE mob_name IN :keys"
+).bindparams(bindparam('keys', expanding=True)).columns(kill_time=DateTime, respawn_time=DateTime)
+CHANGED_CHARACTERS_QUERY = text(
+    "SELECT discord_id, char_name, char_race, char_class, char_type, char_priority "
+    "FROM sos_bot.characters WHERE char_name IN :keys"
+).bindparams(bindparam('keys', expanding=True))
+CHANGED_MEMBERS_QUERY = text(
+    "SELECT discord_id FROM sos_bot.members WHERE discord_id IN :keys"
+).bindparams(bindparam('keys', expanding=True))
+
+################# UPDATE STATEMENTS #################
+INSERT_CHARACTER_QUERY = text(
+    "INSERT INTO sos_bot.characters "
+    "(discord_id, char_name, char_race, char_class, char_type, is_officer, char_priority) "
+    "VALUES (:discord_id, :char_name, :char_race, :char_class, :char_type, 0, :char_priority)"
+)
+INSERT_MEMBER_QUERY = text(
+    "INSERT INTO sos_bot.members (discord_id) VALUES (:discord_id)"
+)
+DELETE_CHARACTER_QUERY = text(
+    "DELETE FROM sos_bot.characters WHERE char_name = :char_name"
+)
+DELETE_MEMBER_QUERY = text(
+    "DELETE FROM sos_bot.members WHERE discord_id = :discord_id"
+)
+UPDATE_LOCKOUT_QUERY = text(
+    "UPDATE sos_bot.respawns SET lockout_weeks = :weeks, lockout_days = :days, "
+    "lockout_hours = :hours, lockout_minutes = :minutes WHERE mob_name = :mob_name"
+)
+PRUNE_CHANGES_QUERY = text(
+    "DELETE FROM sos_bot.row_changes WHERE seq <= :seq"
+)
+
+# change log entries re-read behind the newest one applied, as a
+# transaction can commit after one holding a later seq number
+CHANGE_OVERLAP = 100
+# change log entries kept behind the newest one applied
+CHANGE_LOG_KEEP = 10000
+
+# kill and respawn times are UTC DATETIMEs; respawn_time is always
+# derived by the database from kill_time plus the lockout, never in Python
+LOCKOUT_MINUTES = (
+    "(lockout_weeks * 10080 + lockout_days * 1440 + lockout_hours * 60 + lockout_minutes)"
+)
+
+# statements built for each backend, by backend name
+_BACKEND_STATEMENTS = {}
+
+
+def backend_statements(backend):
+    """
+    The statements whose SQL differs between backends (date
+    arithmetic), built once per backend
+    :param backend: MySQLBackend or SQLiteBackend
+    :return: dictionary of statement name -> statement or list
+    """
+    if backend.name not in _BACKEND_STATEMENTS:
+        respawn_time = backend.add_minutes("kill_time", LOCKOUT_MINUTES)
+        # SQLite reads the old row in every SET expression, where MySQL
+        # sees columns already assigned; start from the new kill time
+        new_respawn_time = backend.add_minutes(":kill_time", LOCKOUT_MINUTES)
+
+        _BACKEND_STATEMENTS[backend.name] = {
+            'record_kill': text(
+                "UPDATE sos_bot.respawns SET kill_time = :kill_time, time_zone = 'UTC', "
+                f"respawn_time = {new_respawn_time} "
+                "WHERE mob_name = :mob_name AND (kill_time IS NULL OR kill_time < :kill_time)"
+            ).bindparams(bindparam('kill_time', type_=DateTime)),
+            'recompute_respawn': text(
+                f"UPDATE sos_bot.respawns SET respawn_time = {respawn_time} "
+                "WHERE mob_name = :mob_name AND kill_time IS NOT NULL"
+            ),
+            'recompute_all': text(
+                f"UPDATE sos_bot.respawns SET respawn_time = {respawn_time} "
+                "WHERE kill_time IS NOT NULL"
+            )
+        }
+
+    return _BACKEND_STATEMENTS[backend.name]
+
+# update_character sets a varying subset of columns, so it is built
+# with Core against this table; each distinct subset is compiled once
+CHARACTERS_TABLE = table(
+    'characters',
+    column('discord_id'),
+    column('char_name'),
+    column('char_race'),
+    column('char_class'),
+    column('char_type'),
+    column('char_priority'),
+    schema='sos_bot'
+)
+
+
+def query_flow(method):
+    """
+    Decorator letting a method that works on query results be
+    written once for Database and AsyncDatabase: the method is a
+    generator that yields each call to another query method and is
+    sent back its result. Database runs it straight through, while
+    AsyncDatabase awaits each yielded call, so there the method is
+    a coroutine
+    :param method: generator function
+    :return: decorated method
+    """
+    @functools.wraps(method)
+    def run(self, *args, **kwargs):
+        return self.run_flow(method(self, *args, **kwargs))
+
+    return run
 
 
 class Database:
     """
     This class provides all database interaction
     """
+    # a single engine (and connection pool) is shared by every
+    # Database instance in the process, so cogs and the tracker
+    # reuse open MySQL connections instead of reconnecting per query
+    _engine = None
+    _engine_lock = threading.Lock()
+    # likewise one in-memory copy of the characters and members
+    # tables, so roster reads do not touch MySQL once it is loaded
+    _roster = RosterCache(int(environ.get('ROSTER_CACHE_TTL', 0)))
+    # and one copy of the respawns table, with a heap-ordered index
+    # of every mob's next respawn; it is reloaded now and then to
+    # pick up kills written by other tools
+    _respawns = RespawnIndex(int(environ.get('RESPAWN_INDEX_TTL', 300)))
+    # how far into the row_changes log the copies have been brought:
+    # the newest seq applied (None until the first full resync) and
+    # the seqs applied within CHANGE_OVERLAP of it
+    _change_seq = None
+    _change_seen = set()
 
     def __init__(self):
         load_dotenv()
 
-        # obtain database parameters securely as environment variables
-        self._MYSQL_USER = environ.get('MYSQL_USER')
-        self._MYSQL_PASSWORD = environ.get('MYSQL_PASSWORD')
-        self._MYSQL_HOST = environ.get('MYSQL_HOST')
-        self._MYSQL_DB = environ.get('MYSQL_DB')
+        # MySQL, or a local SQLite file, chosen by DATABASE_BACKEND
+        self._backend = get_backend()
+        self._sql = backend_statements(self._backend)
 
         # set connection string
-        self._params = f"mysql+pymysql://{self._MYSQL_USER}:{self._MYSQL_PASSWORD}@{self._MYSQL_HOST}/{self._MYSQL_DB}?charset=utf8mb4"
+        self._params = self._backend.url()
+
+        # connection pool tuning, all optional; pool_recycle should stay
+        # below the MySQL server's wait_timeout so idle connections are
+        # replaced before the server drops them
+        self._pool_size = int(environ.get('MYSQL_POOL_SIZE', 5))
+        self._max_overflow = int(environ.get('MYSQL_MAX_OVERFLOW', 10))
+        self._pool_timeout = int(environ.get('MYSQL_POOL_TIMEOUT', 30))
+        self._pool_recycle = int(environ.get('MYSQL_POOL_RECYCLE', 3600))
+        self._pool_pre_ping = environ.get('MYSQL_POOL_PRE_PING', 'true').lower() == 'true'
+        # number of compiled statements SQLAlchemy keeps for reuse
+        self._query_cache_size = int(environ.get('MYSQL_QUERY_CACHE_SIZE', 500))
+
+        # serve roster reads from memory unless switched off
+        self._use_roster_cache = environ.get('ROSTER_CACHE', 'true').lower() == 'true'
+        # likewise respawn reads, from the respawn index
+        self._use_respawn_cache = environ.get('RESPAWN_CACHE', 'true').lower() == 'true'
 
     ################# READ METHODS #################
     def get_discord_ids(self):
@@ -26,12 +267,7 @@ class Database:
         Get discord ids and char names
         :return: results of the select query, in list form
         """
-        query = (
-            ("SELECT discord_id, char_name FROM sos_bot.characters "
-             "WHERE char_type = 'Main' ORDER BY char_name")
-        )
-
-        return self.execute_read(query)
+        return self.read_roster(GET_DISCORD_IDS_QUERY, lambda roster: roster.get_discord_ids())
 
     def lookup_characters(self, char_name):
         """
@@ -41,13 +277,25 @@ class Database:
         :char_name: the name to look up
         :return: results of the select query, in list form
         """
-        query = (
-            "SELECT b.char_name, b.char_race, b.char_class, b.char_type, b.char_priority FROM sos_bot.characters a"
-            f" JOIN sos_bot.characters b ON a.discord_id = b.discord_id WHERE a.char_name = '{char_name}'"
-            "ORDER BY b.char_priority ASC"
+        return self.read_roster(
+            LOOKUP_CHARACTERS_QUERY,
+            lambda roster: roster.lookup_characters(char_name),
+            {'char_name': char_name}
         )
 
-        return self.execute_read(query)
+    def lookup_profile(self, char_name):
+        """
+        Get every character sharing an owner with char_name, as
+        lookup_characters does, with the owner's discord id on
+        each row, so one query answers a profile lookup
+        :char_name: the name to look up
+        :return: results of the select query, in list form
+        """
+        return self.read_roster(
+            LOOKUP_PROFILE_QUERY,
+            lambda roster: roster.lookup_profile(char_name),
+            {'char_name': char_name}
+        )
 
     def find_main_from_discord(self, discord_id):
         """
@@ -55,12 +303,24 @@ class Database:
         :discord_id: discord id to look up
         :return: results of the select query, in list form
         """
-        query = (
-            "SELECT char_name from sos_bot.characters WHERE "
-            f" discord_id = {discord_id} AND char_type = 'Main'"
+        return self.read_roster(
+            FIND_MAIN_FROM_DISCORD_QUERY,
+            lambda roster: roster.find_main_from_discord(discord_id),
+            {'discord_id': discord_id}
         )
 
-        return self.execute_read(query)
+    def find_characters_from_discord(self, discord_id):
+        """
+        Get the names of every character a discord id owns
+        :discord_id: discord id to look up
+        :return: results of the select query, in list form
+        """
+        return self.read_roster(
+            FIND_CHARACTERS_FROM_DISCORD_QUERY,
+            lambda roster: roster.find_characters_from_discord(discord_id),
+            {'discord_id': discord_id},
+            field='char_name'
+        )
 
     def lookup_discord_id(self, char_name):
         """
@@ -68,91 +328,90 @@ class Database:
         :char_name: the name to lookup
         :return: results of the select query, in list form
         """
-        query = (
-            "SELECT discord_id from sos_bot.characters WHERE"
-            f" char_name = '{char_name}'"
+        return self.read_roster(
+            LOOKUP_DISCORD_ID_QUERY,
+            lambda roster: roster.lookup_discord_id(char_name),
+            {'char_name': char_name}
         )
 
-        return self.execute_read(query)
-
     def count_ids(self, discord_id):
         """
         Get list from discord ids from characters table
         :discord_id: the id to lookup
         :return: results of the select query, in list form
         """
-        query = (
-            "SELECT discord_id from sos_bot.characters WHERE "
-            f" discord_id = '{discord_id}'"
+        return self.read_roster(
+            COUNT_IDS_QUERY,
+            lambda roster: roster.count_ids(discord_id),
+            {'discord_id': discord_id}
         )
 
-        return self.execute_read(query)
-
     def find_member(self, discord_id):
         """
         Get match from members table for a given discord id
         :discord_id: the id to lookup
         :return: results of the select query, in list form
         """
-        query = (
-            "SELECT discord_id from sos_bot.members WHERE "
-            f" discord_id = '{discord_id}'"
+        return self.read_roster(
+            FIND_MEMBER_QUERY,
+            lambda roster: roster.find_member(discord_id),
+            {'discord_id': discord_id}
         )
 
-        return self.execute_read(query)
+    def get_all_member_ids(self):
+        """
+        Get every discord id in the members table
+        :return: results of the select query, in list form
+        """
+        return self.read_roster(
+            ROSTER_MEMBERS_QUERY,
+            lambda roster: roster.get_all_member_ids(),
+            field='discord_id'
+        )
 
     def find_all_mains(self):
         """
         Get all chars flagged as mains
         :return: results of the select query, in list form
         """
-        query = (
-            "SELECT char_name FROM sos_bot.characters WHERE char_type = 'Main' ORDER BY char_name"
+        return self.read_roster(
+            FIND_ALL_MAINS_QUERY, lambda roster: roster.find_all_mains(), field='char_name'
         )
 
-        return self.get_list(self.execute_read(query), 'char_name')
-
     def get_all_characters(self):
         """
         Get all discord ids and char names
         :return: results of the select query, in list form
         """
-        query = (
-            "SELECT discord_id, char_name FROM sos_bot.characters"
-        )
-
-        return self.execute_read(query)
+        return self.read_roster(GET_ALL_CHARACTERS_QUERY, lambda roster: roster.get_all_characters())
 
     def get_all_char_names(self):
         """
-        Get all char names only from database, uses
-        previous query and filters its result
+        Get all char names only from database
         :return: results of the query, in list form
         """
-        return self.get_list(self.get_all_characters(), 'char_name')
+        return self.read_roster(
+            GET_ALL_CHAR_NAMES_QUERY, lambda roster: roster.get_all_char_names(), field='char_name'
+        )
 
     def get_all_mob_names(self):
         """
         Get all mob names
         :return: results of the select query, in list form
         """
-        query = (
-            "SELECT mob_name FROM sos_bot.respawns"
+        return self.read_respawns(
+            lambda index: index.get_mob_names(), GET_ALL_MOB_NAMES_QUERY, field='mob_name'
         )
 
-        return self.get_list(self.execute_read(query), 'mob_name')
-
     def get_all_zone_names(self):
         """
         Get all zone names
         :return: results of the select query, in list form
         """
-        query = (
-            "SELECT DISTINCT mob_zone FROM sos_bot.respawns"
+        return self.read_respawns(
+            lambda index: index.get_zone_names(), GET_ALL_ZONE_NAMES_QUERY, field='mob_zone'
         )
 
-        return self.get_list(self.execute_read(query), 'mob_zone')
-
     # def get_mob_data(self, mob_name):
     #     """
     #     obtain all fields of a mob's database entry
@@ -169,10 +428,19 @@ class Database:
         :param mob_name: string
         :return: results of the select query, in list form
         """
-        query = (f"SELECT mob_name, kill_time, respawn_time, time_zone FROM sos_bot.respawns "
-                 f"WHERE mob_name = '{mob_name}'")
+        return self.read_respawns(
+            lambda index: index.get_mob_respawn(mob_name),
+            GET_MOB_RESPAWN_QUERY,
+            {'mob_name': mob_name}
+        )
 
-        return self.execute_read(query)
+    def get_mob_lockouts(self):
+        """
+        get the stored lockout time units for every mob; always
+        read from the database, as the lockout sync writes from it
+        :return: results of the select query, in list form
+        """
+        return self.execute_read(GET_MOB_LOCKOUTS_QUERY)
 
     def get_zone_respawns(self, zone_name):
         """
@@ -180,22 +448,33 @@ class Database:
         :param zone_name: string
         :return: results of the select query, in list form
         """
-        # special processing to handle single quotes in zone names
-        # single quotes are invalid in SQL queries
-        find_quote = zone_name.find("'")
+        return self.read_respawns(
+            lambda index: index.get_zone_respawns(zone_name),
+            GET_ZONE_RESPAWNS_QUERY,
+            {'zone_name': zone_name}
+        )
 
-        # if a single quote was found, insert an additional
-        # single quote into the SQL string at the position
-        # of the existing quote, this escapes the quote,
-        # allowing the query string to go through as valid
-        if find_quote != -1:
-            temp_zone = zone_name
-            zone_name = temp_zone[:find_quote] + "'" + temp_zone[find_quote:]
+    def get_mobs_up(self):
+        """
+        get every killed mob whose respawn time has passed,
+        soonest first (uncached, a range scan on respawn_time)
+        :return: results of the select query, in list form
+        """
+        now = utc_now()
 
-        query = (f"SELECT mob_name, mob_zone, kill_time, respawn_time, time_zone FROM sos_bot.respawns "
-                 f"WHERE mob_zone = '{zone_name}'")
+        return self.read_respawns(
+            lambda index: index.get_mobs_up(now), GET_MOBS_UP_QUERY, {'now': to_database(now)}
+        )
 
-        return self.execute_read(query)
+    def get_upcoming_spawns(self, count, within=None):
+        """
+        get the next mobs to respawn across all zones, soonest
+        first, from the in-memory respawn index
+        :param count: int, maximum number of mobs
+        :param within: optional timedelta limiting how far ahead to look
+        :return: list of dict entries, one per mob
+        """
+        return self.read_respawns(lambda index: index.upcoming(count, within))
 
     ################# UPDATE METHODS #################
     def insert_character(self, discord_id, char_name, char_race, char_class, char_type, char_priority):
@@ -204,62 +483,52 @@ class Database:
         :parameters: the details of the new character
         :return: results of the insert query
         """
-        query = (
-            "INSERT INTO sos_bot.characters"
-            "(discord_id, char_name, char_race, char_class, char_type, is_officer, char_priority)"
-            f" VALUES ('{discord_id}', '{char_name}', '{char_race}', '{char_class}', '{char_type}', 0, {char_priority})"
+        params = {
+            'discord_id': discord_id,
+            'char_name': char_name,
+            'char_race': char_race,
+            'char_class': char_class,
+            'char_type': char_type,
+            'char_priority': char_priority
+        }
+
+        return self.execute_update(
+            INSERT_CHARACTER_QUERY,
+            params,
+            lambda: Database._roster.add_character(
+                discord_id, char_name, char_race, char_class, char_type, char_priority
+            )
         )
 
-        return self.execute_update(query)
-
     def insert_member(self, discord_id):
         """
                 Add a new discord_id to the members table
                 :parameters: discord_id
                 :return: results of the insert query
                 """
-        # print(discord_id)
-        query = (
-            f"INSERT INTO sos_bot.members (discord_id) VALUES ('{discord_id}')"
+        return self.execute_update(
+            INSERT_MEMBER_QUERY,
+            {'discord_id': discord_id},
+            lambda: Database._roster.add_member(discord_id)
         )
 
-        return self.execute_update(query)
-
+    @query_flow
     def update_character(self, char_name, new_name, char_race, char_class, char_type):
         """
         Edit an existing character to have new attributes
         :parameters: the updated details of the character
         :return: results of the update query, in list form
         """
-        # begin the query string
-        query = f"UPDATE sos_bot.characters SET "
+        changes = self.character_changes(new_name, char_race, char_class, char_type)
 
-        # add only the options selected by user to query
-        if new_name is not None:
-            query = query + f"char_name = '{new_name}', "
-
-        if char_race is not None:
-            query = query + f"char_race = '{char_race}', "
+        # nothing to set, so nothing to update
+        if len(changes) == 0:
+            return 0
 
-        if char_class is not None:
-            query = query + f"char_class = '{char_class}', "
-
-        # translate char type to an int, since this is hidden from user
-        if char_type is not None:
-            if char_type == 'Main':
-                char_priority = 0
-            elif char_type == 'Alt':
-                char_priority = 1
-            else:
-                char_priority = 2
-
-            query = query + f"char_type = '{char_type}', char_priority = {char_priority}, "
-
-        # trim off trailing comma and space, then add WHERE clause
-        query = query[0:len(query) - 2]
-        query = query + f" WHERE char_name = '{char_name}'"
-
-        return self.execute_update(query)
+        return (yield self.execute_update(
+            self.character_update_query(char_name, changes),
+            on_success=lambda: Database._roster.update_character(char_name, changes)
+        ))
 
     def delete_character(self, char_name):
         """
@@ -267,9 +536,11 @@ class Database:
         :char_name: string, the name to delete
         :return: results of the delete query, in list form
         """
-        query = f"DELETE FROM sos_bot.characters WHERE char_name = '{char_name}'"
-
-        return self.execute_update(query)
+        return self.execute_update(
+            DELETE_CHARACTER_QUERY,
+            {'char_name': char_name},
+            lambda: Database._roster.remove_character(char_name)
+        )
 
     def delete_member(self, discord_id):
         """
@@ -277,41 +548,160 @@ class Database:
         :discord_id: string, the id to delete
         :return: results of the delete query, in list form
         """
-        query = f"DELETE FROM sos_bot.members WHERE discord_id = '{discord_id}'"
+        return self.execute_update(
+            DELETE_MEMBER_QUERY,
+            {'discord_id': discord_id},
+            lambda: Database._roster.remove_member(discord_id)
+        )
+
+    @query_flow
+    def delete_roster_entries(self, char_names, discord_ids):
+        """
+        Remove many characters and members rows in one transaction
+        :char_names: list of character names to delete
+        :discord_ids: list of discord ids to delete from members
+        :return: int, number of rows deleted
+        """
+        results = yield self.execute_transaction(self.roster_delete_steps(char_names, discord_ids))
+        self.forget_roster_entries(char_names, discord_ids)
 
-        return self.execute_update(query)
+        return sum(results)
 
+    @query_flow
     def update_mob_respawn(self, mob_name, respawn_dict):
         """
-        edit the database entry for a mob with respawn timer data
+        edit the database entry for a mob with respawn timer data;
+        its respawn time is recomputed in the same transaction
         :param mob_name: string
         :param respawn_dict: dictionary of int values, with keys corresponding to units of time
-        :return: results of the update query, in list form
+        :return: int, results of the lockout update
         """
-        query = (
-            f"UPDATE sos_bot.respawns SET lockout_weeks = '{respawn_dict['weeks']}', "
-            f"lockout_days = '{respawn_dict['days']}', lockout_hours = '{respawn_dict['hours']}', "
-            f"lockout_minutes = '{respawn_dict['minutes']}' "
-            f"WHERE mob_name = '{mob_name}'"
+        results = yield self.execute_transaction(
+            self.lockout_steps([self.lockout_params(mob_name, respawn_dict)])
         )
+        Database._respawns.invalidate()
+
+        return results[0]
+
+    @query_flow
+    def sync_mob_respawns(self, respawn_map):
+        """
+        bring every mob's lockout in line with freshly scraped data,
+        writing only the rows that changed in a single transaction
+        :param respawn_map: dictionary of mob name -> respawn dictionary
+        :return: dictionary summarising changed, unchanged and missing mobs
+        """
+        changes, summary = self.diff_lockouts((yield self.get_mob_lockouts()), respawn_map)
+
+        if len(changes) > 0:
+            # new lockouts move the respawn time of any killed mob
+            yield self.execute_transaction(self.lockout_steps(changes))
+            Database._respawns.invalidate()
+
+        return summary
+
+    @query_flow
+    def record_kill(self, mob_name, kill_time):
+        """
+        store a mob's kill time; the database derives the respawn time
+        from it and the mob's lockout in the same statement;
+        a kill older than the one already stored is ignored
+        :param mob_name: string
+        :param kill_time: aware datetime of the kill
+        :return: results of the update query
+        """
+        result = yield self.execute_update(
+            self._sql['record_kill'], {'mob_name': mob_name, 'kill_time': to_database(kill_time)}
+        )
+
+        # pick up the computed respawn time for the respawn index
+        if result > 0:
+            for row in (yield self.execute_read(GET_MOB_RESPAWN_QUERY, {'mob_name': mob_name})):
+                Database._respawns.update(mob_name, row['kill_time'], row['respawn_time'])
+
+        return result
+
+    @query_flow
+    def record_kills(self, kills):
+        """
+        store many kill times in one transaction; a kill older
+        than the one already stored is ignored
+        :param kills: dictionary of mob name -> aware datetime
+        :return: int, number of mobs updated
+        """
+        if len(kills) == 0:
+            return 0
 
-        return self.execute_update(query)
+        result = yield self.execute_batch(self._sql['record_kill'], self.kill_params(kills))
+
+        # several timers moved, so reload the index on next read
+        if result > 0:
+            Database._respawns.invalidate()
+
+        return result
 
     ################# UTILITY METHODS #################
     def create_engine(self):
         """
-        create a new engine object upon request, to prevent
-        MySQL server from timing out
+        return the process-wide engine, creating it on first use;
+        pre-ping and recycle keep pooled connections from going
+        stale when the MySQL server times them out
         :return: SQL alchemy engine object
         """
-        # create the query engine
-        return create_engine(self._params)
+        if Database._engine is None:
+            with Database._engine_lock:
+                # check again, another thread may have won the race
+                if Database._engine is None:
+                    engine = create_engine(
+                        self._params,
+                        pool_size=self._pool_size,
+                        max_overflow=self._max_overflow,
+                        pool_timeout=self._pool_timeout,
+                        pool_recycle=self._pool_recycle,
+                        pool_pre_ping=self._pool_pre_ping,
+                        query_cache_size=self._query_cache_size,
+                        **self._backend.engine_options()
+                    )
+                    self._backend.prepare(engine)
+                    Database._engine = engine
+
+        return Database._engine
+
+    def get_pool_status(self):
+        """
+        report the state of the shared connection pool
+        :return: dictionary of pool statistics
+        """
+        pool = self.create_engine().pool
+
+        return {
+            "size": pool.size(),
+            "checked_in": pool.checkedin(),
+            "checked_out": pool.checkedout(),
+            "overflow": pool.overflow(),
+            "status": pool.status()
+        }
+
+    @classmethod
+    def dispose_engine(cls):
+        """
+        close every pooled connection, e.g. on shutdown
+        :return: none
+        """
+        with cls._engine_lock:
+            if cls._engine is not None:
+                cls._engine.dispose()
+                cls._engine = None
 
-    def execute_read(self, query):
+    @timed('database')
+    def execute_read(self, query, params=None, field=None):
         """
         Send a read query to database engine
-        :query: the formatted query string to send
-        to database engine
+        :query: the statement to send to database engine,
+        a module-level text() construct or a query string
+        :params: optional dict of bound parameter values
+        :field: optional column name; if given, return just
+        that column's values instead of whole rows
         :return: results of the operation, in list form
         """
         records_list = []
@@ -319,7 +709,7 @@ class Database:
         # open a connection to database, dynamically close
         # it when with block closes
         with self.create_engine().connect() as conn:
-            result = conn.execute(text(query))
+            result = conn.execute(self.as_statement(query), params)
 
             # get query results and, line by line,
             # convert to dict entries; add each
@@ -330,13 +720,20 @@ class Database:
 
             conn.close()
 
+        if field is not None:
+            return self.get_list(records_list, field)
+
         return records_list
 
-    def execute_update(self, query):
+    @timed('database')
+    def execute_update(self, query, params=None, on_success=None):
         """
         Send an update query to database engine
-        :query: the formatted query string to send
-        to database engine
+        :query: the statement to send to database engine,
+        a module-level text() construct or a query string
+        :params: optional dict of bound parameter values
+        :on_success: optional callable, run once the write has
+        committed and changed at least one row
         :return: int, representing the results of the operation
         """
         # open a connection to database, dynamically close
@@ -344,13 +741,398 @@ class Database:
         with self.create_engine().connect() as conn:
             # get a count of rows affected, to act as
             # indicator of success or failure
-            result = conn.execute(text(query)).rowcount
+            result = conn.execute(self.as_statement(query), params).rowcount
             conn.commit()
 
             conn.close()
 
+        # keep in-memory copies in step with what was written
+        if on_success is not None and result > 0:
+            on_success()
+
         return result
 
+    @query_flow
+    def read_roster(self, query, lookup, params=None, field=None):
+        """
+        Answer a characters/members read from the roster cache,
+        loading the cache on first use; with the cache switched
+        off, send the query to the database engine instead
+        :query: the statement to send, used when uncached
+        :lookup: callable taking the RosterCache and returning results
+        :params: optional dict of bound parameter values
+        :field: optional column name, as for execute_read
+        :return: results of the read, in list form
+        """
+        if not self._use_roster_cache:
+            return (yield self.execute_read(query, params, field))
+
+        if not Database._roster.is_loaded():
+            yield self.load_roster()
+
+        return lookup(Database._roster)
+
+    @query_flow
+    def load_roster(self):
+        """
+        Fill the roster cache from the characters and members tables
+        :return: none
+        """
+        characters = yield self.execute_read(ROSTER_CHARACTERS_QUERY)
+        members = yield self.execute_read(ROSTER_MEMBERS_QUERY)
+        Database._roster.load(characters, members)
+
+    @query_flow
+    def read_respawns(self, lookup, query=None, params=None, field=None):
+        """
+        Answer a read from the respawn index, loading it when
+        it is empty or due a refresh; with the cache switched
+        off, send the query to the database engine instead
+        :lookup: callable taking the RespawnIndex and returning results
+        :query: optional statement to send when uncached
+        :params: optional dict of bound parameter values
+        :field: optional column name, as for execute_read
+        :return: results of the read
+        """
+        if query is not None and not self._use_respawn_cache:
+            return (yield self.execute_read(query, params, field))
+
+        if not Database._respawns.is_loaded():
+            yield self.load_respawns()
+
+        return lookup(Database._respawns)
+
+    @query_flow
+    def load_respawns(self):
+        """
+        Fill the respawn index from the respawns table
+        :return: none
+        """
+        Database._respawns.load((yield self.execute_read(GET_ALL_RESPAWNS_QUERY)))
+
+    @query_flow
+    def refresh_mirror(self):
+        """
+        Bring the in-memory roster and respawn copies in step with
+        the database, to pick up rows changed by other tools: only
+        the rows logged in row_changes since the last refresh are
+        read, after one full resync to start from
+        :return: int, number of rows that differed
+        """
+        if Database._change_seq is None:
+            # note where the log ends before reading, so nothing
+            # written during the resync is skipped next time
+            last_seq = (yield self.execute_read(LAST_CHANGE_QUERY, field='seq'))[0]
+            changed = Database._respawns.sync((yield self.execute_read(GET_ALL_RESPAWNS_QUERY)))
+
+            if self._use_roster_cache:
+                characters = yield self.execute_read(ROSTER_CHARACTERS_QUERY)
+                members = yield self.execute_read(ROSTER_MEMBERS_QUERY)
+                changed += Database._roster.sync(characters, members)
+
+            self.mark_changes_applied(last_seq)
+
+            return changed
+
+        keys = self.take_changes(
+            (yield self.execute_read(CHANGES_SINCE_QUERY, {'since': self.changes_since()}))
+        )
+        changed = Database._respawns.apply_changes(
+            (yield self.read_changed(CHANGED_RESPAWNS_QUERY, keys['respawns'])), keys['respawns']
+        )
+
+        if self._use_roster_cache:
+            characters = yield self.read_changed(CHANGED_CHARACTERS_QUERY, keys['characters'])
+            members = yield self.read_changed(CHANGED_MEMBERS_QUERY, keys['members'])
+            changed += Database._roster.apply_changes(
+                characters, members, keys['characters'], keys['members']
+            )
+
+        # the delete only touches a range of the primary key
+        if any(keys.values()) and Database._change_seq > CHANGE_LOG_KEEP:
+            yield self.execute_update(PRUNE_CHANGES_QUERY, {'seq': Database._change_seq - CHANGE_LOG_KEEP})
+
+        return changed
+
+    @query_flow
+    def read_changed(self, query, keys):
+        """
+        Read the current rows of changed keys
+        :param query: one of the CHANGED_*_QUERY statements
+        :param keys: set of key values
+        :return: list of dict entries, none without keys
+        """
+        if len(keys) == 0:
+            return []
+
+        return (yield self.execute_read(query, {'keys': sorted(keys)}))
+
+    @property
+    def backend(self):
+        """
+        The backend this database runs on
+        :return: MySQLBackend or SQLiteBackend
+        """
+        return self._backend
+
+    @property
+    def sql(self):
+        """
+        The statements built for this backend
+        :return: dictionary of statement name -> statement
+        """
+        return self._sql
+
+    @property
+    def roster_version(self):
+        """
+        Changes whenever the cached roster changes
+        :return: int
+        """
+        return Database._roster.version
+
+    def cache_version(self, table):
+        """
+        Version of the in-memory roster or respawns, for keying
+        what is rendered from them; None when that copy is switched
+        off, as nothing then follows the table's changes
+        :param table: string, 'roster' or 'respawns'
+        :return: int, or None
+        """
+        if table == 'roster':
+            return Database._roster.version if self._use_roster_cache else None
+
+        return Database._respawns.version if self._use_respawn_cache else None
+
+    @query_flow
+    def execute_batch(self, query, params_list):
+        """
+        Send one parameterised statement with many parameter
+        sets to database engine, all inside one transaction
+        :query: statement using :name bind parameters
+        :params_list: list of dicts, one per row to write
+        :return: int, representing the results of the operation
+        """
+        return (yield self.execute_transaction([(query, params_list)]))[0]
+
+    def run_flow(self, flow):
+        """
+        Run a query_flow method: here every yielded call has
+        already run, so its result is simply sent back
+        :param flow: generator from a query_flow method
+        :return: the method's return value
+        """
+        result = None
+
+        try:
+            while True:
+                result = flow.send(result)
+        except StopIteration as stop:
+            return stop.value
+
+    @timed('database')
+    def execute_transaction(self, steps):
+        """
+        Send several statements to database engine inside one
+        transaction, so they all apply or none do
+        :steps: list of (statement, params) tuples; params may be
+        a dict, a list of dicts (executemany) or None
+        :return: list of int rowcounts, one per step
+        """
+        results = []
+
+        # begin() commits on success and rolls back on error
+        with self.create_engine().begin() as conn:
+            for query, params in steps:
+                results.append(conn.execute(self.as_statement(query), params).rowcount)
+
+        return results
+
+    def kill_params(self, kills):
+        """
+        Bind parameters for the record_kill statement, one set per mob
+        :param kills: dictionary of mob name -> aware datetime
+        :return: list of dicts
+        """
+        return [
+            {'mob_name': mob_name, 'kill_time': to_database(kill_time)}
+            for mob_name, kill_time in kills.items()
+        ]
+
+    def changes_since(self):
+        """
+        The seq to read the change log after, CHANGE_OVERLAP behind
+        the newest applied, so late commits are not missed
+        :return: int
+        """
+        return max(0, Database._change_seq - CHANGE_OVERLAP)
+
+    def take_changes(self, changes):
+        """
+        Keys of the rows changed by change log entries not applied
+        yet, marking those entries applied
+        :param changes: list of dicts with seq, table_name and row_key
+        :return: dictionary of table name -> set of keys
+        """
+        keys = {table_name: set() for table_name in CHANGE_LOG_KEYS}
+
+        for change in changes:
+            if change['seq'] not in Database._change_seen and change['table_name'] in keys:
+                keys[change['table_name']].add(change['row_key'])
+
+        self.mark_changes_applied(
+            max([change['seq'] for change in changes], default=Database._change_seq),
+            {change['seq'] for change in changes}
+        )
+
+        return keys
+
+    def mark_changes_applied(self, last_seq, seen=None):
+        """
+        Record how far into the change log the copies have been brought
+        :param last_seq: int, the newest seq applied, None for an empty log
+        :param seen: optional set of the seqs just applied
+        :return: none
+        """
+        Database._change_seq = 0 if last_seq is None else int(last_seq)
+        Database._change_seen = set() if seen is None else seen
+
+    def roster_delete_steps(self, char_names, discord_ids):
+        """
+        Statements that delete characters and members rows;
+        empty lists are left out, as executemany needs rows
+        :param char_names: list of strings
+        :param discord_ids: list of discord ids
+        :return: list of (statement, params) tuples
+        """
+        steps = []
+
+        if len(char_names) > 0:
+            steps.append((DELETE_CHARACTER_QUERY, [{'char_name': name} for name in char_names]))
+
+        if len(discord_ids) > 0:
+            steps.append((
+                DELETE_MEMBER_QUERY,
+                [{'discord_id': str(discord_id)} for discord_id in discord_ids]
+            ))
+
+        return steps
+
+    def forget_roster_entries(self, char_names, discord_ids):
+        """
+        Drop deleted rows from the roster cache
+        :param char_names: list of strings
+        :param discord_ids: list of discord ids
+        :return: none
+        """
+        for char_name in char_names:
+            Database._roster.remove_character(char_name)
+
+        for discord_id in discord_ids:
+            Database._roster.remove_member(discord_id)
+
+    def lockout_steps(self, changes):
+        """
+        Statements that write changed lockouts and recompute the
+        affected respawn times
+        :param changes: list of bind parameter dicts from diff_lockouts
+        :return: list of (statement, params) tuples
+        """
+        return [
+            (UPDATE_LOCKOUT_QUERY, changes),
+            (self._sql['recompute_respawn'], [{'mob_name': change['mob_name']} for change in changes])
+        ]
+
+    def lockout_params(self, mob_name, respawn_dict):
+        """
+        Bind parameters for UPDATE_LOCKOUT_QUERY
+        :param mob_name: string
+        :param respawn_dict: dictionary of int values, with keys corresponding to units of time
+        :return: dictionary
+        """
+        return {
+            'mob_name': mob_name,
+            'weeks': respawn_dict['weeks'],
+            'days': respawn_dict['days'],
+            'hours': respawn_dict['hours'],
+            'minutes': respawn_dict['minutes']
+        }
+
+    def diff_lockouts(self, current_rows, respawn_map):
+        """
+        Compare stored lockouts against scraped ones
+        :param current_rows: list of dict entries from get_mob_lockouts
+        :param respawn_map: dictionary of mob name -> respawn dictionary
+        :return: tuple of (bind parameters for changed rows, summary dict)
+        """
+        current = {row['mob_name']: row for row in current_rows}
+        changes = []
+        summary = {'changed': [], 'unchanged': 0, 'missing': []}
+
+        for mob_name, respawn_dict in respawn_map.items():
+            row = current.get(mob_name)
+
+            # scraped mob that is not tracked in respawns table
+            if row is None:
+                summary['missing'].append(mob_name)
+                continue
+
+            params = self.lockout_params(mob_name, respawn_dict)
+
+            # stored values may come back as text, so compare as strings
+            if all(str(row[f"lockout_{unit}"]) == str(params[unit])
+                   for unit in ('weeks', 'days', 'hours', 'minutes')):
+                summary['unchanged'] += 1
+            else:
+                changes.append(params)
+                summary['changed'].append(mob_name)
+
+        return changes, summary
+
+    def character_changes(self, new_name, char_race, char_class, char_type):
+        """
+        The columns an edit writes: only the options selected by user
+        :parameters: the updated details of the character, None if unchanged
+        :return: dictionary of column name -> new value
+        """
+        changes = {}
+
+        if new_name is not None:
+            changes['char_name'] = new_name
+
+        if char_race is not None:
+            changes['char_race'] = char_race
+
+        if char_class is not None:
+            changes['char_class'] = char_class
+
+        # translate char type to an int, since this is hidden from user
+        if char_type is not None:
+            if char_type == 'Main':
+                char_priority = 0
+            elif char_type == 'Alt':
+                char_priority = 1
+            else:
+                char_priority = 2
+
+            changes['char_type'] = char_type
+            changes['char_priority'] = char_priority
+
+        return changes
+
+    def character_update_query(self, char_name, changes):
+        """
+        UPDATE statement writing the given columns of one character
+        :param char_name: string, the name before the update
+        :param changes: dictionary of column name -> new value
+        :return: SQL alchemy Update object
+        """
+        return (
+            update(CHARACTERS_TABLE)
+            .where(CHARACTERS_TABLE.c.char_name == char_name)
+            .values(changes)
+        )
+
     def get_list(self, results, field):
         """
         Take in a list of dicts and return a list of strings
@@ -365,11 +1147,14 @@ class Database:
 
         return results_list
 
-    def format_quotes(self, mob_name):
-        quote_index = mob_name.find("'")
-
-        if quote_index != -1:
-            temp_string = mob_name
-            mob_name = temp_string[:quote_index] + "'" + temp_string[quote_index:]
+    @staticmethod
+    def as_statement(query):
+        """
+        Accept either a prepared statement or plain SQL text
+        :param query: SQLAlchemy executable or string
+        :return: SQLAlchemy executable
+        """
+        if isinstance(query, str):
+            return text(query)
 
-        return mob_name
+        return query
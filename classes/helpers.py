@@ -1,5 +1,11 @@
 import discord
 from datetime import datetime
+from classes.member_index import MemberIndex
+from classes.combined_names import CombinedNames
+from classes.autocomplete import AutocompleteIndex
+from classes.activity_log import activity_logger
+from classes.render_cache import RenderCache
+from classes.times import DISPLAY_TIME_ZONE, as_utc, format_time, utc_now
 
 
 class Helpers:
@@ -7,9 +13,18 @@ class Helpers:
     This class provides miscellaneous functions,
     primarily to the command cogs
     """
+    # one member index and combined name list shared
+    # by every Helpers instance
+    _member_index = MemberIndex()
+    _combined_names = CombinedNames(_member_index)
+    # rendered tables, shared for the same reason
+    _render_cache = RenderCache()
+
     def __init__(self, bot, guild):
         self._bot = bot
         self._guild = guild
+        self._guild_instance = None
+        self._autocomplete_indexes = {}
 
     def validate_role(self, user_roles, target_role):
         """
@@ -24,111 +39,223 @@ class Helpers:
         else:
             return False
 
-    def format_char_message(self, results):
+    def format_char_message(self, results, char_name=None, version=None):
         """
         Format database results into table format
         :param results: list of dictionary entries;
         each item is a different character
+        :param char_name: optional string, the name that was looked up
+        :param version: optional roster version the results were read
+        at (Database.cache_version); without one nothing is cached
         :return: formatted string
         """
         headers = "Name Race Class Type".split()
         row = "{:<15} {:<10} {:<15} {:<5} \n"       # set column widths
+        fields = ('char_name', 'char_race', 'char_class', 'char_type')
+
+        # any roster edit moves the version on, so the key never
+        # has to look at the rows themselves
+        key = None if version is None else ('chars', char_name, version)
+
+        if key is not None:
+            message = Helpers._render_cache.get(key)
 
-        message = row.format(*headers)
-        message = message + "-" * 52 + "\n"         # add a separator
+            if message is not None:
+                return message
+
+        lines = [row.format(*headers), "-" * 52 + "\n"]    # add a separator
 
         for result in results:
             # for each character, arrange them in the correct order
-            message = message + row.format(
-                str(result['char_name']),
-                str(result['char_race']),
-                str(result['char_class']),
-                str(result['char_type'])
-            )
+            lines.append(row.format(*(str(result[field]) for field in fields)))
+
+        message = "".join(lines)
+
+        if key is not None:
+            Helpers._render_cache.put(key, message)
 
         return message
 
-    def format_mob_message(self, results, command):
+    def format_mob_message(self, results, command, name=None, version=None):
         """
         Format database results into table format
         :param results: list of dictionary entries;
         :param command: string, mob or zone
         each item is a different mob
+        :param name: optional string, the mob or zone looked up
+        :param version: optional respawns version, as for format_mob_table
         :return: formatted string
         """
-        message = ""
+        header, rows, footer = self.format_mob_table(results, command, name, version)
+
+        return "".join((header, *rows, footer))
+
+    def format_mob_table(self, results, command, name=None, version=None):
+        """
+        Format database results into the parts of a table, so
+        long tables can be split across messages
+        :param results: list of dictionary entries;
+        each item is a different mob
+        :param command: string, mob or zone
+        :param name: optional string, the mob or zone looked up
+        :param version: optional respawns version the results were read
+        at (Database.cache_version); without one nothing is cached
+        :return: tuple of (header string, tuple of row strings, footer string)
+        """
+        now = utc_now()
+
+        if version is None:
+            return self.render_mob_table(results, command, now)
+
+        # any kill or lockout change moves the version on; the table
+        # then stays the same until the next listed mob comes up
+        key = (command, name, version)
+        table = Helpers._render_cache.get(key, now)
+
+        if table is None:
+            table = self.render_mob_table(results, command, now)
+            Helpers._render_cache.put(key, table, self.next_spawn(results, now))
+
+        return table
+
+    def render_mob_table(self, results, command, now):
+        """
+        Build the parts of a mob table
+        :param results: list of dictionary entries
+        :param command: string, mob or zone
+        :param now: aware datetime the table is rendered at
+        :return: tuple of (header string, tuple of row strings, footer string)
+        """
+        header = ""
         headers = "Mob Killed Respawning".split()
         row = "{:<30} {:<20} {:<20} \n"       # set column widths
+        rows = []
         # set time zone to null value, in case no
-        # time zones exist in results list
+        # kill data exists in results list
         time_zone = None
 
         if command == "zone":
-            message = f"Mob respawn data for: {results[0]['mob_zone']}\n\n"
+            header = f"Mob respawn data for: {results[0]['mob_zone']}\n\n"
 
-        message = message + row.format(*headers)
-        message = message + "-" * 71 + "\n"         # add a separator
+        header = header + row.format(*headers) + "-" * 71 + "\n"   # add a separator
 
         for result in results:
             # check if mob is already up
-            respawn_time = self.compare_times(result['respawn_time'])
+            respawn_time = self.compare_times(result['respawn_time'], now)
 
             # replace kill_time None with better messaging
             kill_time = self.check_kill_time(result['kill_time'])
 
             # for each mob, arrange them in the correct order
-            message = message + row.format(
+            rows.append(row.format(
                 str(result['mob_name']),
                 str(kill_time),
                 str(respawn_time)
-            )
+            ))
 
-            # update time zone if a valid time zone
-            # exists in the current dict
+            # times are stored in UTC and shown in the
+            # display zone, so name it if any kill is shown
             if result['kill_time'] is not None:
-                time_zone = result['time_zone']
+                time_zone = DISPLAY_TIME_ZONE
 
-        message = message + f"\nTime Zone: {time_zone}"
+        return header, tuple(rows), f"\nTime Zone: {time_zone}"
 
-        return message
+    def next_spawn(self, results, now):
+        """
+        Find when the first listed mob that is not yet up
+        comes up, which is when its table changes
+        :param results: list of dictionary entries
+        :param now: aware datetime
+        :return: aware datetime, or None if every mob is up
+        """
+        upcoming = [
+            as_utc(result['respawn_time']) for result in results
+            if result['respawn_time'] is not None and as_utc(result['respawn_time']) > now
+        ]
+
+        return min(upcoming, default=None)
+
+    def format_upcoming_message(self, results):
+        """
+        Format upcoming spawns into table format
+        :param results: list of dictionary entries, soonest first;
+        each item is a different mob
+        :return: formatted string
+        """
+        headers = "Mob Zone Respawning In".split()
+        row = "{:<28} {:<22} {:<19} {:>8}\n"        # set column widths
+        now = utc_now()
+
+        lines = [row.format(*headers), "-" * 80 + "\n"]
+
+        for result in results:
+            # time left until respawn, as hours and minutes
+            respawn_time = as_utc(result['respawn_time'])
+            minutes = int((respawn_time - now).total_seconds() // 60)
+            lines.append(row.format(
+                str(result['mob_name'])[:28],
+                str(result['mob_zone'])[:22],
+                format_time(respawn_time),
+                f"{minutes // 60}h{minutes % 60:02d}m"
+            ))
+
+        return "".join(lines)
+
+    def format_stats_rows(self, stats):
+        """
+        Format latency figures into table rows, one per operation
+        :param stats: list of dictionary entries from Metrics.snapshot
+        :return: list of row strings
+        """
+        row = "{:<12} {:<28} {:>6} {:>8} {:>8} {:>8} {:>5}\n"       # set column widths
+
+        return [
+            row.format(
+                stat['kind'][:12],
+                stat['name'][:28],
+                stat['count'],
+                *(f"{stat['quantiles'][fraction] * 1000:.1f}" for fraction in (0.5, 0.95, 0.99)),
+                stat['errors']
+            )
+            for stat in stats
+        ]
 
     def check_kill_time(self, kill_time):
         """
-        Format kill_time if None
-        :param kill_time: string
+        Format kill_time for display, or explain if None
+        :param kill_time: datetime (UTC) from the database
         :return: string
         """
         if kill_time is None:
-            kill_time = "No Kill Data"
+            return "No Kill Data"
 
-        return kill_time
+        return format_time(kill_time)
 
-    def compare_times(self, database_time):
+    def compare_times(self, database_time, now=None):
         """
         Compare respawn time with current time to determine
         if mob is up or not
-        :param database_time: string, respawn time
-        :return: string, respawn time, either altered or passed through
+        :param database_time: datetime (UTC), respawn time
+        :param now: aware datetime to compare against, defaults to now
+        :return: string, respawn time for display, or UP NOW!
         """
         if database_time is None:
             return "UP NOW!"
 
-        format_string = "%Y-%m-%d %H:%M:%S"
-        # get current time
-        now_time = datetime.now()
-        # convert to datetime object
-        respawn_time = datetime.strptime(database_time, format_string)
+        if now is None:
+            now = utc_now()
 
         # compare the two
-        if now_time >= respawn_time:
-            database_time = "UP NOW!"
+        if now >= as_utc(database_time):
+            return "UP NOW!"
 
-        return database_time
+        return format_time(database_time)
 
     @staticmethod
     def log_activity(user, command, entries):
         """
-        Write every command entered into bot to log file
+        Write every command entered into bot to log file; the line
+        is queued and written by a background thread
         :param user: the Discord user who entered the command
         :param command: the command name
         :param entries: the list of dictionary options user selected
@@ -137,33 +264,78 @@ class Helpers:
         # begin the log string that will be written to log file
         log_string = f"{datetime.now()} - {user} - {command}"
 
-        # if command had options to select
-        if entries is not None:
-            log_string = log_string + " - ["
-            # loop through selected options
-            for entry in entries:
-                # grab the name of the option and what
-                # user entered; add it to log string
-                entry_value = f"{entry['name']}: {entry['value']} | "
-                log_string = log_string + entry_value
+        # if command had options to select, add the name of
+        # each option and what user entered for it
+        if isinstance(entries, str):
+            log_string = f"{log_string} - [{entries}]"
+        elif entries is not None:
+            options = " | ".join(f"{entry['name']}: {entry['value']}" for entry in entries)
+            log_string = f"{log_string} - [{options}]"
 
-            # trim off the trailing pipe and spaces
-            log_string = log_string[0:len(log_string) - 3]
-            log_string = log_string + "]\n"
-
-        file_path = "logs//bot-log.txt"
-
-        print(log_string)
-        file = open(file_path, 'a')
-        file.write(log_string)
-        file.close()
+        activity_logger.log(log_string)
 
     def get_guild(self):
         """
         Obtain the target Discord guild
         :return: a Discord guild instance
         """
-        return discord.utils.get(self._bot.guilds, name=self._guild)
+        # look the guild up once, then reuse it
+        if self._guild_instance is None:
+            self._guild_instance = discord.utils.get(self._bot.guilds, name=self._guild)
+
+        return self._guild_instance
+
+    @property
+    def member_index(self):
+        """
+        The shared guild member index, built from the
+        guild on first use
+        :return: MemberIndex
+        """
+        if not Helpers._member_index.loaded:
+            self.load_members()
+
+        return Helpers._member_index
+
+    def load_members(self):
+        """
+        (Re)build the member index from the guild's member list
+        :return: none
+        """
+        guild = self.get_guild()
+
+        if guild is not None:
+            Helpers._member_index.rebuild(guild.members)
+
+    def is_tracked_guild(self, guild):
+        """
+        Check whether a guild is the bot's target guild
+        :param guild: a Discord guild instance
+        :return: boolean
+        """
+        return guild is not None and guild.name == self._guild
+
+    def index_member(self, member):
+        """
+        Add or refresh a member in the index, from the
+        member join/update events
+        :param member: Discord member
+        :return: none
+        """
+        if self.is_tracked_guild(member.guild):
+            self.member_index.add(member)
+            Helpers._combined_names.refresh_member(member.id)
+
+    def unindex_member(self, member):
+        """
+        Remove a member from the index, from the
+        member remove event
+        :param member: Discord member
+        :return: none
+        """
+        if self.is_tracked_guild(member.guild):
+            self.member_index.remove(member.id)
+            Helpers._combined_names.refresh_member(member.id)
 
     def get_discord_id(self, discord_name, name_type):
         """
@@ -172,19 +344,7 @@ class Helpers:
         :param discord_name: Discord display_name
         :return: string Discord ID number
         """
-        discord_id = ""
-
-        # loop through members of guild, if match
-        # is found, grab the ID
-        for member in self.get_guild().members:
-            if name_type == 'display':
-                if discord_name == member.display_name:
-                    discord_id = member.id
-            elif name_type == 'account':
-                if discord_name == member.name:
-                    discord_id = member.id
-
-        return discord_id
+        return self.member_index.get_id(discord_name, name_type)
 
     def get_discord_name(self, discord_id):
         """
@@ -192,38 +352,21 @@ class Helpers:
         :param discord_id: Discord ID number
         :return: string Discord display_name
         """
-        discord_name = ""
-
         # if a valid dict entry was passed in...
         if len(discord_id) > 0:
             discord_id = discord_id[0]['discord_id']
+        else:
+            return ""
 
-        # loop through members of guild, if match
-        # is found, grab the display_name
-        for member in self.get_guild().members:
-            if str(discord_id) == str(member.id):
-                discord_name = member.display_name
-
-        return discord_name
+        return self.member_index.get_display_name(discord_id)
 
     def get_all_discord_names(self, name_type):
         """
-        Grab all member display_names
+        Grab all member display_names, already sorted case
+        insensitively; the list is shared, do not modify it
         :return: list of Discord display_names
         """
-        discord_names = []
-
-        # loop through all members, add display_names to list
-        for member in self.get_guild().members:
-            if name_type == "display":
-                discord_names.append(member.display_name)
-            elif name_type == "name":
-                discord_names.append(member.name)
-
-        # fancy looking, but just sorts both lists case insensitively
-        discord_names.sort(key=lambda s: s.lower())
-
-        return discord_names
+        return self.member_index.get_names(name_type)
 
     def get_combined_names(self, database_names):
         """
@@ -234,23 +377,61 @@ class Helpers:
         :return:
         """
         combined_names_list = []
+        members = self.member_index
 
-        # loop through each name
+        # join on discord id through the member index,
+        # one dictionary lookup per character
         for guild_member in database_names:
-            # for each name, loop through all members of guild
-            for discord_member in self.get_guild().members:
-                # if match found
-                if str(guild_member['discord_id']) == str(discord_member.id):
-                    # isolate char_name
-                    char_name = guild_member['char_name']
-                    # isolate discord name
-                    discord_name = discord_member.name
-                    # put them together, then exit inner loop
-                    combined_names_list.append(f"[ {char_name} ]" + " " * 4 + f"[ {discord_name} ]")
-                    break
+            discord_name = members.get_name(guild_member['discord_id'])
+
+            if discord_name is not None:
+                char_name = guild_member['char_name']
+                combined_names_list.append(f"[ {char_name} ]" + " " * 4 + f"[ {discord_name} ]")
 
         return combined_names_list
 
+    @property
+    def combined_names(self):
+        """
+        The shared, incrementally maintained combined name list;
+        check its loaded flag and call load_combined_names first
+        :return: CombinedNames
+        """
+        return Helpers._combined_names
+
+    def load_combined_names(self, database_names):
+        """
+        Build the shared combined name list
+        :param database_names: list of dict entries;
+        discord_id and char_names obtained from database
+        :return: none
+        """
+        # make sure members are indexed before joining against them
+        if not Helpers._member_index.loaded:
+            self.load_members()
+
+        Helpers._combined_names.rebuild(database_names)
+
+    def autocomplete(self, list_name, choices, query, version=0):
+        """
+        Filter a list of choices for a Discord autocomplete,
+        using a per-list index that is rebuilt only on change
+        :param list_name: string, identifies the list
+        :param choices: list of choice strings
+        :param query: string the user has typed so far
+        :param version: changes whenever the list's contents change
+        :return: up to 25 ranked matches
+        """
+        index = self._autocomplete_indexes.get(list_name)
+
+        if index is None:
+            index = AutocompleteIndex()
+            self._autocomplete_indexes[list_name] = index
+
+        index.refresh(choices, version)
+
+        return index.search(query)
+
     def get_row(self, results):
         """
         Return correct form of row based on number of results
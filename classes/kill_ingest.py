@@ -0,0 +1,295 @@
+import asyncio
+import hmac
+import json
+import time
+from collections import OrderedDict
+from datetime import datetime
+from os import environ
+from classes.async_database import AsyncDatabase
+from classes.log_tailer import LogTailer, MOB_REFRESH_INTERVAL, POLL_INTERVAL, parse_kill_line
+from classes.times import as_utc, get_zone
+
+# the same kill seen by several clients lands within this many seconds
+DEDUP_WINDOW = int(environ.get('KILL_DEDUP_WINDOW', 60))
+# mobs remembered for de-duplication; the oldest are forgotten first
+DEDUP_MAX_MOBS = 2048
+# seconds between coalesced writes to the respawns table
+FLUSH_INTERVAL = 5
+# local port remote uploaders send kills to, 0 = no listener
+INGEST_PORT = int(environ.get('KILL_INGEST_PORT', 0))
+INGEST_HOST = environ.get('KILL_INGEST_HOST', '127.0.0.1')
+# shared secret every uploader sends as its first line; the
+# listener is not started without one
+INGEST_TOKEN = environ.get('KILL_INGEST_TOKEN', '')
+# seconds an uploader has to send the token after connecting
+AUTH_TIMEOUT = 10
+# zone of raw log lines sent by uploaders
+UPLOAD_TIME_ZONE = environ.get('KILL_INGEST_TIME_ZONE', 'UTC')
+
+
+class KillIngest:
+    """
+    This class gathers kill events from every source at once (the
+    tailed log files and remote uploaders), drops the copies of a
+    kill reported by several clients, and writes what is left to
+    the respawns table in coalesced batches
+    """
+    def __init__(self, tailer=None, port=INGEST_PORT, window=DEDUP_WINDOW, token=INGEST_TOKEN):
+        if tailer is None:
+            tailer = LogTailer()
+
+        self._database = AsyncDatabase()
+        self._tailer = tailer
+        self._port = port
+        self._token = token.encode('utf-8')
+        self._window = window
+        self._recent = OrderedDict()    # mob name -> last accepted kill time, oldest first
+        self._pending = {}              # mob name -> kill time waiting to be written
+        self._pending_offsets = None    # log offsets to save once pending kills are written
+        self._saved_offsets = None      # log offsets last saved, to skip rewriting them unchanged
+        self._mobs = {}                 # lowercase mob name -> database spelling
+        self._mobs_loaded_at = None
+        self._tasks = []
+        self._server = None
+
+        self.accepted = 0
+        self.duplicates = 0
+        self.written = 0
+
+    def is_configured(self):
+        """
+        Check whether there is any source to listen to
+        :return: boolean
+        """
+        return self._tailer.has_logs() or self._port > 0
+
+    def is_running(self):
+        """
+        Check whether the service has been started
+        :return: boolean
+        """
+        return len(self._tasks) > 0
+
+    async def start(self):
+        """
+        Start every configured source and the writer on the
+        running event loop
+        :return: none
+        """
+        await self.get_mobs()
+
+        if self._tailer.has_logs():
+            self._tasks.append(asyncio.create_task(self.tail_logs()))
+
+        if self._port > 0:
+            if len(self._token) == 0:
+                print("kill ingest: KILL_INGEST_TOKEN is not set, uploader listener not started")
+            else:
+                self._server = await asyncio.start_server(self.handle_upload, INGEST_HOST, self._port)
+
+        self._tasks.append(asyncio.create_task(self.flush_loop()))
+
+    async def stop(self):
+        """
+        Stop every source and write whatever is still pending
+        :return: none
+        """
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+        for task in self._tasks:
+            task.cancel()
+
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        await self.flush()
+
+    def submit(self, mob_name, kill_time):
+        """
+        Offer one kill; a kill of the same mob within the window of
+        the last accepted one is a copy from another client
+        :param mob_name: string, database spelling
+        :param kill_time: aware datetime
+        :return: boolean, True if the kill was accepted
+        """
+        kill_time = as_utc(kill_time)
+        last = self._recent.get(mob_name)
+
+        if last is not None and abs((kill_time - last).total_seconds()) <= self._window:
+            self.duplicates += 1
+            return False
+
+        # keep the mob as most recent, and the structure bounded
+        self._recent[mob_name] = kill_time
+        self._recent.move_to_end(mob_name)
+
+        while len(self._recent) > DEDUP_MAX_MOBS:
+            self._recent.popitem(last=False)
+
+        if mob_name not in self._pending or self._pending[mob_name] < kill_time:
+            self._pending[mob_name] = kill_time
+
+        self.accepted += 1
+
+        return True
+
+    async def flush(self):
+        """
+        Write every pending kill in one batch, then save the log
+        offsets they were read up to; a crash before the write
+        re-reads those lines instead of losing kills
+        :return: none
+        """
+        # swap first, so kills arriving mid-write wait for the next batch
+        kills, self._pending = self._pending, {}
+        offsets, self._pending_offsets = self._pending_offsets, None
+
+        if len(kills) > 0:
+            try:
+                self.written += await self._database.record_kills(kills)
+            except Exception as err:
+                print(f"kill ingest: write failed, retrying next flush: {err}")
+
+                for mob_name, kill_time in kills.items():
+                    if mob_name not in self._pending or self._pending[mob_name] < kill_time:
+                        self._pending[mob_name] = kill_time
+
+                # offsets polled since then are further on, and are
+                # only saved once these kills are written with them
+                if self._pending_offsets is None:
+                    self._pending_offsets = offsets
+
+                return
+
+        if offsets is not None and offsets != self._saved_offsets:
+            await asyncio.to_thread(self._tailer.save_offsets, offsets)
+            self._saved_offsets = offsets
+
+    async def flush_loop(self):
+        """
+        Writer task: flush pending kills on an interval
+        :return: none
+        """
+        while True:
+            await asyncio.sleep(FLUSH_INTERVAL)
+            await self.flush()
+
+    async def tail_logs(self):
+        """
+        Source task: poll the local log files in a worker thread
+        :return: none
+        """
+        while True:
+            try:
+                kills = await asyncio.to_thread(self._tailer.poll)
+
+                for mob_name, kill_time in kills.items():
+                    self.submit(mob_name, kill_time)
+
+                # saved by flush, once these kills are written
+                self._pending_offsets = self._tailer.get_offsets()
+            except Exception as err:
+                print(f"kill ingest: log poll failed: {err}")
+
+            if not self._tailer.is_behind():
+                await asyncio.sleep(POLL_INTERVAL)
+
+    async def handle_upload(self, reader, writer):
+        """
+        Source task, one per uploader connection; the first line is
+        the shared token, and each line after it is a raw EQ log line
+        or a JSON object with mob_name and an ISO 8601 kill_time
+        including its offset
+        :param reader: asyncio StreamReader
+        :param writer: asyncio StreamWriter
+        :return: none
+        """
+        zone = get_zone(UPLOAD_TIME_ZONE)
+
+        try:
+            if not await self.authenticate(reader):
+                print(f"kill ingest: rejected uploader {writer.get_extra_info('peername')}")
+                return
+
+            while True:
+                line = await reader.readline()
+
+                if line == b"":
+                    break
+
+                kill = self.parse_upload(line.strip(), zone)
+
+                if kill is None:
+                    continue
+
+                mobs = await self.get_mobs()
+                mob_name = mobs.get(kill[0].lower())
+
+                if mob_name is not None:
+                    self.submit(mob_name, kill[1])
+        finally:
+            writer.close()
+
+    async def authenticate(self, reader):
+        """
+        Check the token an uploader sends as its first line
+        :param reader: asyncio StreamReader
+        :return: boolean, True if it matches KILL_INGEST_TOKEN
+        """
+        if len(self._token) == 0:
+            return False
+
+        try:
+            line = await asyncio.wait_for(reader.readline(), AUTH_TIMEOUT)
+        except asyncio.TimeoutError:
+            return False
+
+        # constant time, so the token can't be guessed byte by byte
+        return hmac.compare_digest(line.strip(), self._token)
+
+    def parse_upload(self, line, zone):
+        """
+        Read one uploaded line
+        :param line: bytes
+        :param zone: tzinfo of raw log lines
+        :return: tuple of (mob name, aware datetime), or None
+        """
+        if line.startswith(b"["):
+            return parse_kill_line(line, zone)
+
+        try:
+            event = json.loads(line)
+            kill_time = datetime.fromisoformat(event['kill_time'])
+        except (ValueError, KeyError, TypeError):
+            return None
+
+        # naive times would be ambiguous between uploaders
+        if kill_time.tzinfo is None:
+            return None
+
+        return str(event['mob_name']), kill_time
+
+    async def get_mobs(self):
+        """
+        Tracked mob names, reloaded from the database now and then
+        :return: dictionary of lowercase mob name -> database spelling
+        """
+        if self._mobs_loaded_at is None or \
+                time.monotonic() - self._mobs_loaded_at > MOB_REFRESH_INTERVAL:
+            self._mobs = {name.lower(): name for name in await self._database.get_all_mob_names()}
+            self._mobs_loaded_at = time.monotonic()
+
+        return self._mobs
+
+    def describe(self):
+        """
+        Summarise the service for display to the user
+        :return: formatted string
+        """
+        return (
+            f"Kill ingest: {'RUNNING' if self.is_running() else 'STOPPED'}\n"
+            f"{self.accepted} accepted, {self.duplicates} duplicates dropped, "
+            f"{self.written} written, {len(self._pending)} pending"
+        )
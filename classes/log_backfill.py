@@ -0,0 +1,178 @@
+import argparse
+import glob
+import mmap
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from classes.database import Database
+from classes.log_tailer import KILL_MARKER, LOG_TIME_ZONE, parse_kill_line
+from classes.migrations import Migrator
+from classes.times import get_zone
+
+# pattern of EQ client log names, used when a directory is given
+LOG_NAME_PATTERN = "eqlog_*.txt"
+
+
+def scan_file(path, mob_names, time_zone):
+    """
+    Find the latest kill of each tracked mob in one log file; the
+    file is memory mapped and only lines around a ' slain ' hit are
+    parsed, so gigabyte logs are read at disk speed
+    :param path: string, log file path
+    :param mob_names: set of lowercase mob names to look for
+    :param time_zone: string, zone the log timestamps are written in
+    :return: dictionary of lowercase mob name -> (mob name, aware datetime)
+    """
+    zone = get_zone(time_zone)
+    latest = {}
+
+    with open(path, 'rb') as file:
+        # mmap cannot map an empty file
+        if os.fstat(file.fileno()).st_size == 0:
+            return latest
+
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            position = data.find(KILL_MARKER)
+
+            while position != -1:
+                start = data.rfind(b"\n", 0, position) + 1
+                end = data.find(b"\n", position)
+
+                if end == -1:
+                    end = len(data)
+
+                kill = parse_kill_line(data[start:end], zone)
+
+                if kill is not None:
+                    key = kill[0].lower()
+
+                    # lines are in time order, but a clock change can
+                    # step backwards, so compare instead of overwriting
+                    if key in mob_names and (key not in latest or latest[key][1] < kill[1]):
+                        latest[key] = kill
+
+                position = data.find(KILL_MARKER, end)
+
+    return latest
+
+
+class LogBackfill:
+    """
+    This class rebuilds kill times from archived EQ client logs:
+    every file is scanned for the most recent kill of each tracked
+    mob, and the results are written in one bulk update
+    """
+    def __init__(self, paths, time_zone=LOG_TIME_ZONE, workers=1):
+        self._database = Database()
+        self._paths = paths
+        self._time_zone = time_zone
+        self._workers = workers     # processes to scan with, 1 = in process
+
+    def find_logs(self):
+        """
+        Expand directories and wildcards into log file paths
+        :return: sorted list of file paths
+        """
+        files = set()
+
+        for path in self._paths:
+            if os.path.isdir(path):
+                files.update(glob.glob(os.path.join(path, LOG_NAME_PATTERN)))
+            else:
+                files.update(glob.glob(path))
+
+        return sorted(files)
+
+    def run(self, progress=None, cancel=None):
+        """
+        Scan every log and write the latest kill of each mob;
+        blocking, so callers on the event loop should use a thread
+        :param progress: optional callable taking a status string
+        :param cancel: optional threading.Event; when set, the scan
+        stops before its next file and nothing is written
+        :return: dictionary of mob name -> aware datetime written,
+        or None if cancelled
+        """
+        files = self.find_logs()
+        mobs = {name.lower(): name for name in self._database.get_all_mob_names()}
+        latest = {}
+        scanned = 0
+
+        for found in self.scan_files(files, set(mobs), cancel):
+            for key, kill in found.items():
+                if key not in latest or latest[key] < kill[1]:
+                    latest[key] = kill[1]
+
+            scanned += 1
+            self.report_progress(
+                progress, f"Scanned {scanned} of {len(files)} logs, {len(latest)} mobs found"
+            )
+
+        if cancel is not None and cancel.is_set():
+            return None
+
+        # use the database spelling of each name
+        kills = {mobs[key]: kill_time for key, kill_time in latest.items()}
+        written = self._database.record_kills(kills)
+
+        self.report_progress(progress, f"{written} of {len(kills)} kill times were newer and written")
+
+        return kills
+
+    def scan_files(self, files, mob_names, cancel=None):
+        """
+        Scan files one after another, or across a process pool
+        :param files: list of file paths
+        :param mob_names: set of lowercase mob names
+        :param cancel: optional threading.Event
+        :return: yields one scan_file result per file
+        """
+        if self._workers <= 1 or len(files) <= 1:
+            for path in files:
+                if cancel is not None and cancel.is_set():
+                    return
+
+                yield scan_file(path, mob_names, self._time_zone)
+
+            return
+
+        with ProcessPoolExecutor(max_workers=self._workers) as pool:
+            futures = [
+                pool.submit(scan_file, path, mob_names, self._time_zone) for path in files
+            ]
+
+            for future in as_completed(futures):
+                if cancel is not None and cancel.is_set():
+                    for pending in futures:
+                        pending.cancel()
+
+                    return
+
+                yield future.result()
+
+    def report_progress(self, progress, message):
+        """
+        pass a status message to the progress callback,
+        or print it to console if there is none
+        :param progress: callable taking a string, or None
+        :param message: string
+        :return: none
+        """
+        if progress is None:
+            print(message)
+        else:
+            progress(message)
+
+
+if __name__ == "__main__":
+    # python -m classes.log_backfill <log files or directories>
+    parser = argparse.ArgumentParser(description="Re-seed kill times from archived EQ logs")
+    parser.add_argument('paths', nargs='+', help="log files, wildcards or directories")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help="processes to scan with")
+    parser.add_argument('--time-zone', default=LOG_TIME_ZONE,
+                        help="zone the log timestamps are written in")
+    arguments = parser.parse_args()
+
+    # kill times are written as UTC DATETIMEs, so the schema must be current
+    Migrator(Database()).require_current()
+    LogBackfill(arguments.paths, arguments.time_zone, arguments.workers).run()
@@ -0,0 +1,275 @@
+import json
+import os
+import re
+import threading
+import time
+from datetime import datetime
+from os import environ
+from classes.database import Database
+from classes.times import get_zone
+
+# EQ client logs to watch, separated by the os path separator
+LOG_FILES = environ.get('EQ_LOG_FILES', '')
+# zone the EQ client writes its log timestamps in
+LOG_TIME_ZONE = environ.get('EQ_LOG_TIME_ZONE', 'UTC')
+# where read offsets are kept between restarts
+OFFSETS_PATH = environ.get('EQ_LOG_OFFSETS', os.path.join("logs", "eq-log-offsets.json"))
+# seconds between checks for new log lines
+POLL_INTERVAL = 2
+# seconds between reloads of the tracked mob names
+MOB_REFRESH_INTERVAL = 600
+# most bytes read from one file per poll, so a huge backlog is
+# written out in steps instead of all at once
+READ_CHUNK = 4 * 1024 * 1024
+
+# '[Sun Oct 18 18:19:29 2026] You have slain Lord Nagafen!' or
+# '[Sun Oct 18 18:19:29 2026] Lord Nagafen has been slain by Soandso!';
+# matched as bytes so lines are never decoded unless they are kills
+KILL_PATTERN = re.compile(
+    rb"^\[(?P<stamp>\w{3} \w{3} [ \d]\d \d{2}:\d{2}:\d{2} \d{4})\] "
+    rb"(?:You have slain (?P<slain>.+?)|(?P<victim>.+?) has been slain by .+?)!\s*$"
+)
+# cheap substring test run before the regex
+KILL_MARKER = b" slain "
+LOG_STAMP_FORMAT = "%a %b %d %H:%M:%S %Y"
+
+
+def parse_kill_line(line, zone):
+    """
+    Pull the mob name and time out of a kill line
+    :param line: bytes, one log line
+    :param zone: tzinfo the log timestamps are written in
+    :return: tuple of (mob name, aware datetime), or None
+    """
+    if KILL_MARKER not in line:
+        return None
+
+    match = KILL_PATTERN.match(line)
+
+    if match is None:
+        return None
+
+    mob = match.group('slain') or match.group('victim')
+    kill_time = datetime.strptime(match.group('stamp').decode('ascii'), LOG_STAMP_FORMAT)
+
+    return mob.decode('latin-1'), kill_time.replace(tzinfo=zone)
+
+
+class LogTailer:
+    """
+    This class follows EQ client log files as they grow, picking
+    out kills of tracked mobs and writing their kill times to the
+    respawns table in batches; read offsets are saved so a
+    restart carries on where it left off
+    """
+    def __init__(self, paths=None, offsets_path=OFFSETS_PATH, time_zone=LOG_TIME_ZONE):
+        if paths is None:
+            paths = [path for path in LOG_FILES.split(os.pathsep) if path != ""]
+
+        self._database = Database()
+        self._paths = paths
+        self._offsets_path = offsets_path
+        self._zone = get_zone(time_zone)
+        self._offsets = self.load_offsets()
+        # offsets are moved by poll and saved from other threads
+        self._offsets_lock = threading.Lock()
+        self._mobs = {}             # lowercase mob name -> database spelling
+        self._mobs_loaded_at = None
+        self._behind = False        # a file had more to read than one chunk
+        self._moved = False         # offsets changed since the last save
+
+    def has_logs(self):
+        """
+        Check whether any log files are configured
+        :return: boolean
+        """
+        return len(self._paths) > 0
+
+    def run(self, progress=None, cancel=None):
+        """
+        Follow the logs until cancelled; blocking, so it is meant
+        to run as a BackgroundJob
+        :param progress: optional callable taking a status string
+        :param cancel: optional threading.Event that stops the loop
+        :return: int, total number of kill times written
+        """
+        if cancel is None:
+            cancel = threading.Event()
+
+        written = 0
+
+        for kills in self.follow(cancel):
+            written += self._database.record_kills(kills)
+
+            if progress is not None:
+                progress(f"{written} kill times written, last: {', '.join(kills)}")
+
+        return written
+
+    def follow(self, cancel):
+        """
+        Generator for real time log parsing: polls every file and
+        yields each batch of new kills, latest per mob
+        :param cancel: threading.Event that ends the generator
+        :return: yields dictionaries of mob name -> aware datetime
+        """
+        while not cancel.is_set():
+            kills = self.poll()
+
+            if len(kills) > 0:
+                yield kills
+
+            # saved only once the consumer has written the batch, so
+            # a crash re-reads those lines instead of losing kills
+            self.checkpoint()
+
+            # only sleep when caught up with every file
+            if not self.is_behind():
+                cancel.wait(POLL_INTERVAL)
+
+    def poll(self):
+        """
+        Read whatever has been appended to each file since the
+        last poll; offsets move on in memory only
+        :return: dictionary of mob name -> aware datetime
+        """
+        mobs = self.get_mobs()
+        kills = {}
+        self._behind = False
+
+        for path in self._paths:
+            for mob_name, kill_time in self.read_new_kills(path, mobs):
+                if mob_name not in kills or kills[mob_name] < kill_time:
+                    kills[mob_name] = kill_time
+
+        return kills
+
+    def read_new_kills(self, path, mobs):
+        """
+        Read new complete lines from one file; a file that was
+        replaced or truncated is read again from the start
+        :param path: string, log file path
+        :param mobs: dictionary of lowercase mob name -> database spelling
+        :return: list of (mob name, aware datetime) tuples
+        """
+        try:
+            stat = os.stat(path)
+        except OSError:
+            # not created yet, or mid-rotation
+            return []
+
+        with self._offsets_lock:
+            saved = self._offsets.get(path)
+
+        if saved is None:
+            # a file we have never seen: only follow new lines, the
+            # history is what the backfill is for
+            offset = stat.st_size
+        elif saved['inode'] != stat.st_ino or stat.st_size < saved['offset']:
+            # rotated or truncated: the whole file is new
+            offset = 0
+        else:
+            offset = saved['offset']
+
+        kills = []
+
+        with open(path, 'rb') as file:
+            file.seek(offset)
+            data = file.read(READ_CHUNK)
+
+        # leave a partly written last line for the next poll
+        end = data.rfind(b"\n") + 1
+
+        # a single line longer than a chunk is no kill line; skip it
+        if end == 0 and len(data) == READ_CHUNK:
+            end = len(data)
+
+        for line in data[:end].splitlines():
+            kill = parse_kill_line(line, self._zone)
+
+            if kill is not None and kill[0].lower() in mobs:
+                kills.append((mobs[kill[0].lower()], kill[1]))
+
+        if saved != {'inode': stat.st_ino, 'offset': offset + end}:
+            with self._offsets_lock:
+                self._offsets[path] = {'inode': stat.st_ino, 'offset': offset + end}
+                self._moved = True
+
+        if offset + end < stat.st_size and end > 0:
+            self._behind = True
+
+        return kills
+
+    def is_behind(self):
+        """
+        Check whether the last poll left unread data behind
+        :return: boolean
+        """
+        return self._behind
+
+    def checkpoint(self):
+        """
+        Save offsets if the last polls moved them
+        :return: none
+        """
+        if self._moved:
+            self.save_offsets()
+
+    def get_offsets(self):
+        """
+        Copy of the offsets reached so far, for a consumer that
+        writes kills later to save once they are written
+        :return: dictionary of path -> {'inode', 'offset'}
+        """
+        with self._offsets_lock:
+            return {path: dict(entry) for path, entry in self._offsets.items()}
+
+    def get_mobs(self):
+        """
+        Tracked mob names, reloaded from the database now and then
+        so newly added mobs are picked up
+        :return: dictionary of lowercase mob name -> database spelling
+        """
+        if self._mobs_loaded_at is None or \
+                time.monotonic() - self._mobs_loaded_at > MOB_REFRESH_INTERVAL:
+            self._mobs = {name.lower(): name for name in self._database.get_all_mob_names()}
+            self._mobs_loaded_at = time.monotonic()
+
+        return self._mobs
+
+    def load_offsets(self):
+        """
+        Read saved offsets, starting fresh if there are none
+        :return: dictionary of path -> {'inode', 'offset'}
+        """
+        try:
+            with open(self._offsets_path, encoding='utf-8') as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return {}
+
+    def save_offsets(self, offsets=None):
+        """
+        Write offsets atomically, so a crash never leaves a
+        half written file behind
+        :param offsets: optional copy from get_offsets to save
+        in place of the current offsets
+        :return: none
+        """
+        if offsets is None:
+            offsets = self.get_offsets()
+
+        directory = os.path.dirname(self._offsets_path)
+
+        if directory != "":
+            os.makedirs(directory, exist_ok=True)
+
+        temp_path = self._offsets_path + ".tmp"
+
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            json.dump(offsets, file)
+
+        os.replace(temp_path, self._offsets_path)
+
+        with self._offsets_lock:
+            self._moved = offsets != self._offsets
@@ -0,0 +1,187 @@
+from bisect import bisect_left, insort
+
+
+class MemberIndex:
+    """
+    This class keeps guild members indexed by id, account
+    name and display name, with pre-sorted name lists; it is
+    built once from the guild and then kept current by the
+    member join/remove/update events
+    """
+    def __init__(self):
+        self._by_id = {}            # member id -> (account name, display name)
+        self._by_name = {}          # account name -> list of member ids
+        self._by_display = {}       # display name -> list of member ids
+        self._names = []            # account names, sorted case insensitively
+        self._display_names = []    # display names, sorted case insensitively
+
+        self.loaded = False
+        # bumped on every change, so dependent indexes know to rebuild
+        self.version = 0
+
+    def rebuild(self, members):
+        """
+        Index every member of the guild from scratch
+        :param members: iterable of Discord members
+        :return: none
+        """
+        self._by_id = {}
+        self._by_name = {}
+        self._by_display = {}
+
+        for member in members:
+            self._by_id[member.id] = (member.name, member.display_name)
+            self._by_name.setdefault(member.name, []).append(member.id)
+            self._by_display.setdefault(member.display_name, []).append(member.id)
+
+        names = [entry[0] for entry in self._by_id.values()]
+        display_names = [entry[1] for entry in self._by_id.values()]
+        self._names = sorted(names, key=str.lower)
+        self._display_names = sorted(display_names, key=str.lower)
+
+        self.loaded = True
+        self.version += 1
+
+    def add(self, member):
+        """
+        Index a member that joined, or re-index one whose
+        names changed
+        :param member: Discord member
+        :return: none
+        """
+        if member.id in self._by_id:
+            self.remove(member.id)
+
+        self._by_id[member.id] = (member.name, member.display_name)
+        self._by_name.setdefault(member.name, []).append(member.id)
+        self._by_display.setdefault(member.display_name, []).append(member.id)
+        insort(self._names, member.name, key=str.lower)
+        insort(self._display_names, member.display_name, key=str.lower)
+        self.version += 1
+
+    def remove(self, member_id):
+        """
+        Drop a member from the index
+        :param member_id: int, Discord ID number
+        :return: none
+        """
+        entry = self._by_id.pop(member_id, None)
+
+        if entry is None:
+            return
+
+        name, display_name = entry
+        self._drop_id(self._by_name, name, member_id)
+        self._drop_id(self._by_display, display_name, member_id)
+        self._drop_name(self._names, name)
+        self._drop_name(self._display_names, display_name)
+        self.version += 1
+
+    def get_id(self, discord_name, name_type):
+        """
+        Find the discord id of a member
+        :param discord_name: Discord account or display name
+        :param name_type: 'account' or 'display'
+        :return: int Discord ID number, or "" if not found
+        """
+        if name_type == 'display':
+            ids = self._by_display.get(discord_name)
+        else:
+            ids = self._by_name.get(discord_name)
+
+        # names are not unique; like the old member scan,
+        # the most recently seen match wins
+        if not ids:
+            return ""
+
+        return ids[-1]
+
+    def get_display_name(self, discord_id):
+        """
+        Find the display name of a member
+        :param discord_id: Discord ID number, int or string
+        :return: string display name, or "" if not found
+        """
+        try:
+            entry = self._by_id.get(int(discord_id))
+        except (TypeError, ValueError):
+            return ""
+
+        if entry is None:
+            return ""
+
+        return entry[1]
+
+    def get_name(self, discord_id):
+        """
+        Find the account name of a member
+        :param discord_id: Discord ID number, int or string
+        :return: string account name, or None if not found
+        """
+        try:
+            entry = self._by_id.get(int(discord_id))
+        except (TypeError, ValueError):
+            return None
+
+        if entry is None:
+            return None
+
+        return entry[0]
+
+    def get_names(self, name_type):
+        """
+        Get every member's name, sorted case insensitively;
+        the list is shared, so callers must not modify it
+        :param name_type: 'name' or 'display'
+        :return: list of names
+        """
+        if name_type == 'display':
+            return self._display_names
+
+        return self._names
+
+    def get_ids(self):
+        """
+        Get the ids of every indexed member
+        :return: set-like view of int Discord ID numbers
+        """
+        return self._by_id.keys()
+
+    def __contains__(self, member_id):
+        return member_id in self._by_id
+
+    def __len__(self):
+        return len(self._by_id)
+
+    @staticmethod
+    def _drop_id(name_map, name, member_id):
+        """
+        Remove one id from a name -> ids mapping
+        :return: none
+        """
+        ids = name_map.get(name)
+
+        if ids is None:
+            return
+
+        if member_id in ids:
+            ids.remove(member_id)
+
+        if len(ids) == 0:
+            del name_map[name]
+
+    @staticmethod
+    def _drop_name(sorted_names, name):
+        """
+        Remove one occurrence of a name from a sorted list
+        :return: none
+        """
+        key = name.lower()
+        position = bisect_left(sorted_names, key, key=str.lower)
+
+        # names can share a lowercase key, so step through the ties
+        while position < len(sorted_names) and sorted_names[position].lower() == key:
+            if sorted_names[position] == name:
+                del sorted_names[position]
+                return
+            position += 1
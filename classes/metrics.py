@@ -0,0 +1,302 @@
+import asyncio
+import functools
+import inspect
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from os import environ
+
+# Prometheus text file rewritten every METRICS_INTERVAL seconds, "" = none
+METRICS_FILE = environ.get('METRICS_FILE', os.path.join("logs", "metrics.prom"))
+METRICS_INTERVAL = int(environ.get('METRICS_INTERVAL', 15))
+# local port serving the same text over HTTP, 0 = no listener
+METRICS_PORT = int(environ.get('METRICS_PORT', 0))
+METRICS_HOST = environ.get('METRICS_HOST', '127.0.0.1')
+# most recent timings kept per operation for the percentiles
+SAMPLE_SIZE = 1024
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class Histogram:
+    """
+    This class holds the timings of one operation: totals since
+    startup, and the most recent samples for percentiles
+    """
+    def __init__(self, size=SAMPLE_SIZE):
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0            # seconds, summed over every call
+        self._samples = deque(maxlen=size)
+
+    def observe(self, seconds, error=False):
+        """
+        Record one call
+        :param seconds: float, time the call took
+        :param error: boolean, True if the call raised
+        :return: none
+        """
+        self.count += 1
+        self.total += seconds
+        self._samples.append(seconds)
+
+        if error:
+            self.errors += 1
+
+    def quantile(self, fraction):
+        """
+        Nearest-rank percentile of the recent samples
+        :param fraction: float, 0-1
+        :return: float seconds, 0 with no samples
+        """
+        samples = sorted(self._samples)
+
+        if len(samples) == 0:
+            return 0.0
+
+        rank = max(0, min(len(samples) - 1, round(fraction * len(samples)) - 1))
+
+        return samples[rank]
+
+
+class Metrics:
+    """
+    This class times the bot's commands, autocompletes, queries and
+    scrapes; one set of histograms is shared by the whole process,
+    keyed by kind (command, autocomplete, database, scrape) and name
+    """
+    _series = {}                # (kind, name) -> Histogram
+    _lock = threading.Lock()    # queries are also timed in worker threads
+
+    @classmethod
+    def observe(cls, kind, name, seconds, error=False):
+        """
+        Record one timed call
+        :param kind: string, e.g. command
+        :param name: string, e.g. lookup_characters
+        :param seconds: float
+        :param error: boolean, True if the call raised
+        :return: none
+        """
+        with cls._lock:
+            histogram = cls._series.get((kind, name))
+
+            if histogram is None:
+                histogram = cls._series[(kind, name)] = Histogram()
+
+            histogram.observe(seconds, error)
+
+    @classmethod
+    @contextmanager
+    def timer(cls, kind, name):
+        """
+        Time the body of a with block, counting an exception as an error
+        :param kind: string
+        :param name: string
+        :return: context manager
+        """
+        start = time.perf_counter()
+        error = False
+
+        try:
+            yield
+        except Exception:
+            error = True
+            raise
+        finally:
+            cls.observe(kind, name, time.perf_counter() - start, error)
+
+    @classmethod
+    def snapshot(cls):
+        """
+        Current figures for every operation, ordered by kind and name
+        :return: list of dicts with kind, name, count, errors, sum and quantiles
+        """
+        with cls._lock:
+            return [
+                {
+                    'kind': kind,
+                    'name': name,
+                    'count': histogram.count,
+                    'errors': histogram.errors,
+                    'sum': histogram.total,
+                    'quantiles': {fraction: histogram.quantile(fraction) for fraction in QUANTILES}
+                }
+                for (kind, name), histogram in sorted(cls._series.items())
+            ]
+
+    @classmethod
+    def render(cls):
+        """
+        Every histogram in the Prometheus text exposition format
+        :return: string
+        """
+        rows = cls.snapshot()
+        lines = [
+            "# HELP sos_bot_latency_seconds Time taken by commands, autocompletes, queries and scrapes",
+            "# TYPE sos_bot_latency_seconds summary"
+        ]
+
+        for row in rows:
+            labels = f'kind="{escape(row["kind"])}",name="{escape(row["name"])}"'
+
+            for fraction, seconds in row['quantiles'].items():
+                lines.append(f'sos_bot_latency_seconds{{{labels},quantile="{fraction}"}} {seconds:.6f}')
+
+            lines.append(f"sos_bot_latency_seconds_sum{{{labels}}} {row['sum']:.6f}")
+            lines.append(f"sos_bot_latency_seconds_count{{{labels}}} {row['count']}")
+
+        lines.append("# HELP sos_bot_errors_total Calls that raised an exception")
+        lines.append("# TYPE sos_bot_errors_total counter")
+
+        for row in rows:
+            labels = f'kind="{escape(row["kind"])}",name="{escape(row["name"])}"'
+            lines.append(f"sos_bot_errors_total{{{labels}}} {row['errors']}")
+
+        return "\n".join(lines) + "\n"
+
+
+def timed(kind, name=None):
+    """
+    Decorator timing every call of a function or coroutine
+    function; the wrapper keeps the signature, so slash commands
+    and autocompletes still see their options
+    :param kind: string, e.g. command
+    :param name: string, defaults to the function name
+    :return: decorator
+    """
+    def decorator(func):
+        label = func.__name__ if name is None else name
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                with Metrics.timer(kind, label):
+                    return await func(*args, **kwargs)
+        else:
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with Metrics.timer(kind, label):
+                    return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def escape(value):
+    """
+    Escape a Prometheus label value
+    :param value: string
+    :return: string
+    """
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class MetricsExporter:
+    """
+    This class publishes the metrics for Prometheus: rewritten to
+    a text file now and then, and served over HTTP on localhost
+    """
+    def __init__(self, path=METRICS_FILE, port=METRICS_PORT, interval=METRICS_INTERVAL):
+        self._path = path
+        self._port = port
+        self._interval = interval
+        self._task = None
+        self._server = None
+
+    def is_configured(self):
+        """
+        Check whether there is anywhere to publish to
+        :return: boolean
+        """
+        return self._path != "" or self._port > 0
+
+    def is_running(self):
+        """
+        Check whether the exporter has been started
+        :return: boolean
+        """
+        return self._task is not None or self._server is not None
+
+    async def start(self):
+        """
+        Start the file writer and the HTTP listener, as configured
+        :return: none
+        """
+        if self._path != "":
+            self._task = asyncio.create_task(self.write_loop())
+
+        if self._port > 0:
+            self._server = await asyncio.start_server(self.handle_request, METRICS_HOST, self._port)
+
+    async def stop(self):
+        """
+        Stop writing and listening
+        :return: none
+        """
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def write_loop(self):
+        """
+        Rewrite the metrics file forever; meant to run as a task
+        :return: none
+        """
+        while True:
+            try:
+                await asyncio.to_thread(self.write_file)
+            except OSError as err:
+                print(f"metrics file write failed: {err}")
+
+            await asyncio.sleep(self._interval)
+
+    def write_file(self):
+        """
+        Write the metrics atomically, so a scraper never reads
+        a half written file
+        :return: none
+        """
+        directory = os.path.dirname(self._path)
+
+        if directory != "":
+            os.makedirs(directory, exist_ok=True)
+
+        temp_path = self._path + ".tmp"
+
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            file.write(Metrics.render())
+
+        os.replace(temp_path, self._path)
+
+    async def handle_request(self, reader, writer):
+        """
+        Answer one HTTP request, whatever its path, with the metrics
+        :param reader: asyncio StreamReader
+        :param writer: asyncio StreamWriter
+        :return: none
+        """
+        try:
+            # skip the request line and headers
+            while (await reader.readline()).strip() != b"":
+                pass
+
+            body = Metrics.render().encode('utf-8')
+            writer.write(
+                b"HTTP/1.0 200 OK\r\n"
+                b"Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+                + f"Content-Length: {len(body)}\r\n\r\n".encode('ascii')
+                + body
+            )
+            await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
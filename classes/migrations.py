@@ -0,0 +1,338 @@
+import argparse
+from os import environ
+from sqlalchemy import DateTime, bindparam, text
+from classes.database import (
+    Database, GET_DISCORD_IDS_QUERY, LOOKUP_CHARACTERS_QUERY, LOOKUP_PROFILE_QUERY,
+    FIND_MAIN_FROM_DISCORD_QUERY, FIND_CHARACTERS_FROM_DISCORD_QUERY, LOOKUP_DISCORD_ID_QUERY,
+    COUNT_IDS_QUERY, FIND_MEMBER_QUERY, FIND_ALL_MAINS_QUERY, GET_ALL_CHARACTERS_QUERY,
+    GET_ALL_CHAR_NAMES_QUERY, GET_ALL_MOB_NAMES_QUERY, GET_ALL_ZONE_NAMES_QUERY,
+    GET_MOB_RESPAWN_QUERY, GET_MOB_LOCKOUTS_QUERY, GET_ZONE_RESPAWNS_QUERY, GET_MOBS_UP_QUERY,
+    GET_ALL_RESPAWNS_QUERY, ROSTER_CHARACTERS_QUERY, ROSTER_MEMBERS_QUERY,
+    DELETE_CHARACTER_QUERY, DELETE_MEMBER_QUERY, UPDATE_LOCKOUT_QUERY, CHANGES_SINCE_QUERY,
+    PRUNE_CHANGES_QUERY
+)
+from classes.times import TIME_FORMAT, to_database, utc_now
+
+# indexes for the columns the bot's queries filter, join and sort on;
+# an existing index with the same leading columns (a primary key,
+# say) already serves the query, so none is added beside it
+INDEXES = [
+    ('ix_characters_char_name', 'characters', ('char_name',)),
+    ('ix_characters_discord_type', 'characters', ('discord_id', 'char_type')),
+    ('ix_characters_discord_priority', 'characters', ('discord_id', 'char_priority')),
+    ('ix_respawns_mob_name', 'respawns', ('mob_name',)),
+    ('ix_respawns_mob_zone', 'respawns', ('mob_zone',)),
+    ('ix_respawns_respawn_time', 'respawns', ('respawn_time',)),
+]
+
+# every schema change, in order: version, description, and the
+# Migrator method giving its statements; append, never renumber
+MIGRATIONS = [
+    (1, "create the characters, members and respawns tables", 'create_tables'),
+    (2, "native DATETIME and INT respawn columns holding UTC times", 'native_columns'),
+    (3, "indexes for the bot's lookups", 'create_indexes'),
+    (4, "row_changes log, filled by triggers, for incremental mirror refreshes", 'change_log'),
+    (5, "character, mob and zone names compared ignoring case", 'name_collation'),
+]
+
+CURRENT_VERSION_QUERY = text(
+    "SELECT MAX(version) AS version FROM sos_bot.schema_version"
+)
+RECORD_VERSION_QUERY = text(
+    "INSERT INTO sos_bot.schema_version (version, description, applied_at) "
+    "VALUES (:version, :description, :applied_at)"
+).bindparams(bindparam('applied_at', type_=DateTime))
+SAMPLE_CHARACTER_QUERY = text(
+    "SELECT discord_id, char_name FROM sos_bot.characters LIMIT 1"
+)
+SAMPLE_RESPAWN_QUERY = text(
+    "SELECT mob_name, mob_zone FROM sos_bot.respawns LIMIT 1"
+)
+# names that become one name once case is ignored
+CLASHING_NAMES_QUERY = text(
+    "SELECT LOWER(char_name) AS name FROM sos_bot.characters "
+    "GROUP BY LOWER(char_name) HAVING COUNT(*) > 1 "
+    "UNION SELECT LOWER(mob_name) AS name FROM sos_bot.respawns "
+    "GROUP BY LOWER(mob_name) HAVING COUNT(*) > 1"
+)
+
+
+class Migrator:
+    """
+    This class creates and upgrades the sos_bot schema: each
+    migration is applied once, in order, and recorded in the
+    schema_version table; it can also show the query plan of
+    every statement the Database class sends
+    """
+    def __init__(self, database):
+        self._database = database
+        self._backend = database.backend
+
+        # migrate at startup; on by default for SQLite, whose file
+        # starts out empty, while a MySQL server is upgraded by hand
+        default_bootstrap = 'true' if self._backend.name == 'sqlite' else 'false'
+        self._bootstrap = environ.get('SCHEMA_BOOTSTRAP', default_bootstrap).lower() == 'true'
+
+    ################# VERSION METHODS #################
+    def current_version(self):
+        """
+        The version of the last applied migration
+        :return: int, 0 for a new schema
+        """
+        self._database.execute_transaction(
+            [(statement, None) for statement in self._backend.version_statements]
+        )
+        version = self._database.execute_read(CURRENT_VERSION_QUERY, field='version')[0]
+
+        return 0 if version is None else int(version)
+
+    def require(self, version, needed_by):
+        """
+        Stop at startup if the schema is older than a feature needs
+        :param version: int, the migration the feature depends on
+        :param needed_by: string, what depends on it, for the message
+        :return: none
+        """
+        current = self.current_version()
+
+        if current < version:
+            raise RuntimeError(
+                f"{needed_by} needs schema version {version}, but the database is at "
+                f"version {current}; run `python -m classes.migrations upgrade`"
+            )
+
+    def require_current(self):
+        """
+        Stop at startup unless every migration has been applied:
+        the bot's statements, caches and read mirror are written
+        for the newest schema only
+        :return: none
+        """
+        self.require(MIGRATIONS[-1][0], "this version of the bot")
+
+    def pending(self):
+        """
+        Migrations not yet applied
+        :return: list of (version, description, method name) tuples
+        """
+        current = self.current_version()
+
+        return [migration for migration in MIGRATIONS if migration[0] > current]
+
+    def upgrade(self):
+        """
+        Apply every pending migration, each in its own transaction
+        together with its schema_version row (MySQL commits schema
+        changes as it makes them, so the statements are written to
+        be safe to run again)
+        :return: list of versions applied
+        """
+        applied = []
+
+        for version, description, method in self.pending():
+            steps = [(statement, None) for statement in getattr(self, method)()]
+            steps.append((RECORD_VERSION_QUERY, {
+                'version': version,
+                'description': description,
+                'applied_at': to_database(utc_now())
+            }))
+
+            self._database.execute_transaction(steps)
+            applied.append(version)
+            print(f"applied migration {version}: {description}")
+
+        # tables may have changed under the in-memory copies
+        if len(applied) > 0:
+            Database._roster.invalidate()
+            Database._respawns.invalidate()
+
+        return applied
+
+    def bootstrap(self):
+        """
+        Upgrade the schema at startup, if switched on (SCHEMA_BOOTSTRAP)
+        :return: boolean, True if the schema was checked
+        """
+        if not self._bootstrap:
+            return False
+
+        self.upgrade()
+
+        return True
+
+    ################# MIGRATIONS #################
+    def create_tables(self):
+        """
+        Create any missing tables; existing tables are left alone
+        :return: list of statements
+        """
+        return list(self._backend.schema_statements)
+
+    def native_columns(self):
+        """
+        Convert an old respawns table of text columns to native
+        ones holding UTC, and derive every respawn time afresh;
+        refused while any kill time cannot be moved to UTC, since
+        every respawn time would be derived from the wrong base
+        :return: list of statements
+        """
+        if self._backend.unconverted_statement is not None:
+            zones = self._database.execute_read(self._backend.unconverted_statement, field='time_zone')
+
+            if len(zones) > 0:
+                raise RuntimeError(
+                    f"cannot convert kill times in time zone(s) {', '.join(zones)} to UTC; "
+                    "load the server's time zone tables (mysql_tzinfo_to_sql) or correct "
+                    "those rows, then run `python -m classes.migrations upgrade` again"
+                )
+
+        return list(self._backend.convert_statements) + [self._database.sql['recompute_all']]
+
+    def create_indexes(self, existing=None):
+        """
+        Add each of INDEXES not already served by an existing index
+        :param existing: optional dictionary of table name -> list of
+        index column tuples, instead of reading them from the tables
+        :return: list of statements
+        """
+        statements = []
+        existing = {} if existing is None else existing
+
+        for name, table_name, columns in INDEXES:
+            if table_name not in existing:
+                indexes = self._backend.get_indexes(self._database, table_name)
+                existing[table_name] = list(indexes.values())
+
+            if not any(index[:len(columns)] == columns for index in existing[table_name]):
+                statements.append(self._backend.create_index(name, table_name, columns))
+                existing[table_name].append(columns)
+
+        return statements
+
+    def change_log(self):
+        """
+        Log every characters, members and respawns write, whatever
+        tool makes it, so the read mirror fetches only changed rows
+        :return: list of statements
+        """
+        return self._backend.change_log_statements()
+
+    def name_collation(self):
+        """
+        Make name columns compare and sort ignoring case, as the
+        roster cache and respawn index do, so a lookup finds the
+        same rows with the caches on or off; refused while two
+        names differ only in case, since they would become one
+        :return: list of statements
+        """
+        names = self._database.execute_read(CLASHING_NAMES_QUERY, field='name')
+
+        if len(names) > 0:
+            raise RuntimeError(
+                f"names {', '.join(names)} each appear more than once in different case; "
+                "rename or delete the extra rows, then run "
+                "`python -m classes.migrations upgrade` again"
+            )
+
+        statements = list(self._backend.collation_statements)
+
+        # SQLite rebuilt the tables, keeping only their primary keys
+        if self._backend.name == 'sqlite':
+            statements += self.create_indexes({'characters': [('char_name',)], 'respawns': [('mob_name',)]})
+            statements += self._backend.change_log_statements()
+
+        return statements
+
+    ################# EXPLAIN METHODS #################
+    def explain_queries(self):
+        """
+        Each Database method's statement, with sample parameters
+        taken from the tables where there are rows to take them from
+        :return: list of (method name, statement, params) tuples
+        """
+        characters = self._database.execute_read(SAMPLE_CHARACTER_QUERY)
+        respawns = self._database.execute_read(SAMPLE_RESPAWN_QUERY)
+        character = characters[0] if len(characters) > 0 else {'discord_id': '0', 'char_name': 'Nobody'}
+        respawn = respawns[0] if len(respawns) > 0 else {'mob_name': 'Nothing', 'mob_zone': 'Nowhere'}
+        char_name = {'char_name': character['char_name']}
+        discord_id = {'discord_id': character['discord_id']}
+        mob_name = {'mob_name': respawn['mob_name']}
+        lockout = {**mob_name, 'weeks': 0, 'days': 0, 'hours': 0, 'minutes': 0}
+        # the plain text statements bind times as text, which both backends compare
+        now = to_database(utc_now()).strftime(TIME_FORMAT)
+        kill = {**mob_name, 'kill_time': now}
+
+        return [
+            ('get_discord_ids', GET_DISCORD_IDS_QUERY, None),
+            ('lookup_characters', LOOKUP_CHARACTERS_QUERY, char_name),
+            ('lookup_profile', LOOKUP_PROFILE_QUERY, char_name),
+            ('find_main_from_discord', FIND_MAIN_FROM_DISCORD_QUERY, discord_id),
+            ('find_characters_from_discord', FIND_CHARACTERS_FROM_DISCORD_QUERY, discord_id),
+            ('lookup_discord_id', LOOKUP_DISCORD_ID_QUERY, char_name),
+            ('count_ids', COUNT_IDS_QUERY, discord_id),
+            ('find_member', FIND_MEMBER_QUERY, discord_id),
+            ('find_all_mains', FIND_ALL_MAINS_QUERY, None),
+            ('get_all_characters', GET_ALL_CHARACTERS_QUERY, None),
+            ('get_all_char_names', GET_ALL_CHAR_NAMES_QUERY, None),
+            ('get_all_mob_names', GET_ALL_MOB_NAMES_QUERY, None),
+            ('get_all_zone_names', GET_ALL_ZONE_NAMES_QUERY, None),
+            ('get_mob_respawn', GET_MOB_RESPAWN_QUERY, mob_name),
+            ('get_mob_lockouts', GET_MOB_LOCKOUTS_QUERY, None),
+            ('get_zone_respawns', GET_ZONE_RESPAWNS_QUERY, {'zone_name': respawn['mob_zone']}),
+            ('get_mobs_up', GET_MOBS_UP_QUERY, {'now': now}),
+            ('load_roster (characters)', ROSTER_CHARACTERS_QUERY, None),
+            ('load_roster (members)', ROSTER_MEMBERS_QUERY, None),
+            ('load_respawns', GET_ALL_RESPAWNS_QUERY, None),
+            ('refresh_mirror (changes)', CHANGES_SINCE_QUERY, {'since': 0}),
+            ('refresh_mirror (prune)', PRUNE_CHANGES_QUERY, {'seq': 0}),
+            ('delete_character', DELETE_CHARACTER_QUERY, char_name),
+            ('delete_member', DELETE_MEMBER_QUERY, discord_id),
+            ('record_kill', self._database.sql['record_kill'], kill),
+            # update_mob_respawn and sync_mob_respawns send both, via lockout_steps
+            ('lockout_steps (lockout)', UPDATE_LOCKOUT_QUERY, lockout),
+            ('lockout_steps (recompute)', self._database.sql['recompute_respawn'], mob_name),
+        ]
+
+    def explain(self):
+        """
+        Print the query plan of every Database statement, marking
+        those that read a whole table
+        :return: list of method names whose plan reads a whole table
+        """
+        full_scans = []
+
+        for method, statement, params in self.explain_queries():
+            print(method)
+
+            # typed selects wrap the text clause holding the SQL
+            sql = getattr(statement, 'element', statement).text
+
+            for row in self._database.execute_read(self._backend.explain(sql), params):
+                line, full_scan = self._backend.describe_plan(row)
+                print(f"    {line}{'  <- full table scan' if full_scan else ''}")
+
+                if full_scan and method not in full_scans:
+                    full_scans.append(method)
+
+        return full_scans
+
+
+if __name__ == "__main__":
+    # python -m classes.migrations [status|upgrade|explain]
+    parser = argparse.ArgumentParser(description="Create, upgrade and inspect the sos_bot schema")
+    parser.add_argument('command', choices=['status', 'upgrade', 'explain'], nargs='?',
+                        default='status', help="what to do (default: status)")
+    arguments = parser.parse_args()
+
+    migrator = Migrator(Database())
+
+    if arguments.command == 'upgrade':
+        if len(migrator.upgrade()) == 0:
+            print("schema is up to date")
+    elif arguments.command == 'explain':
+        migrator.explain()
+    else:
+        print(f"schema version {migrator.current_version()} of {MIGRATIONS[-1][0]}")
+
+        for version, description, method in migrator.pending():
+            print(f"pending migration {version}: {description}")
@@ -0,0 +1,133 @@
+import discord
+
+# Discord rejects messages longer than this
+MESSAGE_LIMIT = 2000
+# wrapper added around every page
+CODE_FENCE = "```"
+# room kept free for the 'Page x/y' line
+PAGE_MARKER_ROOM = 20
+# seconds the page buttons keep working
+VIEW_TIMEOUT = 300
+
+
+class Paginator:
+    """
+    This class packs rendered table rows into as few code block
+    messages as fit under Discord's size limit, repeating the
+    header and footer on each page; only the page boundaries are
+    worked out up front, the text of a page is built when shown
+    """
+    def __init__(self, rows, header="", footer="", limit=MESSAGE_LIMIT):
+        self._rows = rows           # strings, each ending in a newline
+        self._header = header
+        self._footer = footer
+        # characters left for rows on each page
+        self._room = limit - len(header) - len(footer) - 2 * len(CODE_FENCE) - PAGE_MARKER_ROOM
+        self._bounds = self.split()
+
+    def split(self):
+        """
+        Find page boundaries, filling each page greedily; for
+        rows that must stay in order this gives the fewest pages
+        :return: list of (start, end) row index tuples
+        """
+        room = self._room
+        bounds = []
+        start = 0
+        used = 0
+
+        for position, row in enumerate(self._rows):
+            # a full page: close it and start the next with this row
+            if used + len(row) > room and position > start:
+                bounds.append((start, position))
+                start = position
+                used = 0
+
+            used += len(row)
+
+        if start < len(self._rows) or len(bounds) == 0:
+            bounds.append((start, len(self._rows)))
+
+        return bounds
+
+    @property
+    def page_count(self):
+        """
+        Number of pages
+        :return: int
+        """
+        return len(self._bounds)
+
+    def get_page(self, page):
+        """
+        Render one page as a code block message
+        :param page: int, zero based page number
+        :return: formatted string
+        """
+        start, end = self._bounds[page]
+        # a lone row too long for any page is cut to fit
+        body = "".join(row[:self._room] for row in self._rows[start:end])
+        marker = ""
+
+        if self.page_count > 1:
+            marker = f"\nPage {page + 1}/{self.page_count}"
+
+        return f"{CODE_FENCE}{self._header}{body}{self._footer}{marker}{CODE_FENCE}"
+
+    async def send(self, ctx, buttons=False, ephemeral=True):
+        """
+        Respond with every page as its own message, or with the
+        first page and buttons to move between pages
+        :param ctx: the application context of the bot
+        :param buttons: boolean, True for one message with navigation
+        :param ephemeral: boolean, whether only the user sees the reply
+        :return: none
+        """
+        if buttons and self.page_count > 1:
+            await ctx.respond(self.get_page(0), view=PageView(self), ephemeral=ephemeral)
+            return
+
+        # after the first response, ctx.respond sends followups
+        for page in range(self.page_count):
+            await ctx.respond(self.get_page(page), ephemeral=ephemeral)
+
+
+class PageView(discord.ui.View):
+    """
+    Previous / next buttons that swap the message to
+    another page of a Paginator
+    """
+    def __init__(self, paginator):
+        super().__init__(timeout=VIEW_TIMEOUT)
+        self._paginator = paginator
+        self._page = 0
+        self.update_buttons()
+
+    def update_buttons(self):
+        """
+        Disable the buttons that would move past either end
+        :return: none
+        """
+        self.previous_page.disabled = self._page == 0
+        self.next_page.disabled = self._page == self._paginator.page_count - 1
+
+    async def show(self, interaction, step):
+        """
+        Move by step pages and redraw the message
+        :param interaction: the button interaction
+        :param step: int, -1 or 1
+        :return: none
+        """
+        self._page += step
+        self.update_buttons()
+        await interaction.response.edit_message(
+            content=self._paginator.get_page(self._page), view=self
+        )
+
+    @discord.ui.button(label="Previous", style=discord.ButtonStyle.secondary)
+    async def previous_page(self, button, interaction):
+        await self.show(interaction, -1)
+
+    @discord.ui.button(label="Next", style=discord.ButtonStyle.secondary)
+    async def next_page(self, button, interaction):
+        await self.show(interaction, 1)
@@ -0,0 +1,54 @@
+import asyncio
+from os import environ
+
+# seconds between resyncs of the in-memory tables, 0 = never
+MIRROR_INTERVAL = int(environ.get('READ_MIRROR_INTERVAL', 60))
+
+
+class ReadMirror:
+    """
+    This class keeps the bot's in-memory copies of the characters,
+    members and respawns tables in step with the database, so reads
+    stay local while rows edited by other tools still show up; the
+    bot's own writes update the copies as they commit
+    """
+    def __init__(self, database, helper=None, interval=MIRROR_INTERVAL):
+        self._database = database
+        self._helper = helper       # rebuilds the combined names on roster changes
+        self._interval = interval
+        self._changed = 0           # rows that differed at the last resync
+
+    def is_enabled(self):
+        """
+        Check whether periodic resyncs are switched on
+        :return: boolean
+        """
+        return self._interval > 0
+
+    async def refresh(self):
+        """
+        Resync once now
+        :return: int, number of rows that differed
+        """
+        roster_version = self._database.roster_version
+        self._changed = await self._database.refresh_mirror()
+
+        # outside roster edits reach the combined name autocomplete too
+        if self._database.roster_version != roster_version and self._helper is not None \
+                and self._helper.combined_names.loaded:
+            self._helper.load_combined_names(await self._database.get_all_characters())
+
+        return self._changed
+
+    async def run_periodic(self):
+        """
+        Repeat the resync forever; meant to run as a task
+        :return: none
+        """
+        while True:
+            await asyncio.sleep(self._interval)
+
+            try:
+                await self.refresh()
+            except Exception as err:
+                print(f"read mirror refresh failed: {err}")
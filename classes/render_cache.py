@@ -0,0 +1,62 @@
+import threading
+from collections import OrderedDict
+
+# rendered tables kept; the least recently used are dropped first
+MAX_ENTRIES = 256
+
+
+class RenderCache:
+    """
+    This class keeps rendered tables, keyed by what was rendered
+    and the data it was rendered from; an entry can also carry a
+    time it stops being valid, e.g. when a listed mob comes up
+    """
+    def __init__(self, max_entries=MAX_ENTRIES):
+        self._lock = threading.Lock()
+        self._max_entries = max_entries
+        self._entries = OrderedDict()   # key -> (value, valid until or None)
+
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, now=None):
+        """
+        Look up a rendered value
+        :param key: hashable, entity and data version
+        :param now: aware datetime, needed for entries that expire
+        :return: the value, or None if missing or expired
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is None or (entry[1] is not None and now is not None and now >= entry[1]):
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+
+            return entry[0]
+
+    def put(self, key, value, valid_until=None):
+        """
+        Store a rendered value
+        :param key: hashable, entity and data version
+        :param value: the rendered value
+        :param valid_until: optional aware datetime the value expires at
+        :return: none
+        """
+        with self._lock:
+            self._entries[key] = (value, valid_until)
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """
+        Drop every entry
+        :return: none
+        """
+        with self._lock:
+            self._entries.clear()
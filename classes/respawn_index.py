@@ -0,0 +1,325 @@
+import heapq
+import threading
+import time
+from classes.times import as_utc, utc_now
+
+# columns returned by each read, as the matching query selects them
+RESPAWN_COLUMNS = ('mob_name', 'kill_time', 'respawn_time', 'time_zone')
+ZONE_COLUMNS = ('mob_name', 'mob_zone', 'kill_time', 'respawn_time', 'time_zone')
+LOCKOUT_COLUMNS = (
+    'mob_name', 'lockout_weeks', 'lockout_days', 'lockout_hours', 'lockout_minutes'
+)
+
+
+class RespawnIndex:
+    """
+    This class keeps a copy of the respawns table in memory,
+    with every mob's next respawn in a heap ordered by respawn
+    time, so respawn reads and upcoming spawns are answered
+    without touching the database; it is loaded once, updated
+    whenever a kill time changes and resynced now and then
+    """
+    def __init__(self, ttl=0):
+        self._lock = threading.RLock()
+        self._ttl = ttl             # seconds before a reload, 0 = never
+        self._mobs = {}             # lowercase mob name -> row dict, respawn_time parsed
+        self._heap = []             # (respawn time, sequence, lowercase mob name)
+        self._sequence = 0
+        self._loaded_at = None
+
+        # bumped on every change, so dependent caches know to rebuild
+        self.version = 0
+
+    def is_loaded(self):
+        """
+        Check whether the index holds data young enough to serve
+        :return: boolean
+        """
+        if self._loaded_at is None:
+            return False
+
+        return self._ttl <= 0 or time.monotonic() - self._loaded_at < self._ttl
+
+    def load(self, respawns):
+        """
+        Replace the index contents with fresh respawns rows
+        :param respawns: list of dict entries, one per respawns row
+        :return: none
+        """
+        with self._lock:
+            self._mobs = {}
+            self._heap = []
+
+            for row in respawns:
+                self._store(dict(row))
+
+            heapq.heapify(self._heap)
+            self._loaded_at = time.monotonic()
+            self.version += 1
+
+    def sync(self, respawns):
+        """
+        Bring the index in line with fresh respawns rows, touching
+        only the mobs that differ, so an unchanged table leaves the
+        version (and the caches built on it) alone
+        :param respawns: list of dict entries, one per respawns row
+        :return: int, number of mobs added, changed or removed
+        """
+        with self._lock:
+            if self._loaded_at is None:
+                self.load(respawns)
+                return len(respawns)
+
+            changed = 0
+            seen = set()
+
+            for row in respawns:
+                seen.add(row['mob_name'].lower())
+                current = self._mobs.get(row['mob_name'].lower())
+
+                if current is None or any(current.get(key) != value for key, value in row.items()):
+                    self._store(dict(row), push=True)
+                    changed += 1
+
+            # heap entries of removed mobs are skipped as stale
+            for key in [key for key in self._mobs if key not in seen]:
+                del self._mobs[key]
+                changed += 1
+
+            self._loaded_at = time.monotonic()
+
+            if changed > 0:
+                self.version += 1
+
+            return changed
+
+    def apply_changes(self, respawns, mob_names):
+        """
+        Bring the listed mobs in line with their fresh rows; a
+        listed mob without a row has been deleted. The rest of the
+        index is known current, so it is not due a reload either
+        :param respawns: list of dict entries, the rows of the listed mobs
+        :param mob_names: iterable of mob names changed in the database
+        :return: int, number of mobs added, changed or removed
+        """
+        with self._lock:
+            # nothing to patch; the first read loads the whole table
+            if self._loaded_at is None:
+                return 0
+
+            fresh = {row['mob_name'].lower(): row for row in respawns}
+            changed = 0
+
+            for key in {mob_name.lower() for mob_name in mob_names}:
+                row = fresh.get(key)
+                current = self._mobs.get(key)
+
+                if row is None:
+                    if current is not None:
+                        del self._mobs[key]
+                        changed += 1
+                elif current is None or any(current.get(key) != value for key, value in row.items()):
+                    self._store(dict(row), push=True)
+                    changed += 1
+
+            self._loaded_at = time.monotonic()
+
+            if changed > 0:
+                self.version += 1
+
+            return changed
+
+    def invalidate(self):
+        """
+        Forget the loaded data, forcing a reload on next read
+        :return: none
+        """
+        with self._lock:
+            self._loaded_at = None
+
+    ################# READ METHODS #################
+    def get_mob_names(self):
+        """
+        Every mob name
+        :return: list of strings
+        """
+        return [row['mob_name'] for row in list(self._mobs.values())]
+
+    def get_zone_names(self):
+        """
+        Every zone with at least one mob, once each
+        :return: list of strings
+        """
+        return list(dict.fromkeys(row['mob_zone'] for row in list(self._mobs.values())))
+
+    def get_mob_respawn(self, mob_name):
+        """
+        Kill and respawn data for one mob, matched without
+        regard to case as the database collation does
+        :param mob_name: string
+        :return: list of at most one dict
+        """
+        row = self._mobs.get(mob_name.lower())
+
+        return [] if row is None else [self._columns(row, RESPAWN_COLUMNS)]
+
+    def get_mob_lockouts(self):
+        """
+        Lockout time units of every mob
+        :return: list of dicts
+        """
+        return [self._columns(row, LOCKOUT_COLUMNS) for row in list(self._mobs.values())]
+
+    def get_zone_respawns(self, zone_name):
+        """
+        Every mob in a zone, matched without regard to case
+        :param zone_name: string
+        :return: list of dicts
+        """
+        return [
+            self._columns(row, ZONE_COLUMNS) for row in list(self._mobs.values())
+            if row['mob_zone'].lower() == zone_name.lower()
+        ]
+
+    def get_mobs_up(self, now=None):
+        """
+        Killed mobs whose respawn time has passed, soonest first
+        :param now: aware datetime to measure from, defaults to now
+        :return: list of dicts
+        """
+        if now is None:
+            now = utc_now()
+
+        rows = [
+            row for row in list(self._mobs.values())
+            if row['respawn_at'] is not None and row['respawn_at'] <= now
+        ]
+        rows.sort(key=lambda row: row['respawn_at'])
+
+        return [self._columns(row, ZONE_COLUMNS) for row in rows]
+
+    def update(self, mob_name, kill_time, respawn_time):
+        """
+        Record a new kill for one mob
+        :param mob_name: string
+        :param kill_time: datetime or string
+        :param respawn_time: datetime or string
+        :return: none
+        """
+        with self._lock:
+            row = self._mobs.get(mob_name.lower())
+
+            # not a tracked mob, nothing to index
+            if row is None:
+                return
+
+            row['kill_time'] = kill_time
+            row['respawn_time'] = respawn_time
+            self._store(row, push=True)
+            self.version += 1
+
+    def upcoming(self, count, within=None, now=None):
+        """
+        Find the next mobs to respawn, soonest first, walking
+        only the top of the heap: O(k log k) for k results
+        :param count: int, maximum number of mobs to return
+        :param within: optional timedelta; only spawns before now + within
+        :param now: aware datetime to measure from, defaults to now
+        :return: list of dicts, with the columns of a zone read
+        """
+        if now is None:
+            now = utc_now()
+
+        limit = None if within is None else now + within
+        results = []
+
+        with self._lock:
+            self._discard_spawned(now)
+
+            # the heap is a binary tree in a list; expand it from the
+            # root, always visiting the smallest frontier node next
+            frontier = [(self._heap[0], 0)] if len(self._heap) > 0 else []
+
+            while len(frontier) > 0 and len(results) < count:
+                entry, position = heapq.heappop(frontier)
+                respawn_time, sequence, key = entry
+
+                if limit is not None and respawn_time > limit:
+                    break
+
+                # skip entries superseded by a later kill
+                if self._is_current(entry):
+                    results.append(self.get(key))
+
+                for child in (2 * position + 1, 2 * position + 2):
+                    if child < len(self._heap):
+                        heapq.heappush(frontier, (self._heap[child], child))
+
+        return results
+
+    def get(self, mob_name):
+        """
+        Get one mob's respawn row, with the columns of a zone read
+        :param mob_name: string
+        :return: dict, or None if not tracked
+        """
+        row = self._mobs.get(mob_name.lower())
+
+        if row is None:
+            return None
+
+        return self._columns(row, ZONE_COLUMNS)
+
+    ################# UTILITY METHODS #################
+    @staticmethod
+    def _columns(row, columns):
+        """
+        Copy of a row holding just the given columns
+        :param row: respawns row dict
+        :param columns: tuple of column names
+        :return: dict
+        """
+        return {column: row.get(column) for column in columns}
+
+    def _store(self, row, push=False):
+        """
+        Index one row, adding a heap entry if it has a respawn time
+        :param row: respawns row dict
+        :param push: True to push onto an existing heap, False
+        when the heap will be heapified afterwards
+        :return: none
+        """
+        self._sequence += 1
+        row['respawn_at'] = as_utc(row['respawn_time'])
+        row['sequence'] = self._sequence
+        self._mobs[row['mob_name'].lower()] = row
+
+        if row['respawn_at'] is None:
+            return
+
+        entry = (row['respawn_at'], self._sequence, row['mob_name'].lower())
+
+        if push:
+            heapq.heappush(self._heap, entry)
+        else:
+            self._heap.append(entry)
+
+    def _is_current(self, entry):
+        """
+        Check a heap entry is still the mob's latest respawn
+        :return: boolean
+        """
+        row = self._mobs.get(entry[2])
+
+        return row is not None and row['sequence'] == entry[1]
+
+    def _discard_spawned(self, now):
+        """
+        Pop entries for mobs that have already respawned (and stale
+        entries above them); each is popped once, so this is cheap
+        :param now: datetime
+        :return: none
+        """
+        while len(self._heap) > 0 and (
+                self._heap[0][0] <= now or not self._is_current(self._heap[0])):
+            heapq.heappop(self._heap)
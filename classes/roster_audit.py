@@ -0,0 +1,139 @@
+import asyncio
+from datetime import datetime
+from os import environ
+
+# seconds between full audits of the roster
+AUDIT_INTERVAL = int(environ.get('ROSTER_AUDIT_INTERVAL', 6 * 60 * 60))
+
+
+class RosterAudit:
+    """
+    This class finds roster rows left behind by members who have
+    left the guild: characters and members rows whose discord id
+    is no longer a guild member; found with set operations, kept
+    current from member events, and removable in one transaction
+    """
+    # one set of findings shared by every instance, so the member
+    # events in main and the audit command see the same results
+    _characters = {}        # discord id -> list of character names
+    _members = set()        # discord ids in members but not the guild
+    _checked_at = None
+
+    def __init__(self, database, helper):
+        self._database = database
+        self._helper = helper
+
+    async def full_pass(self):
+        """
+        Compare the whole roster against the guild member index
+        :return: none
+        """
+        guild_ids = {str(member_id) for member_id in self._helper.member_index.get_ids()}
+
+        # an empty index means the guild has not loaded, not that
+        # everyone left; never flag the whole roster
+        if len(guild_ids) == 0:
+            return
+
+        characters = {}
+
+        for row in await self._database.get_all_characters():
+            discord_id = str(row['discord_id'])
+
+            if discord_id not in guild_ids:
+                characters.setdefault(discord_id, []).append(row['char_name'])
+
+        member_ids = {str(discord_id) for discord_id in await self._database.get_all_member_ids()}
+
+        RosterAudit._characters = characters
+        RosterAudit._members = member_ids - guild_ids
+        RosterAudit._checked_at = datetime.now()
+
+    async def member_left(self, discord_id):
+        """
+        Record the roster rows of a member who just left
+        :param discord_id: Discord ID number
+        :return: none
+        """
+        discord_id = str(discord_id)
+        char_names = await self._database.find_characters_from_discord(discord_id)
+
+        if len(char_names) > 0:
+            RosterAudit._characters[discord_id] = list(char_names)
+
+        if len(await self._database.find_member(discord_id)) > 0:
+            RosterAudit._members.add(discord_id)
+
+    def member_joined(self, discord_id):
+        """
+        A returning member's rows are no longer orphaned
+        :param discord_id: Discord ID number
+        :return: none
+        """
+        RosterAudit._characters.pop(str(discord_id), None)
+        RosterAudit._members.discard(str(discord_id))
+
+    async def cleanup(self):
+        """
+        Delete every orphaned row in a single transaction
+        :return: tuple of (list of deleted character names, int rows deleted)
+        """
+        char_names = [name for names in RosterAudit._characters.values() for name in names]
+        discord_ids = sorted(RosterAudit._members)
+
+        if len(char_names) == 0 and len(discord_ids) == 0:
+            return [], 0
+
+        deleted = await self._database.delete_roster_entries(char_names, discord_ids)
+
+        RosterAudit._characters = {}
+        RosterAudit._members = set()
+
+        return char_names, deleted
+
+    async def run_periodic(self):
+        """
+        Repeat the full audit forever; meant to run as a task
+        :return: none
+        """
+        while True:
+            try:
+                await self.full_pass()
+            except Exception as err:
+                print(f"roster audit failed: {err}")
+
+            await asyncio.sleep(AUDIT_INTERVAL)
+
+    def format_rows(self):
+        """
+        One table row per orphaned discord id
+        :return: list of row strings
+        """
+        row = "{:<20} {:<7} {}\n"
+        discord_ids = sorted(set(RosterAudit._characters) | RosterAudit._members)
+
+        return [
+            row.format(
+                discord_id,
+                "yes" if discord_id in RosterAudit._members else "no",
+                ", ".join(RosterAudit._characters.get(discord_id, []))
+            )
+            for discord_id in discord_ids
+        ]
+
+    def format_header(self):
+        """
+        Table heading, with when the last full audit ran
+        :return: formatted string
+        """
+        checked = "never"
+
+        if RosterAudit._checked_at is not None:
+            checked = f"{RosterAudit._checked_at:%Y-%m-%d %H:%M:%S}"
+
+        return (
+            f"Roster rows for members no longer in the guild\n"
+            f"Last full audit: {checked}\n\n"
+            f"{'Discord ID':<20} {'Member':<7} Characters\n"
+            + "-" * 60 + "\n"
+        )
@@ -0,0 +1,378 @@
+import threading
+import time
+
+
+class RosterCache:
+    """
+    This class holds an in-memory copy of the characters and
+    members tables; it is loaded once, answers the roster read
+    queries, is updated write-through after each successful
+    roster write, and resynced now and then for outside edits
+    """
+    def __init__(self, ttl=0):
+        self._lock = threading.RLock()
+        self._ttl = ttl             # seconds before a reload, 0 = never
+        self._characters = {}       # lowercase char name -> row dict
+        self._by_owner = {}         # discord id, as string -> set of lowercase char names
+        self._members = set()       # discord ids, as strings
+        self._char_names = []       # char names, sorted case insensitively
+        self._loaded_at = None
+
+        # bumped on every change, so dependent indexes know to rebuild
+        self.version = 0
+
+    def is_loaded(self):
+        """
+        Check whether the cache holds data young enough to serve
+        :return: boolean
+        """
+        if self._loaded_at is None:
+            return False
+
+        return self._ttl <= 0 or time.monotonic() - self._loaded_at < self._ttl
+
+    def load(self, characters, members):
+        """
+        Replace the cache contents with fresh table rows
+        :param characters: list of dict entries, one per characters row
+        :param members: list of dict entries, one per members row
+        :return: none
+        """
+        with self._lock:
+            self._characters = {row['char_name'].lower(): dict(row) for row in characters}
+            self._members = {str(row['discord_id']) for row in members}
+            self._reindex()
+            self._loaded_at = time.monotonic()
+
+    def sync(self, characters, members):
+        """
+        Bring the cache in line with fresh table rows; when nothing
+        differs the version is left alone, so the indexes built on
+        the roster are not rebuilt
+        :param characters: list of dict entries, one per characters row
+        :param members: list of dict entries, one per members row
+        :return: int, number of rows added, changed or removed
+        """
+        with self._lock:
+            if self._loaded_at is None:
+                self.load(characters, members)
+                return len(characters) + len(members)
+
+            fresh = {row['char_name'].lower(): dict(row) for row in characters}
+            fresh_members = {str(row['discord_id']) for row in members}
+
+            changed = len(fresh.keys() ^ self._characters.keys())
+            changed += sum(
+                1 for key, row in fresh.items()
+                if key in self._characters and self._characters[key] != row
+            )
+            changed += len(fresh_members ^ self._members)
+
+            if changed > 0:
+                self._characters = fresh
+                self._members = fresh_members
+                self._reindex()
+
+            self._loaded_at = time.monotonic()
+
+            return changed
+
+    def apply_changes(self, characters, members, char_names, discord_ids):
+        """
+        Bring the listed characters and members in line with their
+        fresh rows; a listed key without a row has been deleted
+        :param characters: list of dict entries, the rows of the listed characters
+        :param members: list of dict entries, the rows of the listed members
+        :param char_names: iterable of char names changed in the database
+        :param discord_ids: iterable of member discord ids changed in the database
+        :return: int, number of rows added, changed or removed
+        """
+        with self._lock:
+            # nothing to patch; the first read loads both tables
+            if self._loaded_at is None:
+                return 0
+
+            fresh = {row['char_name'].lower(): dict(row) for row in characters}
+            fresh_members = {str(row['discord_id']) for row in members}
+            changed = 0
+
+            for key in {name.lower() for name in char_names}:
+                row = fresh.get(key)
+
+                if row is None:
+                    if self._characters.pop(key, None) is not None:
+                        changed += 1
+                elif self._characters.get(key) != row:
+                    self._characters[key] = row
+                    changed += 1
+
+            for discord_id in {str(discord_id) for discord_id in discord_ids}:
+                if discord_id in fresh_members and discord_id not in self._members:
+                    self._members.add(discord_id)
+                    changed += 1
+                elif discord_id not in fresh_members and discord_id in self._members:
+                    self._members.discard(discord_id)
+                    changed += 1
+
+            if changed > 0:
+                self._reindex()
+
+            self._loaded_at = time.monotonic()
+
+            return changed
+
+    def invalidate(self):
+        """
+        Forget the cached data, forcing a reload on next read
+        :return: none
+        """
+        with self._lock:
+            self._loaded_at = None
+
+    ################# READ METHODS #################
+    def get_discord_ids(self):
+        """
+        Mains, ordered by name
+        :return: list of dicts with discord_id and char_name
+        """
+        return [
+            {'discord_id': row['discord_id'], 'char_name': row['char_name']}
+            for row in self._sorted_rows() if row['char_type'] == 'Main'
+        ]
+
+    def lookup_characters(self, char_name):
+        """
+        Every character sharing an owner with char_name,
+        mains first
+        :param char_name: string
+        :return: list of character dicts
+        """
+        owner = self._characters.get(char_name.lower())
+
+        if owner is None:
+            return []
+
+        characters = self._owned_rows(owner['discord_id'])
+        characters.sort(key=lambda row: (row['char_priority'], row['char_name'].lower()))
+
+        return [
+            {
+                'char_name': row['char_name'],
+                'char_race': row['char_race'],
+                'char_class': row['char_class'],
+                'char_type': row['char_type'],
+                'char_priority': row['char_priority']
+            }
+            for row in characters
+        ]
+
+    def lookup_profile(self, char_name):
+        """
+        Every character sharing an owner with char_name, mains
+        first, each with the owner's discord id
+        :param char_name: string
+        :return: list of character dicts
+        """
+        owner = self._characters.get(char_name.lower())
+
+        if owner is None:
+            return []
+
+        characters = self.lookup_characters(char_name)
+
+        for row in characters:
+            row['discord_id'] = owner['discord_id']
+
+        return characters
+
+    def find_main_from_discord(self, discord_id):
+        """
+        Main character(s) for a discord id
+        :param discord_id: Discord ID number
+        :return: list of dicts with char_name
+        """
+        return [
+            {'char_name': row['char_name']}
+            for row in self._owned_rows(discord_id) if row['char_type'] == 'Main'
+        ]
+
+    def find_characters_from_discord(self, discord_id):
+        """
+        Names of every character owned by a discord id
+        :param discord_id: Discord ID number
+        :return: list of strings
+        """
+        return [row['char_name'] for row in self._owned_rows(discord_id)]
+
+    def lookup_discord_id(self, char_name):
+        """
+        Owner of a character
+        :param char_name: string
+        :return: list of at most one dict with discord_id
+        """
+        row = self._characters.get(char_name.lower())
+
+        if row is None:
+            return []
+
+        return [{'discord_id': row['discord_id']}]
+
+    def count_ids(self, discord_id):
+        """
+        One entry per character owned by a discord id
+        :param discord_id: Discord ID number
+        :return: list of dicts with discord_id
+        """
+        return [{'discord_id': row['discord_id']} for row in self._owned_rows(discord_id)]
+
+    def find_member(self, discord_id):
+        """
+        Members table match for a discord id
+        :param discord_id: Discord ID number
+        :return: list of at most one dict with discord_id
+        """
+        if str(discord_id) not in self._members:
+            return []
+
+        return [{'discord_id': str(discord_id)}]
+
+    def get_all_member_ids(self):
+        """
+        Every discord id in the members table
+        :return: list of strings
+        """
+        return list(self._members)
+
+    def find_all_mains(self):
+        """
+        Names of all mains, ordered by name
+        :return: list of strings
+        """
+        return [row['char_name'] for row in self._sorted_rows() if row['char_type'] == 'Main']
+
+    def get_all_characters(self):
+        """
+        Discord id and name of every character
+        :return: list of dicts with discord_id and char_name
+        """
+        return [
+            {'discord_id': row['discord_id'], 'char_name': row['char_name']}
+            for row in self._characters.values()
+        ]
+
+    def get_all_char_names(self):
+        """
+        Every character name, sorted case insensitively;
+        the list is shared, so callers must not modify it
+        :return: list of strings
+        """
+        return self._char_names
+
+    ################# UPDATE METHODS #################
+    def add_character(self, discord_id, char_name, char_race, char_class, char_type, char_priority):
+        """
+        Record an inserted character
+        :parameters: the details of the new character
+        :return: none
+        """
+        with self._lock:
+            self._characters[char_name.lower()] = {
+                'discord_id': discord_id,
+                'char_name': char_name,
+                'char_race': char_race,
+                'char_class': char_class,
+                'char_type': char_type,
+                'char_priority': char_priority
+            }
+            self._reindex()
+
+    def update_character(self, char_name, changes):
+        """
+        Apply the columns written by an UPDATE to one character
+        :param char_name: string, the name before the update
+        :param changes: dictionary of column name -> new value
+        :return: none
+        """
+        with self._lock:
+            row = self._characters.pop(char_name.lower(), None)
+
+            if row is None:
+                # the row was not cached, so the cache is out of step
+                self._loaded_at = None
+                return
+
+            row.update(changes)
+            self._characters[row['char_name'].lower()] = row
+            self._reindex()
+
+    def remove_character(self, char_name):
+        """
+        Forget a deleted character
+        :param char_name: string
+        :return: none
+        """
+        with self._lock:
+            self._characters.pop(char_name.lower(), None)
+            self._reindex()
+
+    def add_member(self, discord_id):
+        """
+        Record an inserted members row
+        :param discord_id: Discord ID number
+        :return: none
+        """
+        with self._lock:
+            self._members.add(str(discord_id))
+            self.version += 1
+
+    def remove_member(self, discord_id):
+        """
+        Forget a deleted members row
+        :param discord_id: Discord ID number
+        :return: none
+        """
+        with self._lock:
+            self._members.discard(str(discord_id))
+            self.version += 1
+
+    ################# UTILITY METHODS #################
+    def _sorted_rows(self):
+        """
+        Character rows ordered by name, as ORDER BY char_name would
+        on the case-insensitive column
+        :return: list of row dicts
+        """
+        characters = self._characters
+
+        # a write may land between the two reads; skip what it removed
+        return [
+            characters[char_name.lower()] for char_name in self._char_names
+            if char_name.lower() in characters
+        ]
+
+    def _owned_rows(self, discord_id):
+        """
+        Character rows owned by a discord id, in no set order
+        :param discord_id: Discord ID number
+        :return: list of row dicts
+        """
+        characters = self._characters
+
+        return [characters[key] for key in self._by_owner.get(str(discord_id), ()) if key in characters]
+
+    def _reindex(self):
+        """
+        Rebuild the sorted name list and the owner index, and mark
+        a change
+        :return: none
+        """
+        self._char_names = sorted(
+            (row['char_name'] for row in self._characters.values()), key=str.lower
+        )
+        by_owner = {}
+
+        for key, row in self._characters.items():
+            by_owner.setdefault(str(row['discord_id']), set()).add(key)
+
+        self._by_owner = by_owner
+        self.version += 1
@@ -0,0 +1,41 @@
+import asyncio
+
+
+class SingleFlight:
+    """
+    This class coalesces concurrent identical requests: the first
+    caller for a key runs the work, and callers arriving while it
+    is in flight await the same result instead of repeating it
+    """
+    def __init__(self):
+        self._flights = {}      # key -> asyncio.Future of the running call
+
+        self.shared = 0         # calls answered by another call's work
+
+    async def do(self, key, work):
+        """
+        Run work once per key at a time
+        :param key: hashable, identifies identical requests
+        :param work: callable returning an awaitable
+        :return: the awaitable's result; shared callers get the
+        same object, so it must not be modified
+        """
+        flight = self._flights.get(key)
+
+        if flight is not None:
+            self.shared += 1
+            # shield, so one caller being cancelled does not
+            # cancel the work for everyone else
+            return await asyncio.shield(flight)
+
+        flight = asyncio.ensure_future(work())
+        self._flights[key] = flight
+
+        try:
+            return await asyncio.shield(flight)
+        finally:
+            # the next call after this one finishes starts fresh
+            if flight.done():
+                self._flights.pop(key, None)
+            else:
+                flight.add_done_callback(lambda done: self._flights.pop(key, None))
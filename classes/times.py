@@ -0,0 +1,76 @@
+from datetime import datetime, timezone
+from os import environ
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+# kill and respawn times are stored in the database as UTC DATETIMEs
+# and shown to users in this zone (an IANA name, e.g. America/New_York)
+DISPLAY_TIME_ZONE = environ.get('DISPLAY_TIME_ZONE', 'UTC')
+# format of legacy text timestamps and of displayed times
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def get_display_zone():
+    """
+    Resolve the zone times are displayed in, falling back to UTC
+    :return: tzinfo
+    """
+    return get_zone(DISPLAY_TIME_ZONE)
+
+
+def get_zone(name):
+    """
+    Resolve an IANA zone name, falling back to UTC
+    :param name: string, e.g. America/Chicago
+    :return: tzinfo
+    """
+    try:
+        return ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError):
+        return timezone.utc
+
+
+def as_utc(value):
+    """
+    Normalise a database time to an aware UTC datetime; naive
+    values from the driver are UTC, text is a legacy value
+    :param value: datetime, string or None
+    :return: aware datetime, or None
+    """
+    if value is None:
+        return None
+
+    if not isinstance(value, datetime):
+        # ISO text also covers SQLite's stored form, with microseconds
+        value = datetime.fromisoformat(str(value))
+
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+
+    return value.astimezone(timezone.utc)
+
+
+def to_database(value):
+    """
+    Convert an aware datetime to the naive UTC value stored
+    in a DATETIME column
+    :param value: aware datetime (naive values are taken as UTC)
+    :return: naive datetime
+    """
+    return as_utc(value).replace(tzinfo=None)
+
+
+def utc_now():
+    """
+    The current time, as an aware UTC datetime
+    :return: datetime
+    """
+    return datetime.now(timezone.utc)
+
+
+def format_time(value):
+    """
+    Render a database time in the display zone
+    :param value: datetime or string
+    :return: formatted string
+    """
+    return as_utc(value).astimezone(get_display_zone()).strftime(TIME_FORMAT)
@@ -1,8 +1,17 @@
-import time
-from datetime import datetime, timedelta
+import re
+import html
 from classes.database import Database
+from classes.metrics import timed
 import requests
 
+PQDI_URL = "https://www.pqdi.cc/instances"
+PQDI_TIMEOUT = 30
+
+# text following a Respawn Time label, up to the next html tag
+RESPAWN_PATTERN = r"Respawn Time:?\s*(?P<respawn>[^<]*)"
+# one unit of a respawn time, e.g. '3 days' or '12 hours'
+DURATION_PATTERN = re.compile(r"(\d+)\s*(week|day|hour|minute)s?", re.IGNORECASE)
+
 
 class Tracker:
     """
@@ -14,82 +23,147 @@ class Tracker:
         self._database = Database()
         # log file path to track
 
+    @timed('scrape')
+    def fetch_instances_page(self):
+        """
+        download the instances page from the Quarm database;
+        entities are decoded so names containing apostrophes
+        match their database spelling
+        :return: string, the page text
+        """
+        page = requests.get(PQDI_URL, verify=False, timeout=PQDI_TIMEOUT)
+        page.raise_for_status()
+
+        return html.unescape(page.text)
+
+    def build_respawn_index(self, page_html, mob_list):
+        """
+        parse the instances page in a single pass, pairing each
+        mob's first appearance with the next Respawn Time entry
+        :param page_html: string, the instances page text
+        :param mob_list: list of mob names
+        :return: dictionary of mob name -> respawn dictionary
+        """
+        respawn_index = {}
+        names = sorted(set(mob_list), key=len, reverse=True)
+
+        if len(names) == 0:
+            return respawn_index
+
+        # longest names first, so a name that is a prefix of
+        # another cannot shadow it in the alternation
+        pattern = re.compile(
+            "(?P<mob>" + "|".join(re.escape(name) for name in names) + ")"
+            "|" + RESPAWN_PATTERN
+        )
+
+        # mobs seen since the last Respawn Time entry
+        pending = []
+
+        for match in pattern.finditer(page_html):
+            mob = match.group('mob')
+
+            if mob is not None:
+                if mob not in respawn_index and mob not in pending:
+                    pending.append(mob)
+            else:
+                respawn_dict = self.parse_respawn(match.group('respawn'))
+
+                for pending_mob in pending:
+                    respawn_index[pending_mob] = respawn_dict
+
+                pending = []
+
+        return respawn_index
+
+    def parse_respawn(self, respawn_time):
+        """
+        convert respawn text such as '1 week 3 days 12 hours'
+        into a dictionary of ints, one key per unit of time
+        :param respawn_time: string of time data
+        :return: dictionary of int values; missing units are 0
+        """
+        respawn_dict = {'weeks': 0, 'days': 0, 'hours': 0, 'minutes': 0}
+
+        for amount, unit in DURATION_PATTERN.findall(respawn_time):
+            respawn_dict[unit.lower() + 's'] = int(amount)
+
+        return respawn_dict
+
+    def scrape_respawns(self, mob_list):
+        """
+        perform a single scrape of the Quarm database and
+        resolve respawn time units for every mob in the list
+        :param mob_list: list of mob names
+        :return: dictionary of mob name -> respawn dictionary
+        """
+        return self.build_respawn_index(self.fetch_instances_page(), mob_list)
+
     def scrape_respawn(self, mob):
         """
         perform a scrape of HTML source code from Quarm
         database to update mob respawn time units
-        :param mob:
-        :return:
-        """
-        respawn_dict = {}
-
-        # get the html source from pqdi
-        url = "https://www.pqdi.cc/instances"
-        page = requests.get(url, verify=False)
-        html = page.text
-
-        # search for the mob name given as a parameter
-        start = html.find(mob)
-        # find the next occurrence of Respawn Time, this should
-        # be the entry for the current mob
-        respawn_flag = html.find('Respawn Time', start)
-        # look for the next html tag opener, this should be the next line
-        next_line_flag = html.find('<', respawn_flag)
-        # slice out the text containing just the respawn data
-        respawn_time = html[respawn_flag + 13:next_line_flag - 1].strip()
-
-        # set up dictionary with ints for time units
-        # parsed out of the respawn time found above
-        respawn_dict['weeks'] = self.get_parsed_int(respawn_time, 'week')
-        respawn_dict['days'] = self.get_parsed_int(respawn_time, 'day')
-        respawn_dict['hours'] = self.get_parsed_int(respawn_time, 'hour')
-        respawn_dict['minutes'] = self.get_parsed_int(respawn_time, 'minute')
-
-        return respawn_dict
+        :param mob: string
+        :return: respawn dictionary, or None if mob not found
+        """
+        return self.scrape_respawns([mob]).get(mob)
 
-    def get_parsed_int(self, respawn, time_type):
+    @timed('scrape', 'respawn_sync')
+    def update_respawn_times(self, mob_list=None, progress=None, cancel=None):
         """
-        helper method to parse the integers for the time
-        units needed by the scrape method
-        :param respawn: string of time data
-        :param time_type: the time unit to locate
-        :return: int, the time unit found
+        interface method between scrape_respawns and database sync_mob_respawns;
+        blocking, so callers on the event loop should run it in a worker thread
+        :param mob_list: list of mob names; defaults to every mob in the database
+        :param progress: optional callable taking a status string
+        :param cancel: optional threading.Event; when set, the sync
+        stops before its next stage
+        :return: dictionary summarising changed, unchanged and missing
+        mobs, or None if the sync was cancelled
         """
-        # set start index based on time type
-        starting_point = respawn.find(time_type)
+        if mob_list is None:
+            mob_list = self._database.get_all_mob_names()
 
-        # logic to handle single vs double-digit entries
-        # weeks and days will be a max of 1 digit, hours
-        # and days could be two
-        if time_type == 'week' or time_type == 'day':
-            first_point = 2
-        else:
-            first_point = 3
-
-        # if the time unit was found, slice out just the int
-        # from the string
-        if starting_point != -1:
-            parsed_int = respawn[respawn.find(time_type) - first_point:
-                                 respawn.find(time_type) - 1]
-        # otherwise, return 0
-        else:
-            parsed_int = 0
+        self.report_progress(progress, "Downloading pqdi instances page...")
+        page_html = self.fetch_instances_page()
+
+        if cancel is not None and cancel.is_set():
+            return None
+
+        # index the page once for the whole list
+        self.report_progress(progress, f"Matching {len(mob_list)} mobs against pqdi...")
+        respawn_index = self.build_respawn_index(page_html, mob_list)
+
+        # mobs in our database that pqdi does not list
+        not_found = [mob for mob in mob_list if mob not in respawn_index]
 
-        return parsed_int
+        if cancel is not None and cancel.is_set():
+            return None
 
-    def update_respawn_times(self, mob_list):
+        # write only the lockouts that actually changed
+        self.report_progress(progress, f"Writing lockouts for {len(respawn_index)} mobs...")
+        summary = self._database.sync_mob_respawns(respawn_index)
+        summary['not_found'] = not_found
+
+        self.report_progress(
+            progress,
+            f"{len(summary['changed'])} changed, {summary['unchanged']} unchanged, "
+            f"{len(not_found)} not found on pqdi"
+        )
+
+        return summary
+
+    def report_progress(self, progress, message):
         """
-        interface method between scrape_respawn and database update_mob_respawn
-        :param mob_list: list of mob names
+        pass a status message to the progress callback,
+        or print it to console if there is none
+        :param progress: callable taking a string, or None
+        :param message: string
         :return: none
         """
-        # loop through mob list, scrape respawn data for current mob
-        # and update database with scraped time units
-        for mob in mob_list:
-            current_respawn = self.scrape_respawn(mob)
-            self._database.update_mob_respawn(mob, current_respawn)
-            # print to console, to act as a progress bar
-            print(f"{mob}: {current_respawn}")
+        if progress is None:
+            print(message)
+        else:
+            progress(message)
 
     def get_mob_respawn(self, mob_name):
         """
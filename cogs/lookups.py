@@ -1,11 +1,14 @@
 import os
 import discord
+from datetime import timedelta
 from dotenv import load_dotenv
 from discord.ext import commands
 
-from classes.database import Database
+from classes.async_database import AsyncDatabase
 from classes.tracker import Tracker
 from classes.helpers import Helpers
+from classes.paginator import Paginator
+from classes.metrics import Metrics, timed
 
 
 class Lookups(commands.Cog):
@@ -23,6 +26,7 @@ class Lookups(commands.Cog):
         self._mob_list = []
         self._zone_list = []
 
+    @timed('autocomplete')
     def discord_name_autocompletion(
             self,
             ctx: discord.AutocompleteContext
@@ -36,9 +40,12 @@ class Lookups(commands.Cog):
 
         self._discord_list = self._helper.get_all_discord_names('name')
 
-        return [choice for choice in self._discord_list if current_value.lower() in choice.lower()]
+        return self._helper.autocomplete(
+            'discord_name', self._discord_list, current_value, self._helper.member_index.version
+        )
 
-    def combined_name_autocompletion(
+    @timed('autocomplete')
+    async def combined_name_autocompletion(
             self,
             ctx: discord.AutocompleteContext
     ):
@@ -49,12 +56,18 @@ class Lookups(commands.Cog):
         """
         current_value = ctx.value
 
-        self._name_list = self._helper.get_combined_names(self._database.get_all_characters())
-        self._name_list.sort()
+        # joined once, then kept current by the update commands
+        if not self._helper.combined_names.loaded:
+            self._helper.load_combined_names(await self._database.get_all_characters())
+
+        self._name_list = self._helper.combined_names.get_names()
 
-        return [choice for choice in self._name_list if current_value.lower() in choice.lower()]
+        return self._helper.autocomplete(
+            'combined_name', self._name_list, current_value, self._helper.combined_names.version
+        )
 
-    def mob_list_autocompletion(
+    @timed('autocomplete')
+    async def mob_list_autocompletion(
             self,
             ctx: discord.AutocompleteContext
     ):
@@ -66,11 +79,12 @@ class Lookups(commands.Cog):
         current_value = ctx.value
 
         if len(self._mob_list) == 0:
-            self._mob_list = self._database.get_all_mob_names()
+            self._mob_list = await self._database.get_all_mob_names()
 
-        return [choice for choice in self._mob_list if current_value.lower() in choice.lower()]
+        return self._helper.autocomplete('mob_name', self._mob_list, current_value)
 
-    def zone_list_autocompletion(
+    @timed('autocomplete')
+    async def zone_list_autocompletion(
             self,
             ctx: discord.AutocompleteContext
     ):
@@ -82,14 +96,15 @@ class Lookups(commands.Cog):
         current_value = ctx.value
 
         if len(self._zone_list) == 0:
-            self._zone_list = self._database.get_all_zone_names()
+            self._zone_list = await self._database.get_all_zone_names()
 
-        return [choice for choice in self._zone_list if current_value.lower() in choice.lower()]
+        return self._helper.autocomplete('zone_name', self._zone_list, current_value)
 
     @discord.slash_command(name="lookup_characters",
                            description="Find a user's characters by their EQ name, "
                                        "Discord user name, or Discord display name",
                            )
+    @timed('command')
     async def lookup_characters(
             self,
             ctx: discord.ApplicationContext,
@@ -122,12 +137,14 @@ class Lookups(commands.Cog):
         bracket = member_name.find(']')
         user_choice = member_name[2:bracket - 1]
 
-        # get the list of chars from database
-        results = self._database.lookup_characters(user_choice)
-        # get discord name that matches discord id from database
-        discord_name = self._helper.get_discord_name(
-            self._database.lookup_discord_id(user_choice)
-        )
+        # taken before the read, so a table is never cached under
+        # a version newer than its rows
+        version = self._database.cache_version('roster')
+        # get the list of chars, each carrying the owner's
+        # discord id, from database in a single query
+        results = await self._database.lookup_profile(user_choice)
+        # get discord name that matches discord id
+        discord_name = self._helper.get_discord_name(results[:1])
 
         # if no matches found, notify user then exit
         if len(results) == 0:
@@ -142,7 +159,7 @@ class Lookups(commands.Cog):
         # then print table of character results
         await ctx.respond(
             f"```List of characters for: {discord_name}\n"
-            f"\n{self._helper.format_char_message(results)}```",
+            f"\n{self._helper.format_char_message(results, user_choice, version)}```",
             ephemeral=True
         )
 
@@ -150,6 +167,7 @@ class Lookups(commands.Cog):
         name="find_main_from_discord",
         description="Find a user's main character"
     )
+    @timed('command')
     async def find_main_from_discord(
             self,
             ctx: discord.ApplicationContext,
@@ -187,7 +205,7 @@ class Lookups(commands.Cog):
             )
             return
 
-        results = self._database.find_main_from_discord(discord_id)
+        results = await self._database.find_main_from_discord(discord_id)
 
         # if results > 0, match was found
         if len(results) > 0:
@@ -205,6 +223,7 @@ class Lookups(commands.Cog):
         name="find_all_mains",
         description="Get a list of all mains"
     )
+    @timed('command')
     async def find_all_mains(
             self,
             ctx: discord.ApplicationContext
@@ -225,24 +244,23 @@ class Lookups(commands.Cog):
 
         self._helper.log_activity(ctx.author, ctx.command, ctx.selected_options)
 
-        results = self._database.find_all_mains()
-        main_list = f"Main characters in Seekers Of Souls...\n"
+        results = await self._database.find_all_mains()
 
-        # print one character per line
-        for result in results:
-            main_list = main_list + f"{result}\n"
-
-        main_list = main_list + f"Total count of mains: {len(results)}"
-
-        await ctx.respond(
-            f"```{main_list}```",
-            ephemeral=True
+        # print one character per line, paged with buttons
+        # once the roster outgrows a single message
+        paginator = Paginator(
+            [f"{result}\n" for result in results],
+            header="Main characters in Seekers Of Souls...\n",
+            footer=f"Total count of mains: {len(results)}"
         )
 
+        await paginator.send(ctx, buttons=True)
+
     @discord.slash_command(
         name="get_mob_respawn",
         description="Get the kill time and respawn for a mob"
     )
+    @timed('command')
     async def get_mob_respawn(
             self,
             ctx: discord.ApplicationContext,
@@ -270,7 +288,8 @@ class Lookups(commands.Cog):
         self._helper.log_activity(ctx.author, ctx.command, ctx.selected_options)
 
         # get mob fields from database using selected mob
-        mob_data = self._tracker.get_mob_respawn(mob_name)
+        version = self._database.cache_version('respawns')
+        mob_data = await self._database.get_mob_respawn(mob_name)
 
         # if no match found in database, inform user and exit
         if len(mob_data) == 0:
@@ -282,7 +301,7 @@ class Lookups(commands.Cog):
 
         # if match is found display results to user
         await ctx.respond(
-            f"```{self._helper.format_mob_message(mob_data, "mob")}```",
+            f"```{self._helper.format_mob_message(mob_data, "mob", mob_name, version)}```",
             ephemeral=True
         )
 
@@ -290,6 +309,7 @@ class Lookups(commands.Cog):
         name="get_zone_respawns",
         description="Get the kill time and respawn for all mobs in a zone"
     )
+    @timed('command')
     async def get_zone_respawns(
             self,
             ctx: discord.ApplicationContext,
@@ -317,52 +337,119 @@ class Lookups(commands.Cog):
         self._helper.log_activity(ctx.author, ctx.command, ctx.selected_options)
 
         # get mob fields from database using selected mob
-        zone_data = self._tracker.get_zone_respawns(zone_name)
-
-        # an ugly bit of additional logic to break up messages longer than 2k
-        # characters because of a Discord limitation on message size
-        # send up to 20 mobs in a single message; anything over 20 send
-        # as an additional ctx response (so far the only zone that
-        # exceeds this limit is Temple of Veeshan
-        if (len(zone_data)) > 20:
-            # set up two mob lists
-            mob_list_one = []
-            mob_list_two = []
-            # start a counter
-            count = 0
-
-            for mob_data in zone_data:
-                # add to mob list one while counter is < 20
-                if count < 20:
-                    mob_list_one.append(mob_data)
-                    count += 1
-                # add to mob list two while counter is >= 20
-                else:
-                    mob_list_two.append(mob_data)
-                    count += 1
-
-            # format first mob list for ctx respond
-            message = self._helper.format_mob_message(mob_list_one, "zone")
-
-            # send to Discord
+        version = self._database.cache_version('respawns')
+        zone_data = await self._database.get_zone_respawns(zone_name)
+
+        if len(zone_data) == 0:
             await ctx.respond(
-                f"```{message}```",
+                f"```No entries in database for {zone_name}```",
                 ephemeral=True
             )
+            return
 
-            # format second mob list for ctx respond
-            message = self._helper.format_mob_message(mob_list_two, "zone")
-        # if < 20 mobs in zone, just process normally
-        else:
-            message = self._helper.format_mob_message(zone_data, "zone")
+        # Discord caps messages at 2000 characters, so big zones
+        # (e.g. Temple of Veeshan) are packed into as few
+        # messages as fit, each with the table header
+        header, rows, footer = self._helper.format_mob_table(zone_data, "zone", zone_name, version)
+
+        await Paginator(rows, header, footer).send(ctx)
+
+    @discord.slash_command(
+        name="upcoming_spawns",
+        description="Get the next mobs to respawn across all zones"
+    )
+    @timed('command')
+    async def upcoming_spawns(
+            self,
+            ctx: discord.ApplicationContext,
+            count: discord.Option(
+                int,
+                description='How many mobs to show',
+                min_value=1,
+                max_value=20,
+                default=10
+            ),
+            hours: discord.Option(
+                int,
+                description='Only show mobs respawning within this many hours',
+                min_value=1,
+                required=False
+            )
+    ):
+        """
+        get the soonest upcoming respawns from the in-memory respawn index
+        :param ctx: the application context of the bot
+        :param count: int, number of mobs to show (optional)
+        :param hours: int, time window to look in (optional)
+        :return: none
+        """
+        # this slash command available to all members
+        target_role = discord.utils.get(ctx.guild.roles, name="Seeker")
+
+        # if validate_role returns false, user is not authorized,
+        # so exit function
+        if not self._helper.validate_role(ctx.author.roles, target_role):
+            await self.not_authorized(ctx)
+            return
+
+        self._helper.log_activity(ctx.author, ctx.command, ctx.selected_options)
+
+        within = None if hours is None else timedelta(hours=hours)
+        results = await self._database.get_upcoming_spawns(count, within)
+
+        # nothing pending, everything is up
+        if len(results) == 0:
+            window = "" if hours is None else f" in the next {hours} hours"
+            await ctx.respond(
+                f"```No mobs are due to respawn{window}.```",
+                ephemeral=True
+            )
+            return
 
-        # print either mob_list_two or zone_data, depending
-        # on whether above logic was triggered
         await ctx.respond(
-            f"```{message}```",
+            f"```Upcoming spawns\n\n{self._helper.format_upcoming_message(results)}```",
             ephemeral=True
         )
 
+    @discord.slash_command(
+        name="bot_stats",
+        description="Show how long the bot's commands and queries take"
+    )
+    @timed('command', 'bot_stats')
+    async def show_bot_stats(
+            self,
+            ctx: discord.ApplicationContext
+    ):
+        """
+        show call counts, latency percentiles and errors for every
+        command, autocomplete, query and scrape since startup
+        :param ctx: the application context of the bot
+        :return: none
+        """
+        # this slash command only available to officers
+        target_role = discord.utils.get(ctx.guild.roles, name="Officer")
+
+        # if validate_role returns false, user is not authorized,
+        # so exit function
+        if not self._helper.validate_role(ctx.author.roles, target_role):
+            await self.not_authorized(ctx)
+            return
+
+        self._helper.log_activity(ctx.author, ctx.command, ctx.selected_options)
+
+        stats = Metrics.snapshot()
+        header = (
+            "Bot latency since startup (ms, recent calls)\n\n"
+            f"{'Kind':<12} {'Name':<28} {'Calls':>6} {'p50':>8} {'p95':>8} {'p99':>8} {'Errs':>5}\n"
+            + "-" * 81 + "\n"
+        )
+
+        await Paginator(
+            self._helper.format_stats_rows(stats),
+            header=header,
+            footer=f"Operations timed: {len(stats)}"
+        ).send(ctx, buttons=True)
+
     async def not_authorized(
             self,
             ctx: discord.ApplicationContext):
@@ -378,7 +465,7 @@ def setup(bot):
 
     guild = os.getenv('DISCORD_GUILD')
     helper = Helpers(bot, guild)
-    database = Database()
+    database = AsyncDatabase()
     tracker = Tracker()
 
     bot.add_cog(Lookups(bot, database, helper, tracker))
@@ -2,8 +2,12 @@ import os
 import discord
 from dotenv import load_dotenv
 from discord.ext import commands
-from classes.database import Database
+from classes.async_database import AsyncDatabase
+from classes.background_job import BackgroundJob
 from classes.helpers import Helpers
+from classes.metrics import timed
+from classes.paginator import Paginator
+from classes.roster_audit import RosterAudit
 from classes.tracker import Tracker
 
 class Updates(commands.Cog):
@@ -22,6 +26,11 @@ class Updates(commands.Cog):
         self._class_list = []
         self._type_list = []
 
+        # the current or most recent respawn sync
+        self._sync_job = None
+        self._audit = RosterAudit(database, helper)
+
+    @timed('autocomplete')
     async def char_name_autocompletion(
             self,
             ctx: discord.AutocompleteContext,
@@ -33,10 +42,13 @@ class Updates(commands.Cog):
         """
         current_value = ctx.value
 
-        self._char_list = self._database.get_all_char_names()
+        self._char_list = await self._database.get_all_char_names()
 
-        return [choice for choice in self._char_list if current_value.lower() in choice.lower()]
+        return self._helper.autocomplete(
+            'char_name', self._char_list, current_value, self._database.roster_version
+        )
 
+    @timed('autocomplete')
     async def discord_name_autocompletion(
             self,
             ctx: discord.AutocompleteContext
@@ -50,8 +62,11 @@ class Updates(commands.Cog):
 
         self._discord_list = self._helper.get_all_discord_names('display')
 
-        return [choice for choice in self._discord_list if current_value.lower() in choice.lower()]
+        return self._helper.autocomplete(
+            'discord_display_name', self._discord_list, current_value, self._helper.member_index.version
+        )
 
+    @timed('autocomplete')
     async def races_autocompletion(
             self,
             ctx: discord.AutocompleteContext
@@ -66,8 +81,9 @@ class Updates(commands.Cog):
         if len(self._race_list) == 0:
             self._race_list = self._helper.get_races()
 
-        return [choice for choice in self._race_list if current_value.lower() in choice.lower()]
+        return self._helper.autocomplete('race', self._race_list, current_value)
 
+    @timed('autocomplete')
     async def classes_autocompletion(
             self,
             ctx: discord.AutocompleteContext
@@ -82,8 +98,9 @@ class Updates(commands.Cog):
         if len(self._class_list) == 0:
             self._class_list = self._helper.get_classes()
 
-        return [choice for choice in self._class_list if current_value.lower() in choice.lower()]
+        return self._helper.autocomplete('class', self._class_list, current_value)
 
+    @timed('autocomplete')
     async def types_autocompletion(
             self,
             ctx: discord.AutocompleteContext
@@ -98,14 +115,14 @@ class Updates(commands.Cog):
         if len(self._type_list) == 0:
             self._type_list = self._helper.get_types()
 
-        return [choice for choice in self._type_list if current_value.lower() in choice.lower()]
+        return self._helper.autocomplete('type', self._type_list, current_value)
 
-    def add_member(
+    async def add_member(
             self,
             discord_id
     ):
         try:
-            if self._database.insert_member(discord_id) > 0:
+            if await self._database.insert_member(discord_id) > 0:
                 return True
             else:
                 return False
@@ -116,6 +133,7 @@ class Updates(commands.Cog):
                 return False
 
     @discord.slash_command(name="add_character", description="Add a character to the database")
+    @timed('command')
     async def add_character(
             self,
             ctx: discord.ApplicationContext,
@@ -180,7 +198,7 @@ class Updates(commands.Cog):
             )
             return
 
-        if self.add_member(discord_id) is False:
+        if await self.add_member(discord_id) is False:
             await ctx.respond(
                 f"```Problem inserting discord id into database.```",
                 ephemeral=True
@@ -198,10 +216,13 @@ class Updates(commands.Cog):
             char_priority = 2
 
         try:
-            results = self._database.insert_character(discord_id, char_name, char_race,
-                                          char_class, char_type, char_priority)
+            results = await self._database.insert_character(discord_id, char_name, char_race,
+                                                char_class, char_type, char_priority)
             row = self._helper.get_row(results)
 
+            if results > 0:
+                self._helper.combined_names.add_character(char_name, discord_id)
+
             # customize response message to user based on how
             # many character options were input
             message = f"({char_name} | "
@@ -237,6 +258,7 @@ class Updates(commands.Cog):
                 )
 
     @discord.slash_command(name="edit_character", description="Edit an existing character")
+    @timed('command')
     async def edit_character(
             self,
             ctx: discord.ApplicationContext,
@@ -302,7 +324,7 @@ class Updates(commands.Cog):
 
         self._helper.log_activity(ctx.author, ctx.command, ctx.selected_options)
 
-        results = self._database.update_character(
+        results = await self._database.update_character(
             char_name, new_name, char_race, char_class, char_type
         )
         row = self._helper.get_row(results)
@@ -310,6 +332,9 @@ class Updates(commands.Cog):
         # customize response message to user based on how
         # many edit options were input
         if results > 0:
+            if new_name is not None:
+                self._helper.combined_names.rename_character(char_name, new_name)
+
             message = f"{char_name} updated to: "
 
             if new_name is not None:
@@ -335,14 +360,14 @@ class Updates(commands.Cog):
             ephemeral=True
         )
 
-    def delete_member(self, discord_id):
+    async def delete_member(self, discord_id):
         """
         Delete a member from the database
         :param discord_id: the discord_id to check
         :return: boolean
         """
         # count the number of discord_ids left in characters table
-        num_ids = len(self._database.count_ids(discord_id))
+        num_ids = len(await self._database.count_ids(discord_id))
 
         # if at least one character left, return True
         if num_ids > 0:
@@ -351,12 +376,13 @@ class Updates(commands.Cog):
         # if no more characters left for discord_id, we need
         # to delete discord_id from members table, return True
         # if delete successful, otherwise return False
-        if self._database.delete_member(discord_id) > 0:
+        if await self._database.delete_member(discord_id) > 0:
             return True
         else:
             return False
 
     @discord.slash_command(name="delete_character", description="Delete a character")
+    @timed('command')
     async def delete_character(
             self,
             ctx: discord.ApplicationContext,
@@ -384,14 +410,17 @@ class Updates(commands.Cog):
         self._helper.log_activity(ctx.author, ctx.command, ctx.selected_options)
 
         # get discord_id before character is deleted
-        discord_id = self._database.lookup_discord_id(char_name)[0]['discord_id']
+        discord_id = (await self._database.lookup_discord_id(char_name))[0]['discord_id']
 
         # delete character from database
-        char_results = self._database.delete_character(char_name)
+        char_results = await self._database.delete_character(char_name)
         row = self._helper.get_row(char_results)
 
+        if char_results > 0:
+            self._helper.combined_names.remove_character(char_name)
+
         # get results of delete_member function
-        member_results = self.delete_member(discord_id)
+        member_results = await self.delete_member(discord_id)
 
         # if char_results > 0 then query was successful
         # i.e., character was deleted
@@ -414,6 +443,7 @@ class Updates(commands.Cog):
         name="update_respawns",
         description="Syncs bot database respawn times with Quarm database"
     )
+    @timed('command')
     async def update_respawns(
             self,
             ctx: discord.ApplicationContext,
@@ -434,25 +464,192 @@ class Updates(commands.Cog):
 
         self._helper.log_activity(ctx.author, ctx.command, ctx.selected_options)
 
-        # this is a moderately long process, so inform user
+        # only one sync may run at a time
+        if self._sync_job is not None and self._sync_job.is_running():
+            await ctx.respond(
+                f"```A respawn sync is already running.\n"
+                f"{self._sync_job.describe()}```",
+                ephemeral=True
+            )
+            return
+
+        # run tracker update method in a worker thread; it reads the
+        # mob list itself, so the job starts before anything is awaited
+        # and a second officer cannot slip in a duplicate run
+        self._sync_job = BackgroundJob("Respawn sync", self._tracker.update_respawn_times)
+        self._sync_job.start()
+
+        # this is a moderately long process, so inform user,
+        # then report progress by editing a single followup
         await ctx.respond(
-            "```Updating all mob respawn times. This will take a while.\n"
-            "Please be patient...```",
+            "```Updating all mob respawn times in the background.\n"
+            "Use /respawn_sync_status or /respawn_sync_cancel at any time.```",
             ephemeral=True
         )
+        followup = await ctx.followup.send("```Starting respawn sync...```", ephemeral=True, wait=True)
+
+        async def show_progress(job):
+            await followup.edit(content=f"```{self.format_sync_job(job)}```")
+
+        await self._sync_job.watch(show_progress)
+
+    @discord.slash_command(
+        name="respawn_sync_status",
+        description="Show the progress of the respawn sync"
+    )
+    @timed('command')
+    async def respawn_sync_status(
+            self,
+            ctx: discord.ApplicationContext,
+    ):
+        """
+        Display the state of the current or most recent respawn sync
+        :param ctx: the application context of the bot
+        :return: none
+        """
+        # this slash command only available to officers
+        target_role = discord.utils.get(ctx.guild.roles, name="Officer")
+
+        # if validate_role returns false, user is not authorized,
+        # so exit function
+        if not self._helper.validate_role(ctx.author.roles, target_role):
+            await self.not_authorized(ctx)
+            return
+
+        self._helper.log_activity(ctx.author, ctx.command, ctx.selected_options)
+
+        if self._sync_job is None:
+            message = "No respawn sync has been run since the bot started."
+        else:
+            message = self.format_sync_job(self._sync_job)
+
+        await ctx.respond(
+            f"```{message}```",
+            ephemeral=True
+        )
+
+    @discord.slash_command(
+        name="respawn_sync_cancel",
+        description="Cancel a running respawn sync"
+    )
+    @timed('command')
+    async def respawn_sync_cancel(
+            self,
+            ctx: discord.ApplicationContext,
+    ):
+        """
+        Ask a running respawn sync to stop at its next stage
+        :param ctx: the application context of the bot
+        :return: none
+        """
+        # this slash command only available to officers
+        target_role = discord.utils.get(ctx.guild.roles, name="Officer")
 
-        # obtain databse mob list
-        mob_list = self._database.get_all_mob_names()
+        # if validate_role returns false, user is not authorized,
+        # so exit function
+        if not self._helper.validate_role(ctx.author.roles, target_role):
+            await self.not_authorized(ctx)
+            return
+
+        self._helper.log_activity(ctx.author, ctx.command, ctx.selected_options)
 
-        # run tracker update method; does not return anything
-        self._tracker.update_respawn_times(mob_list)
+        if self._sync_job is not None and self._sync_job.cancel():
+            message = "Respawn sync will stop at its next stage."
+        else:
+            message = "No respawn sync is running."
 
-        # notify user process is complete
         await ctx.respond(
-            "```Database mob respawn time update is complete.```",
+            f"```{message}```",
             ephemeral=True
         )
 
+    @discord.slash_command(
+        name="roster_audit",
+        description="List roster entries for members who have left the guild"
+    )
+    @timed('command')
+    async def roster_audit(
+            self,
+            ctx: discord.ApplicationContext,
+            cleanup: discord.Option(
+                bool,
+                description='Delete every listed entry',
+                default=False
+            )
+    ):
+        """
+        Show characters and members rows whose discord id is no
+        longer in the guild, optionally deleting them all
+        :param ctx: the application context of the bot
+        :param cleanup: boolean, True to delete the listed rows (optional)
+        :return: none
+        """
+        # this slash command only available to officers
+        target_role = discord.utils.get(ctx.guild.roles, name="Officer")
+
+        # if validate_role returns false, user is not authorized,
+        # so exit function
+        if not self._helper.validate_role(ctx.author.roles, target_role):
+            await self.not_authorized(ctx)
+            return
+
+        self._helper.log_activity(ctx.author, ctx.command, ctx.selected_options)
+
+        # always act on a fresh audit, never on stale findings
+        await self._audit.full_pass()
+
+        if cleanup:
+            char_names, deleted = await self._audit.cleanup()
+
+            for char_name in char_names:
+                self._helper.combined_names.remove_character(char_name)
+
+            await ctx.respond(
+                f"```Roster cleanup: {deleted} rows deleted.\n"
+                f"{len(char_names)} characters removed.```",
+                ephemeral=True
+            )
+            return
+
+        rows = self._audit.format_rows()
+
+        if len(rows) == 0:
+            await ctx.respond(
+                f"```Every roster entry belongs to a current guild member.```",
+                ephemeral=True
+            )
+            return
+
+        paginator = Paginator(
+            rows,
+            header=self._audit.format_header(),
+            footer=f"\n{len(rows)} discord ids. Run with cleanup to delete them."
+        )
+
+        await paginator.send(ctx, buttons=True)
+
+    def format_sync_job(self, job):
+        """
+        Describe a respawn sync job, adding the change
+        summary once the sync has finished
+        :param job: BackgroundJob
+        :return: formatted string
+        """
+        message = job.describe()
+
+        if job.status == "done" and job.result is not None:
+            changed = job.result['changed']
+            message = message + f"\nUpdated: {', '.join(changed) if len(changed) > 0 else 'none'}"
+
+            if len(job.result['not_found']) > 0:
+                message = message + f"\nNot on pqdi: {', '.join(job.result['not_found'])}"
+
+        # keep within Discord's message size limit
+        if len(message) > 1900:
+            message = message[:1897] + "..."
+
+        return message
+
     async def not_authorized(
             self,
             ctx: discord.ApplicationContext
@@ -469,7 +666,7 @@ def setup(bot):
 
     guild = os.getenv('DISCORD_GUILD')
     helper = Helpers(bot, guild)
-    database = Database()
+    database = AsyncDatabase()
     tracker = Tracker()
 
     bot.add_cog(Updates(bot, database, helper, tracker))
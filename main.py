@@ -1,12 +1,22 @@
 # bot.py
+import asyncio
 import os
 import discord  # actually using py-cord instead of discord.py
-from classes.database import Database
-from classes.tracker import Tracker
 from dotenv import load_dotenv
 
+# before the classes are imported, as some read settings at import
 load_dotenv()  # sets up environment variables, stored locally in .env
 
+from classes.database import Database
+from classes.tracker import Tracker
+from classes.helpers import Helpers
+from classes.kill_ingest import KillIngest
+from classes.async_database import AsyncDatabase
+from classes.roster_audit import RosterAudit
+from classes.read_mirror import ReadMirror
+from classes.migrations import Migrator
+from classes.metrics import MetricsExporter
+
 TOKEN = os.getenv('DISCORD_TOKEN')  # bot token
 GUILD = os.getenv('DISCORD_GUILD')  # target guild
 discord_names = []  # list of Discord names
@@ -17,6 +27,13 @@ intents = discord.Intents.all()
 bot = discord.Bot(intents=intents)
 database = Database()
 tracker = Tracker()
+helper = Helpers(bot, GUILD)
+kill_ingest = KillIngest()  # EQ log and uploader kills, when configured
+roster_audit = RosterAudit(AsyncDatabase(), helper)
+audit_task = None  # periodic full roster audit
+read_mirror = ReadMirror(AsyncDatabase(), helper)  # resyncs in-memory tables
+mirror_task = None
+metrics_exporter = MetricsExporter()  # latency figures for Prometheus
 
 
 @bot.event
@@ -43,33 +60,74 @@ async def on_ready():
         f'{guild.name} (id: {guild.id})'
     )
 
+    # index guild members once; member events keep it current
+    helper.load_members()
+
+    # on_ready fires again after a reconnect; start ingestion once
+    if kill_ingest.is_configured() and not kill_ingest.is_running():
+        await kill_ingest.start()
+
+    # publish command and query latency, once
+    if metrics_exporter.is_configured() and not metrics_exporter.is_running():
+        await metrics_exporter.start()
+
+    # audit the roster now and then; member events keep it current between passes
+    global audit_task
+
+    if audit_task is None:
+        audit_task = asyncio.create_task(roster_audit.run_periodic())
+
+    # reads are served from memory; resync it with the database now and then
+    global mirror_task
+
+    if mirror_task is None and read_mirror.is_enabled():
+        mirror_task = asyncio.create_task(read_mirror.run_periodic())
+
     # keep_alive.start()
-    # find_discrepancies(guild)
 
 
-def find_discrepancies(guild):
-    characters = database.get_discord_ids()
-    discrepancies = []
-    found = False
+@bot.event
+async def on_member_join(member):
+    helper.index_member(member)
+
+    if helper.is_tracked_guild(member.guild):
+        roster_audit.member_joined(member.id)
+
+
+@bot.event
+async def on_member_remove(member):
+    helper.unindex_member(member)
+
+    if helper.is_tracked_guild(member.guild):
+        await roster_audit.member_left(member.id)
 
-    for char_dict in characters:
-        for member in guild.members:
-            if str(char_dict['discord_id']) == str(member.id):
-                found = True
-                break
 
-        if found is False:
-            current_char = {
-                "discord_id": char_dict['discord_id'],
-                "char_name": char_dict['char_name']
-            }
-            discrepancies.append(current_char)
+@bot.event
+async def on_member_update(before, after):
+    # nickname changes alter the display name
+    helper.index_member(after)
+
+
+@bot.event
+async def on_user_update(before, after):
+    # account name changes arrive as user, not member, updates
+    guild = helper.get_guild()
 
-        found = False
+    if guild is not None:
+        member = guild.get_member(after.id)
 
-    for item in discrepancies:
-        print(item)
+        if member is not None:
+            helper.index_member(member)
 
 
 if __name__ == "__main__":
+    # create or upgrade the schema of a new SQLite file (or a
+    # server, with SCHEMA_BOOTSTRAP=true) before any command reads it
+    migrator = Migrator(database)
+    migrator.bootstrap()
+
+    # with bootstrap off the schema may still be behind (text columns,
+    # no row_changes log), so refuse to run until it is upgraded
+    migrator.require_current()
+
     bot.run(TOKEN)
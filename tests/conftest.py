@@ -0,0 +1,25 @@
+import pytest
+from classes.async_database import AsyncDatabase
+from classes.database import Database
+
+
+@pytest.fixture
+def sqlite_database(tmp_path, monkeypatch):
+    """
+    Point Database at an empty SQLite file for one test, and
+    forget the shared engines and caches afterwards
+    :return: Database
+    """
+    monkeypatch.setenv('DATABASE_BACKEND', "sqlite")
+    monkeypatch.setenv('SQLITE_PATH', str(tmp_path / "sos_bot.db"))
+    Database.dispose_engine()
+    AsyncDatabase._async_engine = None
+
+    yield Database()
+
+    Database.dispose_engine()
+    AsyncDatabase._async_engine = None
+    Database._roster.invalidate()
+    Database._respawns.invalidate()
+    Database._change_seq = None
+    Database._change_seen = set()
@@ -0,0 +1,97 @@
+import asyncio
+import inspect
+import pytest
+from classes.async_database import AsyncDatabase
+from classes.database import Database
+from classes.migrations import Migrator
+
+
+def add_mob(mob_name):
+    return (
+        "INSERT INTO sos_bot.respawns (mob_name, mob_zone, lockout_weeks, lockout_days, "
+        f"lockout_hours, lockout_minutes) VALUES ('{mob_name}', 'Plane of Fear', 0, 1, 0, 0)"
+    )
+
+
+def run(steps):
+    """
+    Run steps against a fresh AsyncDatabase, closing its
+    engine inside the same event loop
+    :param steps: async callable taking the AsyncDatabase
+    :return: whatever steps returns
+    """
+    async def main():
+        database = AsyncDatabase()
+
+        try:
+            return await steps(database)
+        finally:
+            await AsyncDatabase.dispose_engine()
+
+    return asyncio.run(main())
+
+
+@pytest.fixture
+def seeded(sqlite_database):
+    Migrator(sqlite_database).upgrade()
+    sqlite_database.insert_character("1", "Abbot", "Human", "Bard", 'Main', 0)
+
+    with sqlite_database.create_engine().begin() as conn:
+        conn.exec_driver_sql(add_mob("Dread"))
+
+    return sqlite_database
+
+
+def test_shared_methods_are_coroutines(seeded):
+    async def steps(database):
+        calls = [
+            database.update_character("Abbot", None, None, None, None),
+            database.lookup_characters("Abbot"),
+            database.sync_mob_respawns({}),
+            database.record_kills({}),
+            database.refresh_mirror()
+        ]
+        awaitable = [inspect.isawaitable(call) for call in calls]
+
+        for call in calls:
+            await call
+
+        return awaitable
+
+    assert run(steps) == [True] * 5
+
+
+def test_shared_methods_match_database(seeded):
+    async def steps(database):
+        return {
+            'no change': await database.update_character("Abbot", None, None, None, None),
+            'update': await database.update_character("Abbot", None, None, None, 'Alt'),
+            'characters': await database.lookup_characters("Abbot"),
+            'lockouts': await database.sync_mob_respawns(
+                {"Dread": {'weeks': 0, 'days': 2, 'hours': 0, 'minutes': 0}}
+            ),
+            'refresh': await database.refresh_mirror()
+        }
+
+    results = run(steps)
+
+    assert results['no change'] == 0
+    assert results['update'] == 1
+    assert results['characters'] == seeded.lookup_characters("Abbot")
+    assert results['characters'][0]['char_type'] == 'Alt'
+    assert results['lockouts']['changed'] == ["Dread"]
+    assert seeded.sync_mob_respawns(
+        {"Dread": {'weeks': 0, 'days': 2, 'hours': 0, 'minutes': 0}}
+    )['unchanged'] == 1
+
+
+def test_failed_queries_raise_inside_the_method(seeded):
+    async def steps(database):
+        await database.read_changed("SELECT * FROM sos_bot.no_such_table", {"x"})
+
+    with pytest.raises(Exception, match="no_such_table"):
+        run(steps)
+
+    # the synchronous class fails the same way
+    with pytest.raises(Exception, match="no_such_table"):
+        Database().read_changed("SELECT * FROM sos_bot.no_such_table", {"x"})
@@ -0,0 +1,70 @@
+from classes.autocomplete import AutocompleteIndex, MAX_CHOICES
+
+ZONES = [
+    "Temple of Veeshan",
+    "Plane of Fear",
+    "Plane of Hate",
+    "Permafrost Caverns",
+    "Nagafen's Lair",
+    "Veeshan's Peak",
+    "Kael Drakkal",
+]
+
+
+def test_empty_query_offers_list_as_is():
+    index = AutocompleteIndex(ZONES)
+
+    assert index.search("") == ZONES
+
+
+def test_prefix_matches_rank_first():
+    index = AutocompleteIndex(ZONES)
+
+    # prefix, then word start, then any other substring
+    assert index.search("ve") == ["Veeshan's Peak", "Temple of Veeshan", "Permafrost Caverns"]
+
+
+def test_search_ignores_case():
+    index = AutocompleteIndex(ZONES)
+
+    assert index.search("PLANE OF") == ["Plane of Fear", "Plane of Hate"]
+
+
+def test_trigram_search_finds_substrings():
+    index = AutocompleteIndex(ZONES)
+
+    assert index.search("eeshan") == ["Temple of Veeshan", "Veeshan's Peak"]
+
+
+def test_unknown_trigram_matches_nothing():
+    index = AutocompleteIndex(ZONES)
+
+    assert index.search("xyz") == []
+
+
+def test_trigram_candidates_still_need_the_whole_query():
+    # both hold "abc" and "bcd", only one holds "abcd"
+    index = AutocompleteIndex(["xabcx bcd", "xabcdx"])
+
+    assert index.search("abcd") == ["xabcdx"]
+
+
+def test_results_are_capped():
+    index = AutocompleteIndex([f"Mob {n}" for n in range(100)])
+
+    assert len(index.search("mob")) == MAX_CHOICES
+    assert len(index.search("mob", limit=5)) == 5
+
+
+def test_refresh_rebuilds_only_on_change():
+    values = ["Vox"]
+    index = AutocompleteIndex()
+    index.refresh(values, version=1)
+
+    # updated in place with the same version: still the old index
+    values.append("Venril Sathir")
+    index.refresh(values, version=1)
+    assert index.search("ve") == []
+
+    index.refresh(values, version=2)
+    assert index.search("ve") == ["Venril Sathir"]
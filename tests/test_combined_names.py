@@ -0,0 +1,76 @@
+from types import SimpleNamespace
+from classes.combined_names import CombinedNames
+from classes.member_index import MemberIndex
+
+
+def member(member_id, name):
+    return SimpleNamespace(id=member_id, name=name, display_name=name)
+
+
+def combined(char_name, discord_name):
+    return f"[ {char_name} ]" + " " * 4 + f"[ {discord_name} ]"
+
+
+def make_names(members, characters):
+    index = MemberIndex()
+    index.rebuild(members)
+
+    names = CombinedNames(index)
+    names.rebuild([{'char_name': char, 'discord_id': owner} for char, owner in characters])
+
+    return index, names
+
+
+def test_rebuild_joins_characters_to_members():
+    # ids come back from the database as strings
+    _, names = make_names(
+        [member(1, "amy"), member(2, "bea")],
+        [("Soandso", "2"), ("Abbot", "1"), ("Zelda", "1")]
+    )
+
+    assert names.get_names() == [
+        combined("Abbot", "amy"), combined("Soandso", "bea"), combined("Zelda", "amy")
+    ]
+
+
+def test_characters_of_departed_members_are_left_out():
+    _, names = make_names([member(1, "amy")], [("Abbot", "1"), ("Orphan", "2")])
+
+    assert names.get_names() == [combined("Abbot", "amy")]
+
+
+def test_add_rename_and_remove_keep_the_list_sorted():
+    _, names = make_names([member(1, "amy")], [("Mira", "1")])
+    version = names.version
+
+    names.add_character("Abbot", "1")
+    names.rename_character("mira", "Zelda")
+    names.remove_character("Nobody")
+
+    assert names.get_names() == [combined("Abbot", "amy"), combined("Zelda", "amy")]
+    assert names.version > version
+
+    names.remove_character("ABBOT")
+
+    assert names.get_names() == [combined("Zelda", "amy")]
+
+
+def test_refresh_member_follows_a_renamed_or_returning_member():
+    index, names = make_names([member(1, "amy")], [("Abbot", "1"), ("Orphan", "2")])
+
+    index.add(member(1, "amelia"))
+    names.refresh_member(1)
+    index.add(member(2, "bea"))
+    names.refresh_member("2")
+
+    assert names.get_names() == [combined("Abbot", "amelia"), combined("Orphan", "bea")]
+
+
+def test_changes_before_rebuild_are_ignored():
+    index = MemberIndex()
+    index.rebuild([member(1, "amy")])
+    names = CombinedNames(index)
+
+    names.add_character("Abbot", "1")
+
+    assert names.get_names() == [] and not names.loaded
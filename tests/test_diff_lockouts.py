@@ -0,0 +1,56 @@
+from classes.database import Database
+
+
+def lockout(weeks=0, days=0, hours=0, minutes=0):
+    return {'weeks': weeks, 'days': days, 'hours': hours, 'minutes': minutes}
+
+
+def stored(mob_name, weeks=0, days=0, hours=0, minutes=0):
+    return {
+        'mob_name': mob_name,
+        'lockout_weeks': weeks,
+        'lockout_days': days,
+        'lockout_hours': hours,
+        'lockout_minutes': minutes
+    }
+
+
+def test_only_changed_lockouts_are_written():
+    changes, summary = Database().diff_lockouts(
+        [stored("Vox", days=7), stored("Naggy", days=7)],
+        {"Vox": lockout(days=7), "Naggy": lockout(days=6, hours=12)}
+    )
+
+    assert changes == [{'mob_name': "Naggy", 'weeks': 0, 'days': 6, 'hours': 12, 'minutes': 0}]
+    assert summary == {'changed': ["Naggy"], 'unchanged': 1, 'missing': []}
+
+
+def test_untracked_mobs_are_reported_missing():
+    changes, summary = Database().diff_lockouts(
+        [stored("Vox", days=7)],
+        {"Vox": lockout(days=7), "Phinigel": lockout(hours=18)}
+    )
+
+    assert changes == []
+    assert summary == {'changed': [], 'unchanged': 1, 'missing': ["Phinigel"]}
+
+
+def test_text_values_compare_equal_to_ints():
+    # older rows may come back from the database as text
+    changes, summary = Database().diff_lockouts(
+        [stored("Vox", weeks="1", days="0", hours="0", minutes="0")],
+        {"Vox": lockout(weeks=1)}
+    )
+
+    assert changes == []
+    assert summary['unchanged'] == 1
+
+
+def test_stored_mobs_not_scraped_are_left_alone():
+    changes, summary = Database().diff_lockouts(
+        [stored("Vox", days=7), stored("Naggy", days=7)],
+        {"Vox": lockout(days=7)}
+    )
+
+    assert changes == []
+    assert summary == {'changed': [], 'unchanged': 1, 'missing': []}
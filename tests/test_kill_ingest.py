@@ -0,0 +1,131 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from classes.kill_ingest import KillIngest
+
+KILL = datetime(2026, 1, 1, 12, 0, tzinfo=timezone.utc)
+
+
+class FakeTailer:
+    """
+    Stands in for LogTailer, recording the offsets saved
+    """
+    def __init__(self):
+        self.saved = []
+
+    def has_logs(self):
+        return False
+
+    def save_offsets(self, offsets=None):
+        self.saved.append(offsets)
+
+
+class FakeDatabase:
+    """
+    Stands in for AsyncDatabase, recording the kills written
+    """
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.written = []
+
+    async def record_kills(self, kills):
+        if self.fail:
+            raise ConnectionError("database unreachable")
+
+        self.written.append(dict(kills))
+
+        return len(kills)
+
+
+def make_ingest(window=60, database=None, token=""):
+    ingest = KillIngest(tailer=FakeTailer(), port=0, window=window, token=token)
+    ingest._database = FakeDatabase() if database is None else database
+
+    return ingest
+
+
+def test_copies_within_window_are_dropped():
+    ingest = make_ingest()
+
+    assert ingest.submit("Vox", KILL)
+    assert not ingest.submit("Vox", KILL + timedelta(seconds=30))
+    # a slow client's clock may put its copy before the first
+    assert not ingest.submit("Vox", KILL - timedelta(seconds=60))
+    assert (ingest.accepted, ingest.duplicates) == (1, 2)
+
+
+def test_kill_outside_window_is_a_new_kill():
+    ingest = make_ingest()
+
+    assert ingest.submit("Vox", KILL)
+    assert ingest.submit("Vox", KILL + timedelta(seconds=61))
+    assert ingest._pending == {"Vox": KILL + timedelta(seconds=61)}
+
+
+def test_window_is_per_mob():
+    ingest = make_ingest()
+
+    assert ingest.submit("Vox", KILL)
+    assert ingest.submit("Naggy", KILL)
+    assert ingest.duplicates == 0
+
+
+def test_window_is_measured_in_utc():
+    ingest = make_ingest()
+    eastern = timezone(timedelta(hours=-5))
+
+    assert ingest.submit("Vox", KILL)
+    # the same moment reported in another zone
+    assert not ingest.submit("Vox", KILL.astimezone(eastern))
+
+
+def test_pending_keeps_latest_kill():
+    ingest = make_ingest(window=0)
+
+    ingest.submit("Vox", KILL + timedelta(hours=1))
+    ingest.submit("Vox", KILL)
+
+    assert ingest._pending == {"Vox": KILL + timedelta(hours=1)}
+
+
+def test_offsets_saved_only_after_write():
+    offsets = {'eqlog.txt': {'inode': 1, 'offset': 100}}
+    ingest = make_ingest(database=FakeDatabase(fail=True))
+    ingest.submit("Vox", KILL)
+    ingest._pending_offsets = offsets
+
+    # a failed write keeps the kills and their offsets pending
+    asyncio.run(ingest.flush())
+    assert ingest._tailer.saved == []
+    assert ingest._pending == {"Vox": KILL}
+
+    ingest._database.fail = False
+    asyncio.run(ingest.flush())
+    assert ingest._database.written == [{"Vox": KILL}]
+    assert ingest._tailer.saved == [offsets]
+
+
+def authenticate(ingest, data):
+    """
+    Run authenticate against a reader holding the given bytes
+    :return: boolean
+    """
+    async def run():
+        reader = asyncio.StreamReader()
+        reader.feed_data(data)
+        reader.feed_eof()
+
+        return await ingest.authenticate(reader)
+
+    return asyncio.run(run())
+
+
+def test_uploaders_must_send_the_token():
+    ingest = make_ingest(token="s3cret")
+
+    assert authenticate(ingest, b"s3cret\r\n")
+    assert not authenticate(ingest, b"guess\n")
+    assert not authenticate(ingest, b"")
+
+
+def test_no_token_rejects_every_uploader():
+    assert not authenticate(make_ingest(), b"\n")
@@ -0,0 +1,58 @@
+import time
+from datetime import datetime, timedelta, timezone
+from classes.log_tailer import LogTailer, parse_kill_line
+
+ZONE = timezone(timedelta(hours=-5))
+
+
+def test_you_have_slain_is_a_kill():
+    line = b"[Sun Oct 18 18:19:29 2026] You have slain Lord Nagafen!\r\n"
+
+    assert parse_kill_line(line, ZONE) == (
+        "Lord Nagafen", datetime(2026, 10, 18, 18, 19, 29, tzinfo=ZONE)
+    )
+
+
+def test_slain_by_another_player_is_a_kill():
+    line = b"[Mon Oct  5 01:02:03 2026] Phinigel Autropos has been slain by Soandso!\n"
+
+    assert parse_kill_line(line, ZONE) == (
+        "Phinigel Autropos", datetime(2026, 10, 5, 1, 2, 3, tzinfo=ZONE)
+    )
+
+
+def test_names_keep_apostrophes_and_high_bytes():
+    line = "[Sun Oct 18 18:19:29 2026] You have slain Ssra'ess Dérak!\n".encode('latin-1')
+
+    assert parse_kill_line(line, ZONE)[0] == "Ssra'ess Dérak"
+
+
+def test_other_lines_are_ignored():
+    assert parse_kill_line(b"[Sun Oct 18 18:19:29 2026] You say, 'Hail'\n", ZONE) is None
+    # mentions slain but is not a kill message
+    assert parse_kill_line(b"[Sun Oct 18 18:19:29 2026] Soandso says, 'I was slain twice'\n", ZONE) is None
+    assert parse_kill_line(b"You have slain Lord Nagafen!\n", ZONE) is None
+    assert parse_kill_line(b"", ZONE) is None
+
+
+def test_offsets_are_saved_from_a_snapshot(tmp_path):
+    log = tmp_path / "eqlog.txt"
+    log.write_bytes(b"")
+    tailer = LogTailer(paths=[str(log)], offsets_path=str(tmp_path / "offsets.json"))
+    tailer._mobs_loaded_at = time.monotonic()
+
+    # the first poll starts following from the end of the file
+    tailer.poll()
+    log.write_bytes(b"[Sun Oct 18 18:19:29 2026] You have slain Lord Nagafen!\n")
+    tailer._mobs = {"lord nagafen": "Lord Nagafen"}
+    snapshot = tailer.get_offsets()
+
+    assert list(tailer.poll()) == ["Lord Nagafen"]
+
+    # saving the older snapshot leaves the newer offsets still to save
+    tailer.save_offsets(snapshot)
+    assert LogTailer(paths=[], offsets_path=str(tmp_path / "offsets.json")).get_offsets() == snapshot
+    assert tailer._moved
+
+    tailer.checkpoint()
+    assert not tailer._moved
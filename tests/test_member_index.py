@@ -0,0 +1,68 @@
+from types import SimpleNamespace
+from classes.member_index import MemberIndex
+
+
+def member(member_id, name, display_name=None):
+    return SimpleNamespace(id=member_id, name=name, display_name=display_name or name)
+
+
+def make_index(members):
+    index = MemberIndex()
+    index.rebuild(members)
+
+    return index
+
+
+def test_rebuild_indexes_ids_and_names():
+    index = make_index([member(1, "zed", "Zed"), member(2, "amy", "Amy the Bard")])
+
+    assert index.get_id("amy", 'account') == 2
+    assert index.get_id("Amy the Bard", 'display') == 2
+    assert index.get_display_name(1) == "Zed"
+    assert index.get_name("2") == "amy"
+    assert len(index) == 2 and 1 in index
+
+
+def test_names_are_sorted_case_insensitively():
+    index = make_index([member(1, "zed"), member(2, "Bob"), member(3, "amy")])
+
+    assert index.get_names('name') == ["amy", "Bob", "zed"]
+
+
+def test_unknown_members_return_empty_values():
+    index = make_index([member(1, "zed")])
+
+    assert index.get_id("nobody", 'account') == ""
+    assert index.get_display_name(99) == ""
+    assert index.get_display_name("not a number") == ""
+    assert index.get_name(99) is None
+
+
+def test_duplicate_names_return_the_latest_member():
+    index = make_index([member(1, "amy", "Healer"), member(2, "bea", "Healer")])
+
+    assert index.get_id("Healer", 'display') == 2
+
+
+def test_add_reindexes_a_renamed_member():
+    index = make_index([member(1, "amy", "Amy"), member(2, "bea", "Bea")])
+
+    index.add(member(1, "amy", "Amelia"))
+
+    assert index.get_id("Amelia", 'display') == 1
+    assert index.get_id("Amy", 'display') == ""
+    assert index.get_names('display') == ["Amelia", "Bea"]
+
+
+def test_remove_drops_only_that_member():
+    index = make_index([member(1, "amy", "Healer"), member(2, "Amy", "Healer")])
+
+    index.remove(1)
+
+    assert index.get_id("Healer", 'display') == 2
+    assert index.get_names('name') == ["Amy"]
+    assert 1 not in index
+
+    # removing an unknown id is a no-op
+    index.remove(99)
+    assert len(index) == 1
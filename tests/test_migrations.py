@@ -0,0 +1,107 @@
+import pytest
+from classes.backends import MySQLBackend
+from classes.migrations import MIGRATIONS, Migrator
+
+
+def test_upgrade_applies_every_migration_once(sqlite_database):
+    migrator = Migrator(sqlite_database)
+
+    assert migrator.current_version() == 0
+    assert migrator.upgrade() == [version for version, _, _ in MIGRATIONS]
+    assert migrator.current_version() == MIGRATIONS[-1][0]
+    assert migrator.pending() == []
+
+    # a second run has nothing left to do
+    assert migrator.upgrade() == []
+
+
+def test_indexes_are_created(sqlite_database):
+    Migrator(sqlite_database).upgrade()
+
+    indexes = sqlite_database.backend.get_indexes(sqlite_database, 'respawns')
+
+    assert ('mob_zone',) in indexes.values()
+    assert ('respawn_time',) in indexes.values()
+
+
+def test_explain_runs_every_statement(sqlite_database):
+    migrator = Migrator(sqlite_database)
+    migrator.upgrade()
+
+    # every statement must at least parse on the backend
+    assert isinstance(migrator.explain(), list)
+
+
+class FakeDatabase:
+    """
+    Stands in for a MySQL Database, answering the unconverted
+    zones read with the given zones
+    """
+    def __init__(self, zones):
+        self.backend = MySQLBackend()
+        self.sql = {'recompute_all': "recompute"}
+        self.zones = zones
+
+    def execute_read(self, query, params=None, field=None):
+        return self.zones
+
+
+def test_native_columns_refuses_unconvertible_kill_times():
+    with pytest.raises(RuntimeError, match="EST"):
+        Migrator(FakeDatabase(["EST"])).native_columns()
+
+
+def test_native_columns_relabels_only_converted_rows():
+    statements = Migrator(FakeDatabase([])).native_columns()
+
+    assert "CONVERT_TZ(kill_time, time_zone, '+00:00') IS NOT NULL" in statements[1]
+    assert statements[-1] == "recompute"
+
+
+def test_require_current_needs_every_migration(sqlite_database):
+    migrator = Migrator(sqlite_database)
+    migrator.upgrade()
+
+    with sqlite_database.create_engine().begin() as conn:
+        conn.exec_driver_sql(f"DELETE FROM sos_bot.schema_version WHERE version = {MIGRATIONS[-1][0]}")
+
+    with pytest.raises(RuntimeError, match="classes.migrations upgrade"):
+        migrator.require_current()
+
+    migrator.upgrade()
+    migrator.require_current()
+
+
+def test_name_collation_rebuilds_old_tables(sqlite_database, monkeypatch):
+    # tables as an older bot created them, matching names by case
+    with sqlite_database.create_engine().begin() as conn:
+        conn.exec_driver_sql(
+            "CREATE TABLE sos_bot.characters (discord_id TEXT NOT NULL, "
+            "char_name TEXT NOT NULL PRIMARY KEY, char_race TEXT, char_class TEXT, "
+            "char_type TEXT, is_officer INTEGER NOT NULL DEFAULT 0, "
+            "char_priority INTEGER NOT NULL DEFAULT 3)"
+        )
+        conn.exec_driver_sql(
+            "INSERT INTO sos_bot.characters VALUES ('1', 'Abbot', 'Human', 'Bard', 'Main', 0, 0)"
+        )
+
+    Migrator(sqlite_database).upgrade()
+    monkeypatch.setattr(sqlite_database, '_use_roster_cache', False)
+
+    # the database now matches names as the roster cache does
+    assert sqlite_database.lookup_discord_id("ABBOT") == [{'discord_id': "1"}]
+    assert ('discord_id', 'char_type') in sqlite_database.backend.get_indexes(
+        sqlite_database, 'characters'
+    ).values()
+
+    # the rebuilt table still logs its writes
+    sqlite_database.insert_character("2", "bea", "Human", "Bard", 'Main', 0)
+    assert sqlite_database.get_all_char_names() == ["Abbot", "bea"]
+    assert sqlite_database.execute_read(
+        "SELECT row_key FROM sos_bot.row_changes", field='row_key'
+    ) == ["bea"]
+
+
+def test_name_collation_refuses_names_differing_in_case():
+    with pytest.raises(RuntimeError, match="abbot"):
+        Migrator(FakeDatabase(["abbot"])).name_collation()
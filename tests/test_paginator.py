@@ -0,0 +1,52 @@
+from classes.paginator import CODE_FENCE, PAGE_MARKER_ROOM, Paginator
+
+# room for 100 characters of rows on each page
+LIMIT = 100 + 2 * len(CODE_FENCE) + PAGE_MARKER_ROOM
+
+
+def make_rows(count, width=30):
+    return [f"{n:<{width - 1}}\n" for n in range(count)]
+
+
+def test_rows_are_packed_greedily():
+    paginator = Paginator(make_rows(10), limit=LIMIT)
+
+    assert paginator.split() == [(0, 3), (3, 6), (6, 9), (9, 10)]
+
+
+def test_exact_fit_stays_on_one_page():
+    paginator = Paginator(make_rows(4, width=25), limit=LIMIT)
+
+    assert paginator.split() == [(0, 4)]
+
+
+def test_header_and_footer_take_room_from_every_page():
+    paginator = Paginator(make_rows(4, width=25), header="h" * 10, footer="f" * 10, limit=LIMIT)
+
+    assert paginator.split() == [(0, 3), (3, 4)]
+
+
+def test_no_rows_is_one_empty_page():
+    paginator = Paginator([], limit=LIMIT)
+
+    assert paginator.split() == [(0, 0)]
+    assert paginator.get_page(0) == CODE_FENCE * 2
+
+
+def test_oversized_row_gets_its_own_page():
+    rows = ["a\n", "b" * 150 + "\n", "c\n"]
+    paginator = Paginator(rows, limit=LIMIT)
+
+    assert paginator.split() == [(0, 1), (1, 2), (2, 3)]
+    # and is cut to fit
+    assert len(paginator.get_page(1)) <= LIMIT
+
+
+def test_pages_cover_every_row_in_order():
+    rows = make_rows(57, width=17)
+    paginator = Paginator(rows, limit=LIMIT)
+    bounds = paginator.split()
+
+    assert bounds[0][0] == 0 and bounds[-1][1] == len(rows)
+    assert all(end == start for (_, end), (start, _) in zip(bounds, bounds[1:]))
+    assert all(len(paginator.get_page(page)) <= LIMIT for page in range(paginator.page_count))
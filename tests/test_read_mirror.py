@@ -0,0 +1,98 @@
+import asyncio
+from classes.migrations import Migrator
+from classes.read_mirror import ReadMirror
+
+
+def outside_write(database, *statements):
+    """
+    Change the tables behind the bot's back, as another tool would
+    :param statements: SQL strings
+    :return: none
+    """
+    with database.create_engine().begin() as conn:
+        for statement in statements:
+            conn.exec_driver_sql(statement)
+
+
+def add_character(char_name, discord_id="1"):
+    return (
+        "INSERT INTO sos_bot.characters (discord_id, char_name, char_race, char_class, "
+        f"char_type, is_officer, char_priority) VALUES ('{discord_id}', '{char_name}', "
+        "'Human', 'Bard', 'Main', 0, 0)"
+    )
+
+
+def add_mob(mob_name, mob_zone="Plane of Fear"):
+    return (
+        "INSERT INTO sos_bot.respawns (mob_name, mob_zone, lockout_weeks, lockout_days, "
+        f"lockout_hours, lockout_minutes) VALUES ('{mob_name}', '{mob_zone}', 0, 1, 0, 0)"
+    )
+
+
+def test_refresh_picks_up_outside_edits(sqlite_database):
+    Migrator(sqlite_database).upgrade()
+    outside_write(sqlite_database, add_character("Abbot"), add_mob("Dread"))
+
+    # the first refresh is a full resync
+    sqlite_database.refresh_mirror()
+    assert sqlite_database.get_all_char_names() == ["Abbot"]
+    assert sqlite_database.get_all_mob_names() == ["Dread"]
+
+    outside_write(
+        sqlite_database,
+        add_character("Zelda"),
+        "UPDATE sos_bot.characters SET char_name = 'Abbess' WHERE char_name = 'Abbot'",
+        add_mob("Fright"),
+        "DELETE FROM sos_bot.respawns WHERE mob_name = 'Dread'"
+    )
+
+    # later ones read only the logged rows
+    assert sqlite_database.refresh_mirror() > 0
+    assert sqlite_database.get_all_char_names() == ["Abbess", "Zelda"]
+    assert sqlite_database.get_all_mob_names() == ["Fright"]
+
+    # nothing new logged, nothing to change
+    assert sqlite_database.refresh_mirror() == 0
+
+
+def test_mirror_rebuilds_combined_names_on_roster_changes(sqlite_database):
+    Migrator(sqlite_database).upgrade()
+    sqlite_database.refresh_mirror()
+
+    class Helper:
+        """
+        Stands in for Helpers, recording combined name rebuilds
+        """
+        def __init__(self):
+            self.combined_names = type('Loaded', (), {'loaded': True})()
+            self.rebuilt = []
+
+        def load_combined_names(self, characters):
+            self.rebuilt.append([row['char_name'] for row in characters])
+
+    class Synchronous:
+        """
+        Awaitable front for Database, as AsyncDatabase would be
+        """
+        def __init__(self, database):
+            self._database = database
+
+        @property
+        def roster_version(self):
+            return self._database.roster_version
+
+        async def refresh_mirror(self):
+            return self._database.refresh_mirror()
+
+        async def get_all_characters(self):
+            return self._database.get_all_characters()
+
+    helper = Helper()
+    mirror = ReadMirror(Synchronous(sqlite_database), helper)
+
+    asyncio.run(mirror.refresh())
+    assert helper.rebuilt == []
+
+    outside_write(sqlite_database, add_character("Abbot"))
+    asyncio.run(mirror.refresh())
+    assert helper.rebuilt == [["Abbot"]]
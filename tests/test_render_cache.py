@@ -0,0 +1,67 @@
+import time
+from datetime import timedelta
+from classes.helpers import Helpers
+from classes.times import utc_now
+
+
+def character(char_name, char_class="Bard"):
+    return {'char_name': char_name, 'char_race': "Human", 'char_class': char_class, 'char_type': 'Main'}
+
+
+def mob(mob_name, respawn_in):
+    respawn_time = utc_now() + respawn_in
+
+    return {
+        'mob_name': mob_name,
+        'mob_zone': "Plane of Fear",
+        'kill_time': respawn_time - timedelta(days=1),
+        'respawn_time': respawn_time,
+        'time_zone': 'UTC'
+    }
+
+
+def make_helper():
+    Helpers._render_cache.clear()
+
+    return Helpers(None, None)
+
+
+def test_char_tables_are_keyed_by_name_and_version():
+    helper = make_helper()
+    first = helper.format_char_message([character("Abbot")], "Abbot", 1)
+
+    # same name and version: the rows are not looked at again
+    assert helper.format_char_message([character("Abbot", "Cleric")], "Abbot", 1) == first
+
+    # a roster change moves the version on
+    assert "Cleric" in helper.format_char_message([character("Abbot", "Cleric")], "Abbot", 2)
+
+
+def test_nothing_is_cached_without_a_version():
+    helper = make_helper()
+    helper.format_char_message([character("Abbot")], "Abbot")
+
+    assert "Cleric" in helper.format_char_message([character("Abbot", "Cleric")], "Abbot")
+    assert "Cleric" in helper.format_mob_message(
+        [{**mob("Dread", timedelta(hours=1)), 'mob_name': "Cleric"}], "mob", "Dread"
+    )
+
+
+def test_mob_tables_are_keyed_by_name_and_version():
+    helper = make_helper()
+    first = helper.format_mob_message([mob("Dread", timedelta(hours=1))], "mob", "Dread", 1)
+
+    assert helper.format_mob_message([mob("Dread", timedelta(hours=2))], "mob", "Dread", 1) == first
+    assert helper.format_mob_message([mob("Dread", timedelta(hours=2))], "mob", "Dread", 2) != first
+
+
+def test_mob_tables_expire_when_a_listed_mob_comes_up():
+    helper = make_helper()
+    # already up: nothing upcoming, so the table never expires
+    up = helper.format_mob_message([mob("Dread", timedelta(hours=-1))], "mob", "Dread", 1)
+    soon = helper.format_mob_message([mob("Fright", timedelta(milliseconds=50))], "mob", "Fright", 1)
+
+    time.sleep(0.1)
+
+    assert helper.format_mob_message([mob("Dread", timedelta(hours=1))], "mob", "Dread", 1) == up
+    assert helper.format_mob_message([mob("Fright", timedelta(hours=1))], "mob", "Fright", 1) != soon
@@ -0,0 +1,121 @@
+from datetime import datetime, timedelta, timezone
+from classes.respawn_index import RESPAWN_COLUMNS, ZONE_COLUMNS, RespawnIndex
+
+NOW = datetime(2026, 1, 1, 12, 0, tzinfo=timezone.utc)
+
+
+def make_row(mob_name, respawn_in=None, mob_zone="Plane of Fear"):
+    """
+    A respawns row whose respawn is the given timedelta from NOW
+    :param mob_name: string
+    :param respawn_in: timedelta, None for a mob never killed
+    :param mob_zone: string
+    :return: row dict
+    """
+    respawn_time = None if respawn_in is None else NOW + respawn_in
+
+    return {
+        'mob_name': mob_name,
+        'mob_zone': mob_zone,
+        'kill_time': None if respawn_time is None else respawn_time - timedelta(days=7),
+        'respawn_time': respawn_time,
+        'time_zone': 'UTC',
+        'lockout_weeks': 1,
+        'lockout_days': 0,
+        'lockout_hours': 0,
+        'lockout_minutes': 0
+    }
+
+
+def make_index(rows):
+    index = RespawnIndex()
+    index.load(rows)
+
+    return index
+
+
+def names(rows):
+    return [row['mob_name'] for row in rows]
+
+
+def test_upcoming_returns_soonest_first():
+    index = make_index([
+        make_row("Dread", timedelta(hours=3)),
+        make_row("Fright", timedelta(hours=1)),
+        make_row("Terror", timedelta(hours=2)),
+    ])
+
+    assert names(index.upcoming(3, now=NOW)) == ["Fright", "Terror", "Dread"]
+
+
+def test_upcoming_stops_at_count():
+    index = make_index([make_row(f"Mob {n}", timedelta(minutes=n + 1)) for n in range(50)])
+
+    assert names(index.upcoming(5, now=NOW)) == [f"Mob {n}" for n in range(5)]
+
+
+def test_upcoming_skips_spawned_and_unkilled_mobs():
+    index = make_index([
+        make_row("Up already", timedelta(hours=-1)),
+        make_row("Never killed"),
+        make_row("Coming", timedelta(hours=1)),
+    ])
+
+    assert names(index.upcoming(10, now=NOW)) == ["Coming"]
+
+
+def test_upcoming_honours_within():
+    index = make_index([
+        make_row("Soon", timedelta(minutes=30)),
+        make_row("Later", timedelta(hours=5)),
+    ])
+
+    assert names(index.upcoming(10, within=timedelta(hours=1), now=NOW)) == ["Soon"]
+
+
+def test_upcoming_uses_latest_kill_only():
+    index = make_index([
+        make_row("Vox", timedelta(hours=1)),
+        make_row("Naggy", timedelta(hours=2)),
+    ])
+
+    # a new kill moves Vox behind Naggy; its old heap entry is stale
+    index.update("Vox", NOW, NOW + timedelta(hours=3))
+
+    assert names(index.upcoming(10, now=NOW)) == ["Naggy", "Vox"]
+
+
+
+def test_upcoming_sees_changes_applied_from_the_database():
+    index = make_index([
+        make_row("Vox", timedelta(hours=1)),
+        make_row("Naggy", timedelta(hours=2)),
+    ])
+
+    # Vox deleted, Naggy moved on, Trakanon added
+    index.apply_changes(
+        [make_row("Naggy", timedelta(hours=4)), make_row("Trakanon", timedelta(hours=3))],
+        ["Vox", "Naggy", "Trakanon"]
+    )
+
+    assert names(index.upcoming(10, now=NOW)) == ["Trakanon", "Naggy"]
+
+
+def test_reads_return_the_query_columns_only():
+    index = make_index([make_row("Dread", timedelta(hours=1)), make_row("Fright", timedelta(hours=2))])
+
+    # the rows match what the uncached zone query would return
+    for row in index.upcoming(10, now=NOW):
+        assert tuple(row) == ZONE_COLUMNS
+
+    assert tuple(index.get_mob_respawn("Dread")[0]) == RESPAWN_COLUMNS
+
+
+def test_mob_names_match_without_regard_to_case():
+    index = make_index([make_row("Lord Nagafen", timedelta(hours=1))])
+
+    index.update("LORD NAGAFEN", NOW, NOW + timedelta(hours=5))
+
+    assert index.get_mob_respawn("lord nagafen")[0]['respawn_time'] == NOW + timedelta(hours=5)
+    assert index.get_mob_names() == ["Lord Nagafen"]
+    assert names(index.upcoming(10, now=NOW)) == ["Lord Nagafen"]
@@ -0,0 +1,96 @@
+from classes.roster_cache import RosterCache
+
+
+def character(char_name, discord_id, char_type='Main', char_priority=1):
+    return {
+        'discord_id': discord_id,
+        'char_name': char_name,
+        'char_race': "Dark Elf",
+        'char_class': "Necromancer",
+        'char_type': char_type,
+        'char_priority': char_priority
+    }
+
+
+def make_cache(characters, members=()):
+    cache = RosterCache()
+    cache.load(characters, [{'discord_id': discord_id} for discord_id in members])
+
+    return cache
+
+
+def names(rows):
+    return [row['char_name'] for row in rows]
+
+
+ROSTER = [
+    character("Zelda", "1"),
+    character("abbot", "1", 'Alt', 2),
+    character("Mira", "1", 'Alt', 2),
+    character("Soandso", "2"),
+]
+
+
+def test_lookup_characters_lists_the_owner_mains_first():
+    cache = make_cache(ROSTER)
+
+    assert names(cache.lookup_characters("Mira")) == ["Zelda", "abbot", "Mira"]
+    assert cache.lookup_characters("Nobody") == []
+
+
+def test_lookups_by_discord_id_accept_ints_and_strings():
+    cache = make_cache(ROSTER, members=["1"])
+
+    assert names(cache.find_main_from_discord(1)) == ["Zelda"]
+    assert len(cache.count_ids("1")) == 3
+    assert cache.find_member(1) == [{'discord_id': "1"}]
+    assert cache.find_member(2) == []
+
+
+def test_names_match_case_insensitively():
+    cache = make_cache(ROSTER)
+
+    assert cache.lookup_discord_id("soandso") == [{'discord_id': "2"}]
+    assert names(cache.lookup_characters("ZELDA")) == ["Zelda", "abbot", "Mira"]
+
+
+def test_sorted_reads_ignore_case():
+    cache = make_cache(ROSTER)
+
+    assert cache.get_all_char_names() == ["abbot", "Mira", "Soandso", "Zelda"]
+    assert cache.find_all_mains() == ["Soandso", "Zelda"]
+    assert names(cache.get_discord_ids()) == ["Soandso", "Zelda"]
+
+
+def test_writes_are_reflected_and_bump_the_version():
+    cache = make_cache(ROSTER)
+    version = cache.version
+
+    cache.add_character("3", "Bard", "Human", "Bard", 'Main', 1)
+    cache.update_character("Mira", {'char_name': "Myra", 'discord_id': "3"})
+    cache.remove_character("ABBOT")
+
+    assert cache.get_all_char_names() == ["Bard", "Myra", "Soandso", "Zelda"]
+    assert names(cache.lookup_characters("Bard")) == ["Bard", "Myra"]
+    assert cache.version > version
+
+
+def test_updating_an_uncached_character_forces_a_reload():
+    cache = make_cache(ROSTER)
+
+    cache.update_character("Nobody", {'char_type': 'Alt'})
+
+    assert not cache.is_loaded()
+
+
+def test_owner_lookups_follow_moves_and_removals():
+    cache = make_cache(ROSTER)
+
+    cache.update_character("Mira", {'discord_id': "2"})
+    cache.remove_character("abbot")
+    cache.apply_changes([character("Newt", 2, 'Alt', 2)], [], ["Newt"], [])
+
+    assert cache.find_characters_from_discord(1) == ["Zelda"]
+    assert sorted(cache.find_characters_from_discord("2")) == ["Mira", "Newt", "Soandso"]
+    assert len(cache.count_ids(2)) == 3
+    assert names(cache.lookup_characters("newt")) == ["Soandso", "Mira", "Newt"]
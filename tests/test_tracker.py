@@ -0,0 +1,79 @@
+from classes.tracker import Tracker
+
+
+def respawn(weeks=0, days=0, hours=0, minutes=0):
+    return {'weeks': weeks, 'days': days, 'hours': hours, 'minutes': minutes}
+
+
+def section(name, respawn_text):
+    """
+    One instance entry as it appears on the pqdi instances page
+    :param name: string, mob name
+    :param respawn_text: string following the Respawn Time label
+    :return: html string
+    """
+    return (
+        f'<div class="instance"><h4>{name}</h4>'
+        f'<p>Level 55</p><p>Respawn Time: {respawn_text}</p></div>'
+    )
+
+
+def test_parse_respawn_reads_every_unit():
+    assert Tracker().parse_respawn("1 week 3 days 12 hours 30 minutes") == respawn(1, 3, 12, 30)
+
+
+def test_parse_respawn_fills_missing_units_with_zero():
+    assert Tracker().parse_respawn("18 Hours") == respawn(hours=18)
+    assert Tracker().parse_respawn("6 days") == respawn(days=6)
+
+
+def test_parse_respawn_without_units_is_all_zero():
+    assert Tracker().parse_respawn("unknown") == respawn()
+    assert Tracker().parse_respawn("") == respawn()
+
+
+def test_each_mob_takes_the_next_respawn_entry():
+    page = section("Lord Nagafen", "1 week") + section("Phinigel Autropos", "18 hours 30 minutes")
+
+    index = Tracker().build_respawn_index(page, ["Lord Nagafen", "Phinigel Autropos"])
+
+    assert index == {
+        "Lord Nagafen": respawn(weeks=1),
+        "Phinigel Autropos": respawn(hours=18, minutes=30)
+    }
+
+
+def test_mobs_sharing_an_entry_get_the_same_respawn():
+    page = '<div><h4>Innoruuk</h4><h4>Cazic Thule</h4><p>Respawn Time 7 days</p></div>'
+
+    index = Tracker().build_respawn_index(page, ["Innoruuk", "Cazic Thule"])
+
+    assert index == {"Innoruuk": respawn(days=7), "Cazic Thule": respawn(days=7)}
+
+
+def test_prefix_names_do_not_shadow_longer_names():
+    page = section("Vox", "1 week") + section("Vox Lieutenant", "2 days")
+
+    index = Tracker().build_respawn_index(page, ["Vox", "Vox Lieutenant"])
+
+    assert index == {"Vox": respawn(weeks=1), "Vox Lieutenant": respawn(days=2)}
+
+
+def test_first_appearance_wins():
+    page = section("Trakanon", "3 days") + section("Trakanon", "1 day")
+
+    index = Tracker().build_respawn_index(page, ["Trakanon"])
+
+    assert index == {"Trakanon": respawn(days=3)}
+
+
+def test_unknown_mobs_are_left_out():
+    page = section("Lord Nagafen", "1 week")
+
+    index = Tracker().build_respawn_index(page, ["Lord Nagafen", "Not A Mob"])
+
+    assert index == {"Lord Nagafen": respawn(weeks=1)}
+
+
+def test_empty_mob_list_gives_empty_index():
+    assert Tracker().build_respawn_index(section("Lord Nagafen", "1 week"), []) == {}